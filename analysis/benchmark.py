@@ -0,0 +1,274 @@
+# benchmark.py
+"""Accuracy and throughput benchmark for ComplaintAnalyzer.
+
+Runs the analyzer over a labelled corpus (``data/corpus.jsonl``) and an
+optional synthetic corpus. It reports documents per second, per-stage
+latency percentiles, peak memory, and agreement both with the human labels
+and with a frozen baseline of earlier analyzer output (``data/baseline.json``).
+``compare_backends`` is the parity harness between the spaCy and the fast
+backend. Everything runs offline; see ``manage.py benchmark_analyzer`` and
+``manage.py analyzer_parity``.
+"""
+import json
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+from .nlp import _resident_memory, get_nlp, token_texts
+from .matcher import simple_tokenize
+from .polarity import POLARITY_TOLERANCE, get_lexicon
+from .sentiment import ComplaintAnalyzer
+from .vectorized import VectorizedScorer
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+CORPUS_PATH = DATA_DIR / 'corpus.jsonl'
+BASELINE_PATH = DATA_DIR / 'baseline.json'
+
+STAGES = ['tokenize', 'match', 'polarity', 'score']
+
+# Building blocks for synthetic complaints, by category
+_SUBJECTS = {
+    'INFRA': ['the ceiling in room {n}', 'the power supply in the {place} building',
+              'the plumbing near lecture hall {n}', 'the furniture in classroom {n}'],
+    'HOSTEL': ['the hostel bathroom on floor {n}', 'my roommate in dorm {n}',
+               'the laundry in the residence', 'my room allocation for the session'],
+    'SAFETY': ['the security at gate {n}', 'a theft near the {place} building',
+               'the fire exits in block {n}', 'an accident on the road to the {place}'],
+    'HARASS': ['harassment by a senior student', 'bullying in my department hall',
+               'intimidation from a staff member', 'discrimination at the {place}'],
+    'ACAD': ['the lecturer for course {n}', 'my exam result for CSC {n}',
+             'the timetable for the {place} seminar', 'the grading of assignment {n}'],
+}
+_PROBLEMS = ['is broken', 'has been a problem for weeks', 'is not acceptable',
+             'needs attention', 'keeps getting worse', 'was reported before']
+_TIMING = ['', '', '', 'The exam is tomorrow.', 'The test is in two weeks.',
+           "We haven't had a test and the exam is in a few days."]
+_MOODS = ['', '', 'Please help.', 'This is urgent!', 'I am very worried.',
+          'Thank you for the good work so far.', 'It is terrible and frustrating.']
+_PLACES = ['science', 'library', 'cafeteria', 'engineering', 'arts', 'sports']
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding='utf-8') as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def synthetic_corpus(size, seed=0):
+    """Deterministic generated complaints, labelled with the category they were built from"""
+    rng = random.Random(seed)
+    categories = list(_SUBJECTS)
+    corpus = []
+    for index in range(size):
+        category = categories[index % len(categories)]
+        subject = rng.choice(_SUBJECTS[category]).format(n=rng.randint(1, 400), place=rng.choice(_PLACES))
+        sentences = [f"{subject.capitalize()} {rng.choice(_PROBLEMS)}.",
+                     rng.choice(_TIMING), rng.choice(_MOODS)]
+        corpus.append({
+            'id': f'synthetic-{index}',
+            'title': subject.capitalize(),
+            'description': ' '.join(sentence for sentence in sentences if sentence),
+            'category': category,
+        })
+    return corpus
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {
+        f'p{pct}': ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000
+        for pct in (50, 95, 99)
+    }
+
+
+def measure_stages(corpus, analyzer):
+    """Per-stage latency of the analyzer pipeline, in milliseconds per document"""
+    if analyzer.backend == 'fast':
+        tokenize = simple_tokenize
+    else:
+        nlp = get_nlp()
+        tokenize = lambda text: token_texts(nlp(text))  # noqa: E731
+    matcher = analyzer._backend_matcher()
+    lexicon = get_lexicon()
+    timings = {stage: [] for stage in STAGES}
+
+    for item in corpus:
+        full_text = f"{item['title']}. {item['description']}"
+        started = time.perf_counter()
+        tokens = tokenize(full_text.lower())
+        tokenized = time.perf_counter()
+        matches = matcher.scan(tokens)
+        matched = time.perf_counter()
+        sentiment = lexicon.polarity(tokens)
+        scored_polarity = time.perf_counter()
+        analyzer._score(matches, sentiment)
+        finished = time.perf_counter()
+
+        timings['tokenize'].append(tokenized - started)
+        timings['match'].append(matched - tokenized)
+        timings['polarity'].append(scored_polarity - matched)
+        timings['score'].append(finished - scored_polarity)
+
+    return {stage: _percentiles(samples) for stage, samples in timings.items()}
+
+
+def measure_throughput(corpus, analyzer, batch_size=256):
+    """Analyze the whole corpus with analyze_many; returns results, docs/sec and peak memory"""
+    texts = [(item['description'], item['title']) for item in corpus]
+    started = time.perf_counter()
+    results = list(analyzer.analyze_many(texts, batch_size=batch_size))
+    elapsed = time.perf_counter() - started
+
+    # Traced separately: tracemalloc slows allocation-heavy code several-fold
+    tracemalloc.start()
+    for _ in analyzer.analyze_many(texts, batch_size=batch_size):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return results, {
+        'documents': len(results),
+        'seconds': elapsed,
+        'docs_per_second': len(results) / elapsed if elapsed else 0.0,
+        'peak_python_bytes': peak,
+        'resident_bytes': _resident_memory(),
+    }
+
+
+def measure_vectorized(corpus, expected, analyzer, batch_size=10000):
+    """Throughput of VectorizedScorer and the number of results that differ from ``expected``"""
+    scorer = VectorizedScorer(analyzer)
+    texts = [(item['description'], item['title']) for item in corpus]
+    started = time.perf_counter()
+    results = list(scorer.score_many(texts, batch_size=batch_size))
+    elapsed = time.perf_counter() - started
+    return {
+        'documents': len(results),
+        'seconds': elapsed,
+        'docs_per_second': len(results) / elapsed if elapsed else 0.0,
+        'mismatches': sum(result != reference for result, reference in zip(results, expected)),
+    }
+
+
+def compare_backends(corpus, reference='spacy', candidate='fast', batch_size=256):
+    """Where the ``candidate`` backend's category and priority differ from ``reference``'s"""
+    texts = [(item['description'], item['title']) for item in corpus]
+
+    # First-use cost of the candidate: matcher compilation, lexicon and any model
+    rss_before = _resident_memory()
+    started = time.perf_counter()
+    next(ComplaintAnalyzer(candidate).analyze_many(texts[:1]), None)
+    startup = {'seconds': time.perf_counter() - started,
+               'resident_bytes': max(_resident_memory() - rss_before, 0)}
+
+    expected = list(ComplaintAnalyzer(reference).analyze_many(texts, batch_size=batch_size))
+    actual = list(ComplaintAnalyzer(candidate).analyze_many(texts, batch_size=batch_size))
+
+    differences = []
+    for item, reference_result, candidate_result in zip(corpus, expected, actual):
+        fields = [field for field in ('category', 'priority')
+                  if reference_result[field] != candidate_result[field]]
+        if fields:
+            differences.append({'id': item['id'], 'fields': fields,
+                                'reference': reference_result, 'candidate': candidate_result})
+    total = len(corpus) or 1
+    return {
+        'reference': reference,
+        'candidate': candidate,
+        'compared': len(corpus),
+        'candidate_startup': startup,
+        'agreement': {
+            field: 1 - sum(field in difference['fields'] for difference in differences) / total
+            for field in ('category', 'priority')
+        },
+        'max_sentiment_delta': max(
+            (abs(a['sentiment_score'] - b['sentiment_score']) for a, b in zip(expected, actual)),
+            default=0.0),
+        'differences': differences,
+    }
+
+
+def label_agreement(corpus, results):
+    """Share of documents whose category/priority match the human labels"""
+    agreement = {}
+    for field in ('category', 'priority'):
+        labelled = [(item[field], result[field]) for item, result in zip(corpus, results) if field in item]
+        if labelled:
+            agreement[field] = sum(expected == actual for expected, actual in labelled) / len(labelled)
+    return agreement
+
+
+def baseline_agreement(corpus, results, baseline):
+    """Compare results with a frozen baseline; lists the ids that disagree"""
+    frozen = baseline['results']
+    compared = [(item['id'], result) for item, result in zip(corpus, results) if item['id'] in frozen]
+    differences = []
+    for item_id, result in compared:
+        expected = frozen[item_id]
+        if (result['category'] != expected['category'] or result['priority'] != expected['priority']
+                or abs(result['sentiment_score'] - expected['sentiment_score']) > POLARITY_TOLERANCE):
+            differences.append({'id': item_id, 'baseline': expected, 'current': result})
+    total = len(compared) or 1
+    return {
+        'compared': len(compared),
+        'agreement': (len(compared) - len(differences)) / total,
+        'differences': differences,
+    }
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not Path(path).exists():
+        return None
+    with open(path, encoding='utf-8') as baseline:
+        return json.load(baseline)
+
+
+def freeze_baseline(corpus, results, path=BASELINE_PATH, backend=None):
+    baseline = {
+        'fingerprint': ComplaintAnalyzer.fingerprint(backend),
+        'results': {item['id']: result for item, result in zip(corpus, results)},
+    }
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(baseline, output, indent=1, sort_keys=True)
+        output.write('\n')
+    return baseline
+
+
+def run_benchmark(synthetic=0, batch_size=256, corpus_path=CORPUS_PATH, baseline_path=BASELINE_PATH,
+                  backend=None):
+    analyzer = ComplaintAnalyzer(backend)
+    labelled = load_corpus(corpus_path)
+
+    # Load the model outside of the measurements
+    started = time.perf_counter()
+    if analyzer.backend == 'spacy':
+        get_nlp()
+    get_lexicon()
+    load_seconds = time.perf_counter() - started
+
+    results, _ = measure_throughput(labelled, analyzer, batch_size)
+    report = {
+        'backend': analyzer.backend,
+        'load_seconds': load_seconds,
+        'labelled': {
+            'documents': len(labelled),
+            'label_agreement': label_agreement(labelled, results),
+        },
+        'results': results,
+        'corpus': labelled,
+    }
+    baseline = load_baseline(baseline_path)
+    if baseline is not None:
+        report['labelled']['baseline'] = baseline_agreement(labelled, results, baseline)
+
+    workload = labelled + synthetic_corpus(synthetic)
+    synthetic_results, report['throughput'] = measure_throughput(workload, analyzer, batch_size)
+    report['stages'] = measure_stages(workload, analyzer)
+    report['vectorized'] = measure_vectorized(workload, synthetic_results, analyzer)
+    if synthetic:
+        report['synthetic'] = {
+            'documents': synthetic,
+            'label_agreement': label_agreement(workload[len(labelled):], synthetic_results[len(labelled):]),
+        }
+    return report
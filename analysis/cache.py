@@ -0,0 +1,117 @@
+# cache.py
+"""Content-addressed cache of ComplaintAnalyzer results.
+
+Results are keyed by a hash of the normalized title and description plus the
+analyzer fingerprint, so resubmitting the same complaint is a dictionary
+lookup, and any change to the keyword tables or the analyzer version moves
+every key and invalidates old entries automatically.
+
+There are two tiers: a small in-process LRU, and an optional Django cache
+(file- or database-backed, configured by ANALYSIS_CACHE_ALIAS) shared by
+every worker on the host.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from .conf import get_setting
+
+DEFAULT_SIZE = 1024
+
+_SPACES = re.compile(r'[^\S\n]+')
+
+
+def normalize(text):
+    """Collapse runs of spaces within lines; line breaks are significant to the analyzer"""
+    if not text:
+        return ''
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(_SPACES.sub(' ', line).strip() for line in lines).strip()
+
+
+def make_key(fingerprint, text, title=None):
+    digest = hashlib.sha256()
+    for part in (fingerprint, normalize(title), normalize(text)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return f'analysis:{digest.hexdigest()}'
+
+
+class AnalysisCache:
+    """In-process LRU in front of an optional shared Django cache"""
+
+    def __init__(self, max_entries=DEFAULT_SIZE, shared=None, timeout=None):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                return dict(result)
+
+        if self.shared is None:
+            return None
+        result = self.shared.get(key)
+        if result is not None:
+            self._remember(key, result)
+            return dict(result)
+        return None
+
+    def set(self, key, result):
+        self._remember(key, result)
+        if self.shared is not None:
+            if self.timeout is None:
+                self.shared.set(key, result)
+            else:
+                self.shared.set(key, result, self.timeout)
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    """The process-wide cache configured from settings, or None when disabled"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _build_cache()
+    return _cache or None
+
+
+def _build_cache():
+    size = get_setting('ANALYSIS_CACHE_SIZE', DEFAULT_SIZE)
+    if not size:
+        return False
+
+    shared = None
+    alias = get_setting('ANALYSIS_CACHE_ALIAS')
+    if alias:
+        from django.core.cache import caches
+        shared = caches[alias]
+    return AnalysisCache(size, shared, get_setting('ANALYSIS_CACHE_TIMEOUT'))
+
+
+def reset_analysis_cache():
+    """Drop the process-wide cache so it is rebuilt from current settings"""
+    global _cache
+    with _cache_lock:
+        _cache = None
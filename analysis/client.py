@@ -0,0 +1,88 @@
+# client.py
+"""Thin client for the analyzer daemon in ``server.py``.
+
+``ComplaintAnalyzer.analyze`` goes through ``get_client()`` when
+ANALYSIS_SOCKET is set and falls back to analyzing in-process whenever the
+server cannot answer within ANALYSIS_SOCKET_TIMEOUT. After a failure the
+server is not tried again for ``retry_interval`` seconds, and then by one
+request at a time, so a stopped daemon costs one failed connection rather
+than one per request.
+"""
+import json
+import socket
+import threading
+import time
+
+from .conf import get_setting
+
+
+class AnalyzerUnavailable(Exception):
+    """The analyzer server could not produce a result"""
+
+
+class AnalyzerClient:
+    def __init__(self, path, timeout=2.0, retry_interval=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        # Shared by request threads: checked and set under the lock
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def analyze(self, text, title=None):
+        with self._lock:
+            now = time.monotonic()
+            if now < self._retry_at:
+                raise AnalyzerUnavailable(f"{self.path} failed recently")
+            if self._retry_at:
+                # After a failure one request tries the server again; the
+                # others keep falling back until it has answered
+                self._retry_at = now + self.retry_interval
+        try:
+            result = self._request({'text': text, 'title': title})
+        except AnalyzerUnavailable:
+            with self._lock:
+                self._retry_at = time.monotonic() + self.retry_interval
+            raise
+        with self._lock:
+            self._retry_at = 0.0
+        return result
+
+    def _request(self, request):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.path)
+                sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+                with sock.makefile('rb') as reader:
+                    line = reader.readline()
+        except OSError as exc:
+            raise AnalyzerUnavailable(f"{self.path}: {exc}") from exc
+
+        if not line:
+            raise AnalyzerUnavailable(f"{self.path} closed the connection")
+        try:
+            response = json.loads(line)
+        except ValueError as exc:
+            raise AnalyzerUnavailable(f"{self.path} sent an invalid response") from exc
+        if 'error' in response:
+            raise AnalyzerUnavailable(response['error'])
+        return response['result']
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client():
+    """Client for the configured ANALYSIS_SOCKET, or None when there is no server"""
+    path = get_setting('ANALYSIS_SOCKET')
+    if not path:
+        return None
+    timeout = get_setting('ANALYSIS_SOCKET_TIMEOUT', 2.0)
+    key = (str(path), timeout)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.setdefault(key, AnalyzerClient(str(path), timeout))
+    return client
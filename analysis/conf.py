@@ -0,0 +1,18 @@
+# conf.py
+"""Settings lookup for the analysis package.
+
+The analyzer is usually run inside the Django project, but it must also work
+from plain scripts where no settings module is configured.
+"""
+
+
+def get_setting(name, default=None):
+    """Return ``settings.<name>`` when Django is configured, else ``default``"""
+    try:
+        from django.conf import settings
+    except ImportError:
+        return default
+
+    if not settings.configured:
+        return default
+    return getattr(settings, name, default)
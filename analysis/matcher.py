@@ -0,0 +1,216 @@
+# matcher.py
+"""Compiled multi-pattern keyword matcher used by ComplaintAnalyzer.
+
+Every keyword, phrase and ordered pattern table is compiled into a single
+token trie, so one left-to-right pass over the token stream finds every hit
+regardless of how many keywords the tables contain. Matching works on whole
+tokens, so "test" never matches inside "latest".
+"""
+
+import re
+
+from .polarity import get_lexicon
+
+_END = object()
+
+_token = None
+
+
+def _token_pattern():
+    """Line breaks, spaces next to a hyphen, the polarity lexicon's emoticons,
+    words, then single symbols.
+
+    Emoticons are whole tokens as in spaCy, so that ":-(" is scored. Those
+    starting with a letter or digit ("8)", "o.o") are left to the word rule,
+    which keeps the words of duplicate detection (minhash.py) unchanged. The
+    spaces tell hyphenated compounds ("first-class") from dashes for polarity;
+    keyword matching skips them.
+    """
+    global _token
+    if _token is None:
+        faces = sorted((face for face in get_lexicon().emoticons if not re.match(r'\w', face)),
+                       key=len, reverse=True)
+        emoticons = '|'.join(re.escape(face) + (r'(?!\w)' if re.search(r'\w$', face) else '')
+                             for face in faces)
+        _token = re.compile(rf"\n|[^\S\n]+(?=-)|(?<=-)[^\S\n]+|(?i:{emoticons})|\w+(?:'\w+)*|[^\w\s]")
+    return _token
+
+
+def simple_tokenize(text):
+    """Regex tokenizer for callers that cannot afford a spaCy pipeline.
+
+    Keeps line breaks as tokens because ordered patterns may not span lines.
+    """
+    return _token_pattern().findall(text.replace('\u2019', "'"))
+
+
+class KeywordMatcher:
+    """Token trie over named keyword tables.
+
+    ``tokenize`` must be the same tokenizer that produces the token stream
+    passed to ``scan``, so that phrases such as "haven't had" are split the
+    same way at compile time and at match time.
+    """
+
+    def __init__(self, tokenize):
+        self.tokenize = tokenize
+        self._trie = {}
+        self._phrase_ids = {}
+        self._groups = {}
+        self._sequences = {}
+        self._max_length = 0
+
+    @property
+    def vocabulary_size(self):
+        """Number of distinct phrases; phrase ids run from 0 to this size"""
+        return len(self._phrase_ids)
+
+    @property
+    def max_length(self):
+        """Number of tokens of the longest phrase"""
+        return self._max_length
+
+    def group(self, table, label):
+        """Phrase ids registered for ``label`` in ``table``"""
+        return self._groups[(table, label)]
+
+    def sequence_patterns(self, table):
+        """``(label, [phrase ids of each group])`` of the ordered patterns in ``table``"""
+        return self._sequences.get(table, [])
+
+    def phrase_id(self, phrase):
+        """Id of an already registered phrase"""
+        tokens = tuple(token for token in self.tokenize(phrase.lower()) if not token.isspace())
+        return self._phrase_ids[tokens]
+
+    def _compile_phrase(self, phrase):
+        tokens = tuple(token for token in self.tokenize(phrase.lower())
+                       if not token.isspace())
+        phrase_id = self._phrase_ids.get(tokens)
+        if phrase_id is None:
+            phrase_id = self._phrase_ids[tokens] = len(self._phrase_ids)
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[_END] = phrase_id
+            self._max_length = max(self._max_length, len(tokens))
+        return phrase_id
+
+    def states(self):
+        """The trie as numbered states, for matching many documents at once.
+
+        Returns ``(token_ids, transitions, accepts)``: an id from 1 up for every
+        token used by a phrase, then for each state (the root is 0) its
+        ``{token id: next state}`` and the phrase it completes, or None.
+        """
+        token_ids = {}
+        transitions, accepts = [], []
+        nodes = [self._trie]
+        for node in nodes:
+            edges = {}
+            for token, child in node.items():
+                if token is not _END:
+                    edges[token_ids.setdefault(token, len(token_ids) + 1)] = len(nodes)
+                    nodes.append(child)
+            transitions.append(edges)
+            accepts.append(node.get(_END))
+        return token_ids, transitions, accepts
+
+    def _compile_group(self, phrases):
+        return frozenset(self._compile_phrase(phrase) for phrase in phrases)
+
+    def add_keywords(self, table, keywords):
+        """Register ``{label: [phrase, ...]}`` under ``table``"""
+        for label, phrases in keywords.items():
+            self._groups[(table, label)] = self._compile_group(phrases)
+
+    def add_sequences(self, table, patterns):
+        """Register ``{label: [(group, group, ...), ...]}`` under ``table``.
+
+        A pattern matches when a phrase from each group appears, in order, on
+        the same line of text.
+        """
+        compiled = self._sequences.setdefault(table, [])
+        for label, sequences in patterns.items():
+            for groups in sequences:
+                compiled.append((label, [self._compile_group(group) for group in groups]))
+
+    def scan(self, tokens):
+        """Match every registered phrase against a stream of token strings"""
+        words = []
+        lines = []
+        line = 0
+        for token in tokens:
+            if token.isspace():
+                line += token.count('\n')
+            else:
+                words.append(token)
+                lines.append(line)
+
+        hits = {}
+        count = len(words)
+        for start in range(count):
+            node = self._trie
+            for end in range(start, min(start + self._max_length, count)):
+                node = node.get(words[end])
+                if node is None or lines[end] != lines[start]:
+                    break
+                phrase_id = node.get(_END)
+                if phrase_id is not None:
+                    hits.setdefault(phrase_id, []).append((lines[start], start, end + 1))
+        return KeywordMatches(self, hits)
+
+
+class KeywordMatches:
+    """Result of a single ``KeywordMatcher.scan``"""
+
+    def __init__(self, matcher, hits):
+        self._matcher = matcher
+        self._hits = hits
+
+    def phrase_counts(self):
+        """``{phrase_id: occurrences}`` for every phrase that matched"""
+        return {phrase_id: len(positions) for phrase_id, positions in self._hits.items()}
+
+    def _found(self, group):
+        return [phrase_id for phrase_id in group if phrase_id in self._hits]
+
+    def count(self, table, label):
+        """Total number of occurrences of the label's phrases"""
+        return sum(len(self._hits[phrase_id])
+                   for phrase_id in self._found(self._matcher._groups[(table, label)]))
+
+    def distinct(self, table, label):
+        """Number of different phrases of the label that occur"""
+        return len(self._found(self._matcher._groups[(table, label)]))
+
+    def any(self, table, label):
+        return self.distinct(table, label) > 0
+
+    def _occurrences(self, group):
+        return sorted(position for phrase_id in self._found(group)
+                      for position in self._hits[phrase_id])
+
+    def sequences(self, table):
+        """Labels of every ordered pattern in ``table`` that matched"""
+        matched = set()
+        for label, groups in self._matcher._sequences.get(table, []):
+            if label not in matched and self._sequence_matches(groups):
+                matched.add(label)
+        return matched
+
+    def _sequence_matches(self, groups):
+        occurrences = [self._occurrences(group) for group in groups]
+        if not all(occurrences):
+            return False
+
+        for line, _, cursor in occurrences[0]:
+            for group in occurrences[1:]:
+                following = next((end for hit_line, start, end in group
+                                  if hit_line == line and start >= cursor), None)
+                if following is None:
+                    break
+                cursor = following
+            else:
+                return True
+        return False
@@ -0,0 +1,68 @@
+# minhash.py
+"""MinHash signatures and LSH band keys for near-duplicate complaints.
+
+A complaint is reduced to the set of its word shingles (runs of
+``SHINGLE_SIZE`` words). The MinHash signature of that set is split into
+``BANDS`` bands of ``ROWS`` values, and each band is hashed to a 64-bit
+bucket key. Two complaints whose shingle sets have Jaccard similarity ``s``
+share at least one bucket with probability ``1 - (1 - s**ROWS)**BANDS``:
+about 98% at 0.4 and 62% at 0.2. Looking up a complaint's keys is a handful
+of index probes however many complaints are stored; candidates are then
+checked with the exact ``jaccard``.
+
+Keys depend on the hash parameters below, so any change to them needs the
+stored keys rebuilt (``manage.py rebuild_duplicate_index``).
+"""
+import hashlib
+import random
+import zlib
+
+import numpy as np
+
+from .matcher import simple_tokenize
+
+SHINGLE_SIZE = 2
+BANDS = 24
+ROWS = 2
+
+# Universal hashing (a * x + b) mod p; with x, a, b < 2**31 nothing overflows 64 bits
+_PRIME = (1 << 31) - 1
+_random = random.Random(20240501)
+_A = np.array([_random.randrange(1, _PRIME) for _ in range(BANDS * ROWS)], dtype=np.uint64)
+_B = np.array([_random.randrange(0, _PRIME) for _ in range(BANDS * ROWS)], dtype=np.uint64)
+
+
+def shingles(text):
+    """Set of word shingles of ``text``, ignoring case and punctuation"""
+    words = [token for token in simple_tokenize(text.lower()) if token[0].isalnum()]
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[start:start + SHINGLE_SIZE])
+            for start in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def signature(shingle_set):
+    """MinHash signature of a shingle set, as ``BANDS * ROWS`` integers"""
+    # crc32 rather than hash(): keys must not change between processes
+    hashes = np.array([zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set],
+                      dtype=np.uint64) % _PRIME
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def band_keys(shingle_set):
+    """One signed 64-bit bucket key per band; empty for an empty set"""
+    if not shingle_set:
+        return []
+    values = signature(shingle_set)
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(values[band * ROWS:(band + 1) * ROWS].tobytes(),
+                                 digest_size=8, person=band.to_bytes(2, 'big')).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
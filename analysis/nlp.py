@@ -0,0 +1,142 @@
+# nlp.py
+"""Lazy, process-wide registry for the spaCy models used by the analyzer.
+
+Loading ``en_core_web_sm`` takes a noticeable amount of time and memory, so it
+is no longer done at import time. The model is loaded on first use (or by an
+explicit ``warm_up()`` call from the WSGI/ASGI entry points) and then shared by
+every ``ComplaintAnalyzer`` in the process.
+
+With ``ANALYSIS_BACKEND = 'fast'`` the analyzer tokenizes with a regex instead
+and spaCy is never imported.
+"""
+import logging
+import os
+import resource
+import threading
+import time
+
+from .conf import get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'en_core_web_sm'
+
+BACKENDS = ('spacy', 'fast')
+DEFAULT_BACKEND = 'spacy'
+
+# ComplaintAnalyzer only reads token text, so every trained component of the
+# pipeline is dead weight. Excluded components are never loaded into memory.
+DEFAULT_EXCLUDE = ('tok2vec', 'tagger', 'parser', 'attribute_ruler',
+                   'lemmatizer', 'ner', 'senter')
+
+
+def token_texts(doc):
+    """Token texts of a spaCy doc, with the spaces next to a hyphen as tokens
+    (as ``matcher.simple_tokenize`` keeps them, for polarity)"""
+    texts = []
+    for index, token in enumerate(doc):
+        texts.append(token.text)
+        if token.whitespace_ and (token.text == '-' or (index + 1 < len(doc) and doc[index + 1].text == '-')):
+            texts.append(token.whitespace_)
+    return texts
+
+
+def _resident_memory():
+    """Current resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Not Linux: fall back to the peak RSS, which is reported in KiB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ModelRegistry:
+    """Loads each spaCy model once and records what it cost"""
+
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, name=None, exclude=None):
+        name = name or get_setting('ANALYSIS_SPACY_MODEL', DEFAULT_MODEL)
+        if exclude is None:
+            exclude = get_setting('ANALYSIS_SPACY_EXCLUDE', DEFAULT_EXCLUDE)
+        key = (name, tuple(exclude))
+
+        nlp = self._models.get(key)
+        if nlp is not None:
+            return nlp
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            nlp = self._models.get(key)
+            if nlp is None:
+                nlp = self._load(key)
+        return nlp
+
+    def _load(self, key):
+        import spacy
+
+        name, exclude = key
+        rss_before = _resident_memory()
+        started = time.perf_counter()
+        nlp = spacy.load(name, exclude=list(exclude))
+        load_seconds = time.perf_counter() - started
+
+        self._stats[key] = {
+            'model': name,
+            'pipeline': list(nlp.pipe_names),
+            'excluded': list(exclude),
+            'load_seconds': load_seconds,
+            'resident_bytes': max(_resident_memory() - rss_before, 0),
+        }
+        self._models[key] = nlp
+        logger.info("Loaded spaCy model %s in %.2fs", name, load_seconds)
+        return nlp
+
+    def stats(self):
+        """Load time and resident size of every model loaded so far"""
+        return [dict(stat) for stat in self._stats.values()]
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._stats.clear()
+
+
+registry = ModelRegistry()
+
+
+def get_backend():
+    """The configured analyzer backend: 'spacy' or the model-free 'fast'"""
+    backend = get_setting('ANALYSIS_BACKEND', DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ANALYSIS_BACKEND {backend!r}; expected one of {BACKENDS}")
+    return backend
+
+
+def get_nlp(name=None, exclude=None):
+    """Return the shared spaCy pipeline, loading it on first use"""
+    return registry.get(name, exclude)
+
+
+def warm_up(local=False):
+    """Load the configured model and the polarity lexicon now instead of on the first request.
+
+    Processes that send their analysis to an analyzer server (ANALYSIS_SOCKET)
+    skip this unless ``local`` is set; the server itself passes it.
+    """
+    from .polarity import get_lexicon
+
+    if get_setting('ANALYSIS_SOCKET') and not local:
+        return model_stats()
+    if get_backend() == 'spacy':
+        get_nlp()
+    get_lexicon()
+    return model_stats()
+
+
+def model_stats():
+    return registry.stats()
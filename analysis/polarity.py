@@ -0,0 +1,193 @@
+# polarity.py
+"""Sentiment polarity computed from an already tokenized complaint.
+
+This is a port of the pattern/TextBlob ``PatternAnalyzer`` scoring rules
+(lexicon lookup, intensifying modifiers, negation, "!" boosts and emoticons)
+that works on the analyzer's own token stream, so a complaint is tokenized
+once instead of again by TextBlob. The lexicon is TextBlob's own
+``en-sentiment.xml``, flattened into ``data/polarity_lexicon.json`` so that
+scoring does not import TextBlob (and NLTK) at all. Regenerate the snapshot
+after upgrading TextBlob with
+``PolarityLexicon.from_textblob().to_json(LEXICON_PATH)``.
+
+Scores track ``TextBlob(text).sentiment.polarity`` to within
+``POLARITY_TOLERANCE`` on the test sentences. Words are brought back to
+TextBlob's split first: hyphenated compounds ("first-class"), which both
+tokenizers split, are joined again, and emoticons (":'(") are not split on
+their apostrophe. Scores can still differ where the tokenizers split
+otherwise, e.g. spaCy keeps "haven’t" with a typographic apostrophe whole,
+and the regex tokenizer splits emoticons starting with a letter or digit
+("8)", "o.o").
+"""
+import json
+import threading
+from pathlib import Path
+
+LEXICON_PATH = Path(__file__).resolve().parent / 'data' / 'polarity_lexicon.json'
+
+# Largest difference from TextBlob's polarity accepted by the benchmarks
+POLARITY_TOLERANCE = 0.05
+
+NEGATIONS = ('no', 'not', "n't", 'never')
+
+# Same as pattern's PUNCTUATION; these are never looked up as emoticons
+PUNCTUATION = ".,;:!?()[]{}`''\"@#$^&*+-|=~_"
+
+
+class PolarityLexicon:
+    """Flat ``word -> (polarity, intensity, is_modifier)`` table"""
+
+    def __init__(self, words, emoticons):
+        self.words = words
+        self.emoticons = emoticons
+
+    @classmethod
+    def from_textblob(cls):
+        from textblob._text import EMOTICONS
+        from textblob.en import sentiment as pattern_sentiment
+
+        words = {}
+        for word, senses in dict.items(_loaded(pattern_sentiment)):
+            polarity, _, intensity = senses[None]
+            words[word] = (polarity, intensity, 'RB' in senses)
+        emoticons = {}
+        for (_, polarity), faces in EMOTICONS.items():
+            for face in faces:
+                emoticons.setdefault(face.lower(), polarity)
+        return cls(words, emoticons)
+
+    @classmethod
+    def from_json(cls, path=LEXICON_PATH):
+        with open(path, encoding='utf-8') as source:
+            data = json.load(source)
+        return cls({word: tuple(entry) for word, entry in data['words'].items()}, data['emoticons'])
+
+    def to_json(self, path=LEXICON_PATH):
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump({'words': self.words, 'emoticons': self.emoticons}, output,
+                      ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+            output.write('\n')
+
+    def polarity(self, tokens):
+        """Average polarity of the assessed words in a lowercase token stream"""
+        scores = []
+        for polarity, _, negated in self._assessments(_split_apostrophes(_join_compounds(tokens),
+                                                                         self.emoticons)):
+            # "not good" is slightly bad, "not bad" slightly good
+            scores.append(polarity * -0.5 if negated else polarity)
+        return sum(scores) / float(len(scores) or 1)
+
+    def _assessments(self, words):
+        # Each assessment is [polarity, intensity, negated]
+        assessed = []
+        modifier = None
+        negation = None
+        for word in words:
+            entry = self.words.get(word)
+            if entry is not None:
+                polarity, intensity, is_modifier = entry
+                if modifier is None:
+                    assessed.append([polarity, intensity, False])
+                else:
+                    # Known word preceded by a modifier ("really good")
+                    last = assessed[-1]
+                    last[0] = max(-1.0, min(polarity * last[1], +1.0))
+                    last[1] = intensity
+                if negation is not None:
+                    assessed[-1][1] = 1.0 / assessed[-1][1]
+                    assessed[-1][2] = True
+                modifier = word if is_modifier else None
+                negation = word if word in NEGATIONS else None
+                continue
+
+            if word in NEGATIONS:
+                negation = word
+            elif negation and len(word.strip("'")) > 1:
+                # Negation carries across small words ("not a good")
+                negation = None
+            if negation is not None and modifier is not None and modifier.endswith('ly'):
+                # "really not good"
+                assessed[-1][2] = True
+                negation = None
+            elif modifier and len(word) > 2:
+                modifier = None
+            if word == '!' and assessed:
+                assessed[-1][0] = max(-1.0, min(assessed[-1][0] * 1.25, +1.0))
+            if not word.isalpha() and len(word) <= 5 and word not in PUNCTUATION:
+                face = self.emoticons.get(word)
+                if face is not None:
+                    assessed.append([face, 1.0, False])
+        return assessed
+
+
+def _loaded(lexicon):
+    len(lexicon)  # lazydict loads the XML on first access
+    return lexicon
+
+
+def _join_compounds(tokens):
+    """Join hyphenated compounds ("first-class") back into one word, as TextBlob keeps them.
+
+    Both tokenizers split on hyphens but keep the spaces next to a hyphen as
+    tokens, so "loud - very" stays three words. Drops every space token.
+    """
+    if '-' not in tokens:
+        return [token for token in tokens if not token.isspace()]
+    words = []
+    spaced = True
+    joining = False
+    for token in tokens:
+        if token.isspace():
+            spaced = True
+            if joining:
+                words.append('-')
+                joining = False
+            continue
+        if joining:
+            if token[0].isalnum():
+                words[-1] += '-' + token
+            else:
+                words.extend(('-', token))
+            joining = False
+        elif token == '-' and not spaced and words and words[-1][-1].isalnum():
+            joining = True
+        else:
+            words.append(token)
+        spaced = False
+    if joining:
+        words.append('-')
+    return words
+
+
+def _split_apostrophes(tokens, emoticons=()):
+    """Split tokens on apostrophes the way TextBlob's tokenizer does ("n't" -> n ' t).
+
+    Tokens in ``emoticons``, such as ":'(", are kept whole.
+    """
+    for token in tokens:
+        if "'" not in token or len(token) == 1 or token in emoticons:
+            yield token
+            continue
+        parts = token.split("'")
+        for index, part in enumerate(parts):
+            if index:
+                yield "'"
+            if part:
+                yield part
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon():
+    """The process-wide polarity lexicon, loaded on first use"""
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                if LEXICON_PATH.exists():
+                    _lexicon = PolarityLexicon.from_json()
+                else:
+                    _lexicon = PolarityLexicon.from_textblob()
+    return _lexicon
@@ -1,142 +1,261 @@
 # sentiment.py
-import spacy
-from textblob import TextBlob
-import re
+import hashlib
+import json
+import logging
+import operator
+import weakref
+
+from .cache import get_analysis_cache, make_key
+from .client import AnalyzerUnavailable, get_client
+from .conf import get_setting
+from .matcher import KeywordMatcher, simple_tokenize
+from .nlp import BACKENDS, DEFAULT_MODEL, get_backend, get_nlp, token_texts
+from .polarity import get_lexicon
+
+logger = logging.getLogger(__name__)
 
-nlp = spacy.load('en_core_web_sm')
 
 class ComplaintAnalyzer:
+    # Bump whenever the scoring logic changes; table edits are picked up
+    # automatically by fingerprint()
+    VERSION = 4
+
     CATEGORY_KEYWORDS = {
-        'INFRA': ['building', 'room', 'lecture hall', 'classroom', 'repair', 'maintenance', 
+        'INFRA': ['building', 'room', 'lecture hall', 'classroom', 'repair', 'maintenance',
                  'leak', 'electric', 'power', 'water', 'plumbing', 'furniture', 'facility',
                  'infrastructure', 'broken', 'damaged', 'faulty'],
-        'HOSTEL': ['hostel', 'dorm', 'dormitory', 'roommate', 'bathroom', 'common room', 
+        'HOSTEL': ['hostel', 'dorm', 'dormitory', 'roommate', 'bathroom', 'common room',
                   'laundry', 'residence', 'accommodation', 'room allocation'],
         'SAFETY': ['safety', 'danger', 'unsafe', 'threat', 'emergency', 'fire', 'accident',
                   'security', 'theft', 'stolen', 'missing', 'violence'],
         'HARASS': ['harassment', 'bully', 'bullying', 'sexual', 'abuse', 'stalking',
                   'discrimination', 'intimidation', 'unwelcome'],
-        'ACAD': ['lecturer', 'professor', 'teacher', 'instructor', 'course', 'class', 'exam', 
-                'examination', 'test', 'grade', 'grading', 'assignment', 'marking', 'score', 
+        'ACAD': ['lecturer', 'professor', 'teacher', 'instructor', 'course', 'class', 'exam',
+                'examination', 'test', 'grade', 'grading', 'assignment', 'marking', 'score',
                 'result', 'department', 'academic', 'curriculum', 'syllabus', 'lecture',
                 'tutorial', 'seminar', 'attendance', 'timetable', 'schedule']
     }
-    
+
     PRIORITY_KEYWORDS = {
-        'CRIT': ['urgent', 'emergency', 'danger', 'immediately', 'now', 'critical', 
+        'CRIT': ['urgent', 'emergency', 'danger', 'immediately', 'now', 'critical',
                 'asap', 'crisis', 'desperate', 'severe'],
         'HIGH': ['important', 'soon', 'quickly', 'serious', 'concerned', 'worried',
                 'significant', 'major', 'pressing', 'vital'],
         'MED': ['problem', 'issue', 'request', 'please', 'kindly', 'help',
                'concern', 'matter', 'situation']
     }
-    
-    # Time-sensitive patterns for academic complaints
+
+    # Term groups used by the time-sensitive patterns below
+    EXAM_TERMS = ['exam', 'test', 'assessment']
+    IMMINENT_TERMS = ['tomorrow', 'today', 'this week']
+    FEW_DAYS_TERMS = ['few day', 'few days', 'couple of day', 'couple of days']
+    WEEKS_AWAY_TERMS = ['next week', '1 week', 'one week', '2 week', '2 weeks', 'two week',
+                        'two weeks', '3 week', '3 weeks', 'three week', 'three weeks']
+
+    # Time-sensitive patterns for academic complaints. Each pattern is a sequence
+    # of term groups that must appear in this order on the same line.
     TIME_PATTERNS = {
         'CRIT': [
-            r'\b(tomorrow|today|this week)\b.*\b(exam|test|assessment)\b',
-            r'\b(exam|test|assessment)\b.*\b(tomorrow|today|this week)\b',
-            r'\b(few days?|couple of days?)\b.*\b(exam|test)\b',
-            r'\b(exam|test)\b.*\b(few days?|couple of days?)\b'
+            (IMMINENT_TERMS, EXAM_TERMS),
+            (EXAM_TERMS, IMMINENT_TERMS),
+            (FEW_DAYS_TERMS, ['exam', 'test']),
+            (['exam', 'test'], FEW_DAYS_TERMS),
         ],
         'HIGH': [
-            r'\b(next week|1 week|one week|2 weeks?|two weeks?|3 weeks?|three weeks?)\b.*\b(exam|test|assessment)\b',
-            r'\b(exam|test|assessment)\b.*\b(next week|1 week|one week|2 weeks?|two weeks?|3 weeks?|three weeks?)\b',
-            r'\bhaven\'?t had.*\b(test|exam|assessment)\b.*\b(weeks?|days?)\b.*\b(exam|test)\b'
+            (WEEKS_AWAY_TERMS, EXAM_TERMS),
+            (EXAM_TERMS, WEEKS_AWAY_TERMS),
+            (['haven\'t had', 'havent had'], EXAM_TERMS, ['week', 'weeks', 'day', 'days'],
+             ['exam', 'test']),
         ]
     }
-    
+
     # Academic urgency indicators
     ACADEMIC_URGENCY = {
-        'HIGH': ['not coming to class', 'hasn\'t been coming', 'missing lectures', 
+        'HIGH': ['not coming to class', 'hasn\'t been coming', 'missing lectures',
                 'no test', 'haven\'t had test', 'no assessment', 'weeks to exam',
                 'approaching exam', 'exam period', 'final exam'],
         'MED': ['irregular attendance', 'sometimes absent', 'delayed syllabus',
                'behind schedule', 'slow progress']
     }
-    
+
+    # Lecturer absence with an upcoming exam needs all three of these
+    LECTURER_ABSENCE = {
+        'absent': ['not coming', 'hasn\'t been coming', 'not been coming'],
+        'exam': EXAM_TERMS,
+        'period': ['weeks', 'days'],
+    }
+
+    # Compiled matchers, one per tokenizer (spaCy pipeline or function)
+    _matchers = weakref.WeakKeyDictionary()
+
+    # (rule tables, fingerprint) per class and tokenizer
+    _fingerprints = {}
+
+    def __init__(self, backend=None):
+        """``backend`` overrides the ANALYSIS_BACKEND setting ('spacy' or 'fast')"""
+        if backend is not None and backend not in BACKENDS:
+            raise ValueError(f"Unknown analyzer backend {backend!r}; expected one of {BACKENDS}")
+        self.backend = backend or get_backend()
+
+    @classmethod
+    def fingerprint(cls, backend=None):
+        """Hash of the analyzer version, tokenizer and every rule table.
+
+        Remembered per class and tokenizer until one of the tables is
+        replaced; tables are never edited in place.
+        """
+        backend = backend or get_backend()
+        tokenizer = get_setting('ANALYSIS_SPACY_MODEL', DEFAULT_MODEL) if backend == 'spacy' else backend
+        tables = (cls.VERSION, cls.CATEGORY_KEYWORDS, cls.PRIORITY_KEYWORDS, cls.TIME_PATTERNS,
+                  cls.ACADEMIC_URGENCY, cls.LECTURER_ABSENCE)
+        remembered = cls._fingerprints.get((cls, tokenizer))
+        if remembered is not None and all(map(operator.is_, remembered[0], tables)):
+            return remembered[1]
+
+        version, *rule_tables = tables
+        rules = json.dumps([version, tokenizer, *rule_tables], sort_keys=True)
+        fingerprint = hashlib.sha256(rules.encode('utf-8')).hexdigest()
+        # The tables are kept so that their ids cannot be reused by others
+        cls._fingerprints[(cls, tokenizer)] = (tables, fingerprint)
+        return fingerprint
+
+    @classmethod
+    def compile_matcher(cls, tokenize):
+        """Compile every keyword, phrase and pattern table into one matcher"""
+        matcher = KeywordMatcher(tokenize)
+        matcher.add_keywords('category', cls.CATEGORY_KEYWORDS)
+        matcher.add_keywords('priority', cls.PRIORITY_KEYWORDS)
+        matcher.add_keywords('urgency', cls.ACADEMIC_URGENCY)
+        matcher.add_keywords('absence', cls.LECTURER_ABSENCE)
+        matcher.add_sequences('time', cls.TIME_PATTERNS)
+        return matcher
+
+    def _get_matcher(self, owner, tokenize):
+        # The owner already identifies the tokenizer, so only the tables matter
+        # here; the model-free fingerprint covers exactly those
+        fingerprint = self.fingerprint('fast')
+        compiled = self._matchers.get(owner)
+        if compiled is None or compiled[0] != fingerprint:
+            compiled = self._matchers[owner] = (fingerprint, self.compile_matcher(tokenize))
+        return compiled[1]
+
+    def _get_spacy_matcher(self, nlp):
+        return self._get_matcher(nlp, lambda text: [token.text for token in nlp.tokenizer(text)])
+
+    def _backend_matcher(self):
+        if self.backend == 'fast':
+            return self._get_matcher(simple_tokenize, simple_tokenize)
+        return self._get_spacy_matcher(get_nlp())
+
     def analyze(self, text, title=None):
+        cache = get_analysis_cache()
+        if cache is None:
+            return self._analyze_uncached(text, title)
+
+        key = make_key(self.fingerprint(self.backend), text, title)
+        result = cache.get(key)
+        if result is None:
+            result = self._analyze_uncached(text, title)
+            cache.set(key, result)
+        return result
+
+    def _analyze_uncached(self, text, title):
+        # The fast backend is cheaper than a round trip to the analyzer server
+        client = get_client() if self.backend == 'spacy' else None
+        if client is not None:
+            try:
+                return client.analyze(text, title)
+            except AnalyzerUnavailable as exc:
+                logger.warning("Analyzer server unavailable, analyzing in-process: %s", exc)
+        return next(self.analyze_many([(text, title)]))
+
+    def analyze_many(self, complaints, batch_size=256, n_process=1):
+        """Analyze an iterable of ``(text, title)`` pairs, yielding results in input order.
+
+        Documents are streamed through ``nlp.pipe``, so memory stays bounded by
+        ``batch_size`` however many complaints are fed in. ``n_process > 1``
+        tokenizes batches in worker processes. The fast backend tokenizes
+        each document in turn and ignores both arguments.
+        """
+        matcher = self._backend_matcher()
+        lexicon = get_lexicon()
+        for tokens in self._token_streams(complaints, batch_size, n_process):
+            # Keyword matching and polarity share the one token stream
+            yield self._score(matcher.scan(tokens), lexicon.polarity(tokens))
+
+    def _token_streams(self, complaints, batch_size, n_process):
+        """Lowercase token texts of each ``(text, title)`` pair, in input order"""
+        full_texts = (f"{title}. {text}" if title else text for text, title in complaints)
+        if self.backend == 'fast':
+            for full_text in full_texts:
+                yield simple_tokenize(full_text.lower())
+            return
+        docs = get_nlp().pipe((full_text.lower() for full_text in full_texts),
+                              batch_size=batch_size, n_process=n_process)
+        for doc in docs:
+            yield token_texts(doc)
+
+    def quick_analyze(self, text, title=None):
+        """Keyword-only classification without spaCy or sentiment.
+
+        Costs well under a millisecond; used for provisional results that the
+        full ``analyze`` replaces later.
+        """
         full_text = f"{title}. {text}" if title else text
-        doc = nlp(full_text.lower())
-        blob = TextBlob(full_text)
-        
-        # Determine category
-        category_scores = {cat: 0 for cat in self.CATEGORY_KEYWORDS}
-        
-        # Score based on keyword matches
-        for token in doc:
-            for cat, keywords in self.CATEGORY_KEYWORDS.items():
-                if token.text in keywords:
-                    category_scores[cat] += 1
-        
-        # Check for phrase matches (more accurate for academic complaints)
-        full_text_lower = full_text.lower()
-        for cat, keywords in self.CATEGORY_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword in full_text_lower:
-                    category_scores[cat] += 1
-        
+        matcher = self._get_matcher(simple_tokenize, simple_tokenize)
+        return self._score(matcher.scan(simple_tokenize(full_text.lower())), 0.0)
+
+    def _score(self, matches, sentiment):
+        # Determine category: every occurrence scores a point and each
+        # distinct keyword scores one more (phrases count as keywords)
+        category_scores = {
+            cat: matches.count('category', cat) + matches.distinct('category', cat)
+            for cat in self.CATEGORY_KEYWORDS
+        }
         category = max(category_scores, key=category_scores.get)
-        
+
         # Determine base priority from keywords
         priority = 'LOW'
-        for token in doc:
-            for pri, keywords in self.PRIORITY_KEYWORDS.items():
-                if token.text in keywords:
-                    if pri == 'CRIT':
-                        priority = 'CRIT'
-                        break
-                    elif pri == 'HIGH' and priority != 'CRIT':
-                        priority = 'HIGH'
-                    elif pri == 'MED' and priority not in ['CRIT', 'HIGH']:
-                        priority = 'MED'
-        
+        for pri in ['CRIT', 'HIGH', 'MED']:
+            if matches.any('priority', pri):
+                priority = pri
+                break
+
         # Enhanced priority determination for academic complaints
         if category == 'ACAD':
-            priority = self._determine_academic_priority(full_text_lower, priority)
-        
+            priority = self._determine_academic_priority(matches, priority)
+
         # Adjust priority based on sentiment (more nuanced)
-        sentiment = blob.sentiment.polarity
         if sentiment <= -0.4 and priority not in ['CRIT']:
-            if category == 'ACAD' and any(phrase in full_text_lower for phrase in ['exam', 'test', 'assessment']):
-                priority = 'HIGH'
-            elif priority not in ['HIGH']:
-                priority = 'HIGH'
+            priority = 'HIGH'
         elif sentiment <= -0.15 and priority not in ['CRIT', 'HIGH']:
             priority = 'MED'
-        
+
         return {
             'category': category,
             'priority': priority,
             'sentiment_score': sentiment
         }
-    
-    def _determine_academic_priority(self, text, current_priority):
+
+    def _determine_academic_priority(self, matches, current_priority):
         """Enhanced priority determination for academic complaints"""
-        
+
         # Check time-sensitive patterns
-        for priority_level, patterns in self.TIME_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, text, re.IGNORECASE):
-                    if priority_level == 'CRIT':
-                        return 'CRIT'
-                    elif priority_level == 'HIGH' and current_priority not in ['CRIT']:
-                        current_priority = 'HIGH'
-        
+        time_levels = matches.sequences('time')
+        if 'CRIT' in time_levels:
+            return 'CRIT'
+        if 'HIGH' in time_levels and current_priority not in ['CRIT']:
+            current_priority = 'HIGH'
+
         # Check academic urgency indicators
-        for priority_level, phrases in self.ACADEMIC_URGENCY.items():
-            for phrase in phrases:
-                if phrase in text:
-                    if priority_level == 'HIGH' and current_priority not in ['CRIT']:
-                        current_priority = 'HIGH'
-                    elif priority_level == 'MED' and current_priority not in ['CRIT', 'HIGH']:
-                        current_priority = 'MED'
-        
+        if matches.any('urgency', 'HIGH') and current_priority not in ['CRIT']:
+            current_priority = 'HIGH'
+        elif matches.any('urgency', 'MED') and current_priority not in ['CRIT', 'HIGH']:
+            current_priority = 'MED'
+
         # Special case: lecturer absence + upcoming exam
-        if (any(phrase in text for phrase in ['not coming', 'hasn\'t been coming', 'not been coming']) and 
-            any(phrase in text for phrase in ['exam', 'test', 'assessment']) and
-            any(phrase in text for phrase in ['weeks', 'days'])):
+        if all(matches.any('absence', part) for part in self.LECTURER_ABSENCE):
             if current_priority not in ['CRIT']:
                 current_priority = 'HIGH'
-        
-        return current_priority
\ No newline at end of file
+
+        return current_priority
@@ -0,0 +1,130 @@
+# server.py
+"""Local analyzer daemon shared by every web worker on a host.
+
+Each web worker holding its own spaCy model multiplies analysis memory by
+the number of workers. Instead, ``manage.py analyzer_server`` runs one
+``AnalyzerServer`` on a Unix socket and the workers reach it through
+``AnalyzerClient`` (see ``client.py``).
+
+Requests from concurrent connections are collected for up to ``max_wait``
+seconds (or until ``max_batch`` are waiting) and analyzed together with a
+single ``analyze_many``/``nlp.pipe`` call.
+
+The protocol is one JSON object per line in each direction:
+``{"text": ..., "title": ...}`` is answered with ``{"result": {...}}`` or
+``{"error": "..."}``. A connection may carry any number of requests.
+"""
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+
+from .sentiment import ComplaintAnalyzer
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ('complaint', 'done', 'result', 'error')
+
+    def __init__(self, complaint):
+        self.complaint = complaint
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                complaint = (str(request['text']), request.get('title'))
+            except (ValueError, KeyError, TypeError):
+                response = {'error': 'malformed request'}
+            else:
+                pending = self.server.submit(complaint)
+                pending.done.wait()
+                if pending.error is not None:
+                    response = {'error': pending.error}
+                else:
+                    response = {'result': pending.result}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class AnalyzerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server that micro-batches analysis requests"""
+
+    daemon_threads = True
+    # Every web worker may connect at once; a full backlog fails connect() on
+    # a Unix socket immediately instead of waiting
+    request_queue_size = 128
+
+    def __init__(self, path, analyzer=None, max_batch=64, max_wait=0.005):
+        self.path = path
+        self.analyzer = analyzer or ComplaintAnalyzer()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.analyzed = 0
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+
+        # A socket file left behind by a previous run would make bind() fail
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _RequestHandler)
+        os.chmod(path, 0o660)
+
+        self._batcher = threading.Thread(target=self._run_batches, name='analyzer-batcher', daemon=True)
+        self._batcher.start()
+
+    def submit(self, complaint):
+        pending = _Pending(complaint)
+        self._queue.put(pending)
+        return pending
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batches(self):
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                results = list(self.analyzer.analyze_many(
+                    [pending.complaint for pending in batch], batch_size=len(batch)))
+            except Exception as exc:
+                logger.exception("Analysis of a batch of %d complaints failed", len(batch))
+                for pending in batch:
+                    pending.error = f"analysis failed: {exc}"
+            else:
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            self.batches += 1
+            self.analyzed += len(batch)
+            for pending in batch:
+                pending.done.set()
+
+    def server_close(self):
+        self._stopped.set()
+        super().server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
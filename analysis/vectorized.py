@@ -0,0 +1,175 @@
+# vectorized.py
+"""NumPy keyword scoring engine for bulk classification.
+
+The phrases of ComplaintAnalyzer's compiled matcher form a fixed vocabulary.
+A whole batch is matched at once: its tokens become one array of token ids,
+the matcher's trie a state transition table, and every position of the
+batch steps through the table together, one token further per step. The
+phrases found form a sparse document x phrase count matrix, scored against
+category and priority weight matrices. Only polarity, and the ordered time
+patterns of the few academic complaints that contain all their parts, are
+still computed per document.
+
+Results are identical to ``ComplaintAnalyzer.analyze_many`` when every
+weight is 1; other weights make it possible to count some keywords more
+than others.
+"""
+from itertools import islice
+
+import numpy as np
+
+from .polarity import get_lexicon
+from .sentiment import ComplaintAnalyzer
+
+PRIORITY_LEVELS = ['LOW', 'MED', 'HIGH', 'CRIT']
+LOW, MED, HIGH, CRIT = range(4)
+
+
+class VectorizedScorer:
+    """Batch scorer equivalent to ComplaintAnalyzer.
+
+    ``weights`` optionally maps ``{category: {keyword: weight}}``; keywords
+    that are not listed weigh 1.
+    """
+
+    def __init__(self, analyzer=None, weights=None):
+        self.analyzer = analyzer or ComplaintAnalyzer()
+        self.matcher = self.analyzer._backend_matcher()
+        self.categories = list(self.analyzer.CATEGORY_KEYWORDS)
+        self._academic = self.categories.index('ACAD')
+
+        # Token id 0 (any other token, a line break or the end of a
+        # document) leads every state to the dead state, the last one
+        self.token_ids, transitions, accepts = self.matcher.states()
+        self._dead = len(transitions)
+        self.transitions = np.full((len(transitions) + 1, len(self.token_ids) + 1), self._dead, dtype=np.int64)
+        for state, edges in enumerate(transitions):
+            self.transitions[state, list(edges)] = list(edges.values())
+        self.accepts = np.array([-1 if phrase_id is None else phrase_id for phrase_id in accepts] + [-1])
+
+        weights = weights or {}
+        self.category_weights = np.zeros((self.matcher.vocabulary_size, len(self.categories)))
+        for column, category in enumerate(self.categories):
+            for keyword in self.analyzer.CATEGORY_KEYWORDS[category]:
+                row = self.matcher.phrase_id(keyword)
+                self.category_weights[row, column] = weights.get(category, {}).get(keyword, 1.0)
+
+        self.priority_members = self._membership('priority', ['CRIT', 'HIGH', 'MED'])
+        self.urgency_members = self._membership('urgency', ['HIGH', 'MED'])
+        self.absence_members = self._membership('absence', list(self.analyzer.LECTURER_ABSENCE))
+
+        # One column per group of every time pattern, to find the documents
+        # that can match one
+        patterns = self.matcher.sequence_patterns('time')
+        groups = [group for _, pattern in patterns for group in pattern]
+        self.time_members = np.zeros((self.matcher.vocabulary_size, len(groups)))
+        for column, group in enumerate(groups):
+            self.time_members[list(group), column] = 1.0
+        self.time_columns = []
+        for _, pattern in patterns:
+            first = sum(len(columns) for columns in self.time_columns)
+            self.time_columns.append(list(range(first, first + len(pattern))))
+
+    def _membership(self, table, labels):
+        members = np.zeros((self.matcher.vocabulary_size, len(labels)))
+        for column, label in enumerate(labels):
+            members[list(self.matcher.group(table, label)), column] = 1.0
+        return members
+
+    def score_many(self, complaints, batch_size=10000, n_process=1):
+        """Score ``(text, title)`` pairs, yielding results in input order"""
+        streams = self.analyzer._token_streams(complaints, min(batch_size, 1000), n_process)
+        while True:
+            batch = list(islice(streams, batch_size))
+            if not batch:
+                return
+            yield from self.score_batch(batch)
+
+    def _find_phrases(self, token_lists):
+        """Document, phrase id and occurrences of every phrase found in the batch"""
+        token_id = self.token_ids.get
+        ids, lengths = [], np.zeros(len(token_lists), dtype=np.int64)
+        for row, tokens in enumerate(token_lists):
+            words = [token_id(token, 0) for token in tokens if not token.isspace() or '\n' in token]
+            words.append(0)
+            ids.extend(words)
+            lengths[row] = len(words)
+        ids = np.array(ids, dtype=np.int64)
+
+        starts = np.arange(len(ids))
+        states = np.zeros(len(ids), dtype=np.int64)
+        found_starts, found_phrases = [], []
+        for offset in range(self.matcher.max_length):
+            # A live state has not passed a 0 yet, so the next position exists
+            states = self.transitions[states, ids[starts + offset]]
+            alive = states != self._dead
+            starts, states = starts[alive], states[alive]
+            phrases = self.accepts[states]
+            found = phrases >= 0
+            found_starts.append(starts[found])
+            found_phrases.append(phrases[found])
+
+        vocabulary_size = self.matcher.vocabulary_size
+        owners = np.repeat(np.arange(len(token_lists)), lengths)
+        keys, counts = np.unique(owners[np.concatenate(found_starts)] * vocabulary_size
+                                 + np.concatenate(found_phrases), return_counts=True)
+        docs, phrases = np.divmod(keys, vocabulary_size)
+        return docs, phrases, counts
+
+    def score_batch(self, token_lists):
+        lexicon = get_lexicon()
+        size = len(token_lists)
+        sentiment = np.array([lexicon.polarity(tokens) for tokens in token_lists])
+        docs, phrases, counts = self._find_phrases(token_lists)
+
+        def per_document(values):
+            # Sparse (document x phrase) @ (phrase x column)
+            totals = np.zeros((size, values.shape[1]))
+            np.add.at(totals, docs, values)
+            return totals
+
+        # Every occurrence scores its weight, and each distinct keyword once more
+        category_scores = per_document((counts + 1)[:, None] * self.category_weights[phrases])
+        category = category_scores.argmax(axis=1)
+
+        keyword_hits = per_document(self.priority_members[phrases]) > 0
+        level = np.select([keyword_hits[:, 0], keyword_hits[:, 1], keyword_hits[:, 2]],
+                          [CRIT, HIGH, MED], LOW)
+
+        # Academic complaints: urgency phrases and lecturer absence, then time patterns
+        urgency = per_document(self.urgency_members[phrases]) > 0
+        absent = (per_document(self.absence_members[phrases]) > 0).all(axis=1)
+        academic = np.maximum.reduce([
+            level,
+            np.where(urgency[:, 0] | absent, HIGH, LOW),
+            np.where(urgency[:, 1], MED, LOW),
+        ])
+
+        # Ordered patterns depend on token positions, so the academic
+        # complaints they can still raise, and that have every part of one,
+        # are matched again one by one
+        has_group = per_document(self.time_members[phrases]) > 0
+        candidates = np.zeros(size, dtype=bool)
+        for columns in self.time_columns:
+            candidates |= has_group[:, columns].all(axis=1)
+        for row in np.flatnonzero(candidates & (category == self._academic) & (academic < CRIT)):
+            time_levels = self.matcher.scan(token_lists[row]).sequences('time')
+            if 'CRIT' in time_levels:
+                academic[row] = CRIT
+            elif 'HIGH' in time_levels:
+                academic[row] = max(academic[row], HIGH)
+        level = np.where(category == self._academic, academic, level)
+
+        # Sentiment adjustments
+        strongly_negative = (sentiment <= -0.4) & (level < CRIT)
+        negative = ~strongly_negative & (sentiment <= -0.15) & (level < HIGH)
+        level = np.where(strongly_negative, HIGH, np.where(negative, MED, level))
+
+        return [
+            {
+                'category': self.categories[category[row]],
+                'priority': PRIORITY_LEVELS[level[row]],
+                'sentiment_score': float(sentiment[row]),
+            }
+            for row in range(size)
+        ]
@@ -3,6 +3,7 @@ ASGI config for complaint_system project.
 """
 
 import os
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
@@ -17,4 +18,8 @@ application = ProtocolTypeRouter({
             routing.websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+})
+
+if settings.ANALYSIS_PRELOAD:
+    from analysis.nlp import warm_up
+    warm_up()
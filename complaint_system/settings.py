@@ -89,6 +89,66 @@ CHANNEL_LAYERS = {
 }
 
 
+# Complaint analysis
+# The spaCy model is loaded lazily on first use. Set ANALYSIS_PRELOAD to load it
+# while the WSGI/ASGI application starts instead (e.g. before workers fork).
+# ANALYSIS_BACKEND = 'fast' tokenizes with a regex and never loads spaCy, for
+# nodes that cannot spare the memory; see `manage.py analyzer_parity`.
+
+ANALYSIS_BACKEND = 'spacy'
+ANALYSIS_SPACY_MODEL = 'en_core_web_sm'
+ANALYSIS_PRELOAD = False
+
+# Analysis results are cached by content: ANALYSIS_CACHE_SIZE entries in each
+# process, backed by the cache alias below, which every worker shares.
+ANALYSIS_CACHE_SIZE = 1024
+ANALYSIS_CACHE_ALIAS = 'analysis'
+
+# When enabled, submitted complaints are saved immediately with a keyword-only
+# classification; full analysis and routing run in ANALYSIS_WORKERS processes.
+ANALYSIS_ASYNC_SUBMIT = False
+ANALYSIS_WORKERS = 2
+
+# Path of the Unix socket of `manage.py analyzer_server`. When set, web workers
+# send analysis there instead of each loading the model, and fall back to
+# in-process analysis if the server does not answer within the timeout.
+ANALYSIS_SOCKET = None
+ANALYSIS_SOCKET_TIMEOUT = 2.0
+
+# Open complaints whose text is at least this similar (Jaccard similarity of
+# word shingles) to a new submission are offered to the student to follow
+COMPLAINT_DUPLICATE_THRESHOLD = 0.4
+
+# Staff ids used for routing, by role, are cached here until a Staff record
+# changes; use a cache shared by all workers (e.g. Redis) in production
+STAFF_DIRECTORY_CACHE_ALIAS = 'default'
+STAFF_DIRECTORY_TIMEOUT = 3600
+
+# The analytics filters slice an in-process NumPy snapshot of complaint facts
+# (complaints/cube.py). Each process reads complaints saved since its last look
+# at most every ANALYTICS_CUBE_REFRESH seconds, and reloads everything every
+# ANALYTICS_CUBE_REBUILD seconds to pick up writes that bypass save()
+ANALYTICS_CUBE_REFRESH = 10
+ANALYTICS_CUBE_REBUILD = 3600
+
+
+# Caches
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analysis': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'analysis',
+        'TIMEOUT': 60 * 60 * 24 * 30,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+}
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
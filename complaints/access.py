@@ -0,0 +1,159 @@
+# access.py
+"""Materialized complaint visibility.
+
+``ComplaintViewer`` has one row per (user, complaint, reason): the student
+who submitted it, students following it, the assigned staff member,
+trackers, and the HODs of the student's department. Permission checks
+(``Complaint.can_user_view``) and "complaints I can see" lists
+(``visible_to``) are then single lookups on the (user, complaint, reason)
+index.
+
+Rows are written where visibility changes: ``Complaint.save`` for new
+complaints, ``add_trackers`` in the routing engine, and signals for
+reassignment, tracker and follower changes made through the ORM or the
+admin, and staff changes (HOD department rows, removed staff). Bulk writes
+that bypass signals (``QuerySet.update``, a student changing department)
+are repaired by ``rebuild_viewers`` (command ``rebuild_viewers``), which
+recomputes the table from the source tables.
+"""
+from .directory import get_directory
+from .models import Complaint, ComplaintViewer, Staff
+
+
+def grant(complaint, user_ids, reason):
+    """Let ``user_ids`` view ``complaint`` for ``reason``, in one INSERT"""
+    ComplaintViewer.objects.bulk_create(
+        [ComplaintViewer(user_id=user_id, complaint_id=complaint.pk, reason=reason)
+         for user_id in set(user_ids) if user_id is not None],
+        ignore_conflicts=True,
+    )
+
+
+def staff_user_ids(staff_ids, directory=None):
+    """User ids of staff members, from the directory where possible"""
+    directory = directory or get_directory()
+    user_ids = [directory.user_ids.get(staff_id) for staff_id in staff_ids]
+    missing = [staff_id for staff_id, user_id in zip(staff_ids, user_ids) if user_id is None]
+    if missing:
+        user_ids += Staff.objects.filter(pk__in=missing).values_list('user_id', flat=True)
+    return [user_id for user_id in user_ids if user_id is not None]
+
+
+def grant_trackers(complaint, staff_ids):
+    grant(complaint, staff_user_ids(staff_ids), ComplaintViewer.TRACKER)
+
+
+def grant_new_complaint(complaint, tracker_ids=()):
+    """All viewer rows of a newly created complaint, in one INSERT"""
+    directory = get_directory()
+    rows = [(complaint.student.user_id, ComplaintViewer.OWNER)]
+    if complaint.assigned_to_id is not None:
+        rows += [(user_id, ComplaintViewer.ASSIGNEE)
+                 for user_id in staff_user_ids([complaint.assigned_to_id], directory)]
+    rows += [(user_id, ComplaintViewer.TRACKER)
+             for user_id in staff_user_ids(list(tracker_ids), directory)]
+    rows += [(user_id, ComplaintViewer.DEPARTMENT)
+             for user_id in directory.heads.get(complaint.student.department_id, [])]
+    ComplaintViewer.objects.bulk_create(
+        [ComplaintViewer(user_id=user_id, complaint_id=complaint.pk, reason=reason)
+         for user_id, reason in set(rows)],
+        ignore_conflicts=True,
+    )
+
+
+def set_assignee(complaint):
+    """Replace the assignee row after ``complaint.assigned_to`` changed"""
+    ComplaintViewer.objects.filter(complaint=complaint, reason=ComplaintViewer.ASSIGNEE).delete()
+    if complaint.assigned_to_id is not None:
+        grant(complaint, staff_user_ids([complaint.assigned_to_id]), ComplaintViewer.ASSIGNEE)
+
+
+def _sync_links(through, owner_field, user_path, reason, instance, reverse):
+    if reverse:
+        links = through.objects.filter(**{owner_field: instance})
+        stale = ComplaintViewer.objects.filter(user_id=instance.user_id, reason=reason)
+    else:
+        links = through.objects.filter(complaint=instance)
+        stale = ComplaintViewer.objects.filter(complaint=instance, reason=reason)
+    stale.delete()
+    ComplaintViewer.objects.bulk_create(
+        [ComplaintViewer(user_id=user_id, complaint_id=complaint_id, reason=reason)
+         for complaint_id, user_id in links.values_list('complaint_id', user_path)],
+        ignore_conflicts=True,
+    )
+
+
+def sync_trackers(instance, reverse=False):
+    """Recompute the tracker rows of a complaint (with ``reverse``, of a staff member)"""
+    _sync_links(Complaint.trackers.through, 'staff', 'staff__user_id', ComplaintViewer.TRACKER,
+                instance, reverse)
+
+
+def sync_followers(instance, reverse=False):
+    """Recompute the follower rows of a complaint (with ``reverse``, of a student)"""
+    _sync_links(Complaint.followers.through, 'student', 'student__user_id', ComplaintViewer.FOLLOWER,
+                instance, reverse)
+
+
+def sync_staff(staff, deleted=False):
+    """Recompute the rows a staff member has through their role and department"""
+    rows = ComplaintViewer.objects.filter(user_id=staff.user_id)
+    if deleted:
+        rows.filter(reason__in=ComplaintViewer.STAFF_REASONS).delete()
+        return
+
+    rows.filter(reason=ComplaintViewer.DEPARTMENT).delete()
+    if staff.role == 'HOD' and staff.department_id is not None:
+        complaint_ids = Complaint.objects.filter(
+            student__department_id=staff.department_id).values_list('pk', flat=True)
+        ComplaintViewer.objects.bulk_create(
+            (ComplaintViewer(user_id=staff.user_id, complaint_id=complaint_id,
+                             reason=ComplaintViewer.DEPARTMENT)
+             for complaint_id in complaint_ids.iterator()),
+            batch_size=1000, ignore_conflicts=True,
+        )
+
+
+def visible_to(user, reasons=None):
+    """Complaints ``user`` may view (for any of ``reasons`` if given)"""
+    rows = ComplaintViewer.objects.filter(user=user)
+    if reasons is not None:
+        rows = rows.filter(reason__in=reasons)
+    return Complaint.objects.filter(pk__in=rows.values('complaint_id'))
+
+
+def iter_viewers(complaints, staff):
+    """(user id, complaint id, reason) of every viewer, read from the source tables.
+
+    Migration 0006 keeps its own copy; change both when a reason is added.
+    """
+    yield from ((user_id, pk, ComplaintViewer.OWNER)
+                for pk, user_id in complaints.objects.values_list('pk', 'student__user_id').iterator())
+    yield from ((user_id, pk, ComplaintViewer.ASSIGNEE)
+                for pk, user_id in complaints.objects.filter(assigned_to__isnull=False).values_list(
+                    'pk', 'assigned_to__user_id').iterator())
+    yield from ((user_id, pk, ComplaintViewer.FOLLOWER)
+                for pk, user_id in complaints.followers.through.objects.values_list(
+                    'complaint_id', 'student__user_id').iterator())
+    yield from ((user_id, pk, ComplaintViewer.TRACKER)
+                for pk, user_id in complaints.trackers.through.objects.values_list(
+                    'complaint_id', 'staff__user_id').iterator())
+    for user_id, department_id in staff.objects.filter(
+            role='HOD', department__isnull=False).values_list('user_id', 'department_id'):
+        yield from ((user_id, pk, ComplaintViewer.DEPARTMENT)
+                    for pk in complaints.objects.filter(student__department_id=department_id).values_list(
+                        'pk', flat=True).iterator())
+
+
+def rebuild_viewers(batch_size=1000):
+    """Recompute the whole viewer table; returns the number of rows written"""
+    ComplaintViewer.objects.all().delete()
+    written = 0
+    rows = []
+    for user_id, complaint_id, reason in iter_viewers(Complaint, Staff):
+        rows.append(ComplaintViewer(user_id=user_id, complaint_id=complaint_id, reason=reason))
+        if len(rows) >= batch_size:
+            written += len(ComplaintViewer.objects.bulk_create(rows, ignore_conflicts=True))
+            rows = []
+    written += len(ComplaintViewer.objects.bulk_create(rows, ignore_conflicts=True))
+    return written
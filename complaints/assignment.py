@@ -0,0 +1,161 @@
+# assignment.py
+"""Complaint routing: who handles a complaint and who tracks it.
+
+The rules are data (``ASSIGNMENT_RULES`` and ``TRACKER_RULES``). ``plan_route``
+evaluates them in memory against the staff directory and returns a
+``RouteDecision`` without touching the database, so rules can be tried out
+(dry run). ``route_complaint`` persists a decision for an existing
+complaint: one UPDATE and one bulk tracker insert, in one transaction. New
+complaints are planned before their INSERT by ``Complaint.save``.
+"""
+from django.db import transaction
+
+from .directory import get_directory
+
+
+class Rule:
+    """Roles that apply when every given condition holds.
+
+    ``location_types`` and ``location_keywords`` form one condition: it holds
+    when the location type is listed or the free-text location contains a
+    keyword. Of several matching rules in the same ``group``, only the first
+    applies. The role 'HOD' means the head of the student's department.
+    """
+
+    def __init__(self, roles, categories=None, priorities=None, location_types=None,
+                 location_keywords=None, group=None):
+        self.roles = roles
+        self.categories = categories
+        self.priorities = priorities
+        self.location_types = location_types
+        self.location_keywords = location_keywords
+        self.group = group
+
+    def matches(self, complaint):
+        if self.categories is not None and complaint.category not in self.categories:
+            return False
+        if self.priorities is not None and complaint.priority not in self.priorities:
+            return False
+        if self.location_types is not None or self.location_keywords is not None:
+            location = (complaint.location or '').lower()
+            if complaint.location_type not in (self.location_types or []) and not any(
+                    keyword in location for keyword in self.location_keywords or []):
+                return False
+        return True
+
+    def __repr__(self):
+        conditions = {name: value for name, value in vars(self).items()
+                      if name != 'roles' and value is not None}
+        return f"Rule({self.roles}, {conditions})"
+
+
+# The first matching rule picks the staff member handling the complaint
+ASSIGNMENT_RULES = [
+    Rule(['WD'], categories=['INFRA']),
+    Rule(['HW'], categories=['HOSTEL']),
+    Rule(['SA'], categories=['SAFETY', 'HARASS']),
+    Rule(['HOD'], categories=['ACAD']),
+]
+
+# Every matching rule adds trackers (first match only within a group)
+TRACKER_RULES = [
+    # Senior management follows urgent complaints
+    Rule(['VC', 'REG'], priorities=['HIGH', 'CRIT']),
+    # Infrastructure in a hostel: the Hall Warden, the Works Department handles it
+    Rule(['HW'], categories=['INFRA'], location_types=['HOSTEL'], location_keywords=['hostel'],
+         group='context'),
+    # Infrastructure in teaching rooms: the student's HOD
+    Rule(['HOD'], categories=['INFRA'], location_types=['LECTURE', 'LAB'],
+         location_keywords=['lecture', 'classroom', 'lab'], group='context'),
+    # Student welfare and academic complaints: the student's HOD
+    Rule(['HOD'], categories=['HARASS', 'SAFETY', 'ACAD', 'HOSTEL'], group='context'),
+]
+
+
+class RouteDecision:
+    """Assignee and trackers computed for a complaint, plus the rules that produced them"""
+
+    def __init__(self, assignee_id, tracker_ids, rules):
+        self.assignee_id = assignee_id
+        self.tracker_ids = tracker_ids
+        self.rules = rules
+
+    def apply(self, complaint):
+        """Set the assignee and status on the instance, without saving"""
+        if self.assignee_id is not None:
+            complaint.assigned_to_id = self.assignee_id
+            complaint.status = 'ASSG'
+
+
+def _staff_for(role, complaint, directory):
+    if role == 'HOD':
+        return directory.first('HOD', complaint.student.department_id)
+    return directory.first(role)
+
+
+def plan_route(complaint, directory=None):
+    """Dry run: the RouteDecision for a complaint, computed without any writes.
+
+    Only the staff directory is read (from the cache when possible); pass a
+    ``StaffDirectory`` to evaluate the rules against a hypothetical staff list.
+    """
+    directory = directory or get_directory()
+    applied = []
+
+    assignee_id = None
+    for rule in ASSIGNMENT_RULES:
+        if rule.matches(complaint):
+            assignee_id = _staff_for(rule.roles[0], complaint, directory)
+            applied.append(rule)
+            break
+
+    tracker_ids = []
+    groups_used = set()
+    for rule in TRACKER_RULES:
+        if rule.group in groups_used or not rule.matches(complaint):
+            continue
+        if rule.group is not None:
+            groups_used.add(rule.group)
+        applied.append(rule)
+        for role in rule.roles:
+            staff_id = _staff_for(role, complaint, directory)
+            if staff_id is not None and staff_id not in tracker_ids:
+                tracker_ids.append(staff_id)
+
+    return RouteDecision(assignee_id, tracker_ids, applied)
+
+
+def add_trackers(complaint, staff_ids, grant=True):
+    """Add trackers with a single INSERT; existing trackers are left alone.
+
+    With ``grant`` their viewer rows are added too (one more INSERT).
+    """
+    if not staff_ids:
+        return
+    Tracker = type(complaint).trackers.through
+    Tracker.objects.bulk_create(
+        [Tracker(complaint_id=complaint.pk, staff_id=staff_id) for staff_id in staff_ids],
+        ignore_conflicts=True,
+    )
+    if grant:
+        # Imported here: access imports models, which imports this module
+        from .access import grant_trackers
+        grant_trackers(complaint, staff_ids)
+
+
+def route_complaint(complaint, update_fields=()):
+    """Route an already saved complaint and persist the result.
+
+    ``update_fields`` are other changed fields to write in the same UPDATE.
+    """
+    decision = plan_route(complaint)
+    decision.apply(complaint)
+    update_fields = list(update_fields)
+    if decision.assignee_id is not None:
+        update_fields += ['assigned_to', 'status']
+    with transaction.atomic():
+        if update_fields:
+            # updated_at too, so readers of recent changes (cube.py) see the routing
+            complaint.save(update_fields=[*update_fields, 'updated_at'])
+        add_trackers(complaint, decision.tracker_ids)
+    return decision
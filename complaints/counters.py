@@ -0,0 +1,116 @@
+# counters.py
+"""Dashboard counters.
+
+``ComplaintCounter`` holds, for each scope, the number of complaints per
+(status, priority, category, location type). The scopes are:
+
+- a student's complaints;
+- the complaints of a department's students;
+- the complaints assigned to a staff member;
+- the complaints a staff member tracks;
+- the complaints a staff user may view (``visible``, the staff rows of the
+  viewer table).
+
+On SQLite, triggers (migration 0008) adjust the counters in the same
+transaction as every write to complaints, trackers and viewer rows,
+including ``bulk_update`` and ``QuerySet.update``. Dashboard statistics are
+then one indexed read (``get_tallies``). On other databases the same
+figures are aggregated from the live tables. A student changing department
+is not tracked; ``rebuild_counters`` (command ``rebuild_counters``)
+recomputes everything.
+"""
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import Complaint, ComplaintCounter, ComplaintViewer
+
+BREAKDOWN = ('status', 'priority', 'category', 'location_type')
+
+
+def _live(scope, scope_ids=None):
+    """(scope id, status, priority, category, location type, count) from the source tables"""
+    if scope == ComplaintCounter.VISIBLE:
+        rows = ComplaintViewer.objects.filter(reason__in=ComplaintViewer.STAFF_REASONS)
+        key, prefix, counted = 'user_id', 'complaint__', Count('complaint_id', distinct=True)
+    elif scope == ComplaintCounter.TRACKER:
+        rows = Complaint.trackers.through.objects.all()
+        key, prefix, counted = 'staff_id', 'complaint__', Count('pk')
+    else:
+        key = {
+            ComplaintCounter.STUDENT: 'student_id',
+            ComplaintCounter.DEPARTMENT: 'student__department_id',
+            ComplaintCounter.ASSIGNEE: 'assigned_to_id',
+        }[scope]
+        rows = Complaint.objects.filter(**{f'{key}__isnull': False})
+        prefix, counted = '', Count('pk')
+
+    if scope_ids is not None:
+        rows = rows.filter(**{f'{key}__in': scope_ids})
+    fields = [key, *(prefix + field for field in BREAKDOWN)]
+    for row in rows.values_list(*fields).annotate(count=counted).order_by():
+        *values, count = row
+        values[-1] = values[-1] or ''
+        yield (*values, count)
+
+
+class Tally:
+    """Complaint counts of one scope; ``count()`` filters by status, priority, category or location type"""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    def count(self, **filters):
+        total = 0
+        for row in self.rows:
+            if all(getattr(row, field) in ([value] if isinstance(value, str) else value)
+                   for field, value in filters.items()):
+                total += row.count
+        return total
+
+
+def counter_filters(filters):
+    """``Tally.count`` arguments for the dashboard filters the counters can answer"""
+    counted = {}
+    for name, value in filters.items():
+        if name in BREAKDOWN and value:
+            counted[name] = value.split(',') if ',' in value else value
+    return counted
+
+
+def get_tallies(*scopes):
+    """A Tally for each (scope, scope id) pair, read in one query where counters are maintained"""
+    scopes = [(scope, scope_id) for scope, scope_id in scopes if scope_id is not None]
+    tallies = {key: Tally() for key in scopes}
+    if not scopes:
+        return tallies
+
+    if connection.vendor == 'sqlite':
+        condition = Q()
+        for scope, scope_id in scopes:
+            condition |= Q(scope=scope, scope_id=scope_id)
+        rows = ComplaintCounter.objects.filter(condition, count__gt=0)
+    else:
+        rows = [
+            ComplaintCounter(scope=scope, scope_id=scope_id, status=status, priority=priority,
+                             category=category, location_type=location_type, count=count)
+            for scope, scope_id in scopes
+            for scope_id, status, priority, category, location_type, count in _live(scope, [scope_id])
+        ]
+    for row in rows:
+        tallies[(row.scope, row.scope_id)].rows.append(row)
+    return tallies
+
+
+def rebuild_counters(batch_size=1000):
+    """Recompute every counter from the source tables; returns the number of rows written"""
+    ComplaintCounter.objects.all().delete()
+    written = 0
+    for scope in (ComplaintCounter.STUDENT, ComplaintCounter.DEPARTMENT, ComplaintCounter.ASSIGNEE,
+                  ComplaintCounter.TRACKER, ComplaintCounter.VISIBLE):
+        written += len(ComplaintCounter.objects.bulk_create(
+            [ComplaintCounter(scope=scope, scope_id=scope_id, status=status, priority=priority,
+                              category=category, location_type=location_type, count=count)
+             for scope_id, status, priority, category, location_type, count in _live(scope)],
+            batch_size=batch_size,
+        ))
+    return written
@@ -0,0 +1,286 @@
+# cube.py
+"""In-process columnar snapshot of complaint facts for analytics drill-down.
+
+Each complaint is one position in a set of NumPy arrays, sorted by id:
+creation, first assignment and resolution times (epoch seconds, -1 for
+none), the creation day in TIME_ZONE, sentiment, and the category,
+priority, status, location type, department and assignee as small integer
+codes into per-column dictionaries. A filter on any combination of date
+range, department, category, status and location type is a boolean mask, and
+cross-tabs, sentiment histograms and resolution-time percentiles are
+vectorized reductions over it, with no database query.
+
+``get_cube`` keeps one cube per process. At most every
+ANALYTICS_CUBE_REFRESH seconds it reads the complaints whose ``updated_at``
+moved past the newest one it holds. When the count, largest and sum of the
+complaint ids differ from its own, it drops the deleted ids and reads the
+ones it missed (committed with an older ``updated_at``). Writes that leave
+``updated_at`` alone (``QuerySet.update``, ``bulk_update``, a student
+changing department) are picked up by the full rebuild every
+ANALYTICS_CUBE_REBUILD seconds.
+"""
+import datetime
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from django.db.models import Count, Max, Sum
+
+from .models import Complaint
+from .rollups import RESOLVED, figures
+
+CODED = ('category', 'priority', 'status', 'location_type', 'department', 'assignee')
+SOURCE = {
+    'category': 'category',
+    'priority': 'priority',
+    'status': 'status',
+    'location_type': 'location_type',
+    'department': 'student__department_id',
+    'assignee': 'assigned_to_id',
+}
+
+
+def _epoch(value):
+    return int(value.timestamp())
+
+
+def _epoch_or_none(value):
+    return -1 if value is None else int(value.timestamp())
+
+
+class Dictionary:
+    """Codes for the values of one column; code 0 stands for None or ''"""
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0, '': 0}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """Code of an existing value, or -1 (matches nothing)"""
+        return self.codes.get(value, -1)
+
+    def decode(self, codes):
+        return [self.values[code] for code in codes]
+
+
+class ComplaintCube:
+    def __init__(self):
+        self.dictionaries = {column: Dictionary() for column in CODED}
+        self.ids = np.empty(0, dtype=np.int64)
+        self.created = np.empty(0, dtype=np.int64)
+        self.day = np.empty(0, dtype='datetime64[D]')
+        self.assigned = np.empty(0, dtype=np.int64)
+        self.resolved = np.empty(0, dtype=np.int64)
+        self.sentiment = np.empty(0, dtype=np.float32)
+        self.codes = {column: np.empty(0, dtype=np.int32) for column in CODED}
+        self.watermark = None
+        self.refreshed_at = self.built_at = 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Loading
+
+    def _load(self, complaints):
+        """Upsert the facts of ``complaints`` (a queryset); returns the number of rows read"""
+        rows = list(complaints.values_list('id', 'created_at', 'updated_at', 'assigned_at', 'resolved_at',
+                                           'sentiment_score', *SOURCE.values()))
+        if not rows:
+            return 0
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        created = np.fromiter((_epoch(row[1]) for row in rows), dtype=np.int64, count=len(rows))
+        day = np.array([timezone.localtime(row[1]).date() for row in rows], dtype='datetime64[D]')
+        assigned = np.fromiter((_epoch_or_none(row[3]) for row in rows), dtype=np.int64, count=len(rows))
+        resolved = np.fromiter((_epoch_or_none(row[4]) for row in rows), dtype=np.int64, count=len(rows))
+        sentiment = np.fromiter((row[5] or 0.0 for row in rows), dtype=np.float32, count=len(rows))
+        codes = {
+            column: np.fromiter((self.dictionaries[column].encode(row[6 + index]) for row in rows),
+                                dtype=np.int32, count=len(rows))
+            for index, column in enumerate(CODED)
+        }
+        newest = max(row[2] for row in rows)
+        self.watermark = newest if self.watermark is None else max(self.watermark, newest)
+
+        position = np.searchsorted(self.ids, ids)
+        known = position < len(self.ids)
+        known[known] = self.ids[position[known]] == ids[known]
+        at = position[known]
+        self.created[at] = created[known]
+        self.day[at] = day[known]
+        self.assigned[at] = assigned[known]
+        self.resolved[at] = resolved[known]
+        self.sentiment[at] = sentiment[known]
+        for column in CODED:
+            self.codes[column][at] = codes[column][known]
+
+        added = ~known
+        if added.any():
+            self.ids = np.concatenate([self.ids, ids[added]])
+            self.created = np.concatenate([self.created, created[added]])
+            self.day = np.concatenate([self.day, day[added]])
+            self.assigned = np.concatenate([self.assigned, assigned[added]])
+            self.resolved = np.concatenate([self.resolved, resolved[added]])
+            self.sentiment = np.concatenate([self.sentiment, sentiment[added]])
+            for column in CODED:
+                self.codes[column] = np.concatenate([self.codes[column], codes[column][added]])
+            if len(self.ids) > 1 and (np.diff(self.ids) < 0).any():
+                self._keep(np.argsort(self.ids, kind='stable'))
+        return len(rows)
+
+    def _keep(self, index):
+        """Keep (and reorder to) the rows at ``index``, an index array or a mask"""
+        self.ids = self.ids[index]
+        self.created = self.created[index]
+        self.day = self.day[index]
+        self.assigned = self.assigned[index]
+        self.resolved = self.resolved[index]
+        self.sentiment = self.sentiment[index]
+        for column in CODED:
+            self.codes[column] = self.codes[column][index]
+
+    @classmethod
+    def build(cls):
+        cube = cls()
+        cube._load(Complaint.objects.order_by())
+        cube.refreshed_at = cube.built_at = time.monotonic()
+        return cube
+
+    def refresh(self):
+        """Read complaints saved since the last refresh and reconcile the ids held"""
+        if self.watermark is None:
+            self._load(Complaint.objects.order_by())
+        else:
+            # Rows saved within the same timestamp as the watermark are read again, harmlessly
+            self._load(Complaint.objects.filter(updated_at__gte=self.watermark).order_by())
+        stored = Complaint.objects.order_by().aggregate(count=Count('id'), last=Max('id'), total=Sum('id'))
+        held = {'count': 0, 'last': None, 'total': None}
+        if len(self.ids):
+            held = {'count': len(self.ids), 'last': int(self.ids[-1]), 'total': int(self.ids.sum())}
+        if stored != held:
+            # Deleted complaints, or ones committed with an updated_at older than the watermark
+            existing = np.fromiter(Complaint.objects.values_list('id', flat=True).order_by(), dtype=np.int64)
+            self._keep(np.isin(self.ids, existing))
+            missing = np.setdiff1d(existing, self.ids)
+            if len(missing):
+                self._load(Complaint.objects.filter(pk__in=missing.tolist()).order_by())
+        self.refreshed_at = time.monotonic()
+
+    # Slicing
+
+    def mask(self, start=None, end=None, **filters):
+        """Positions of the complaints created from ``start`` to ``end`` (days in TIME_ZONE, inclusive)
+        whose coded columns equal the given values, e.g. ``category='INFRA'``, ``department=3``"""
+        selected = np.ones(len(self.ids), dtype=bool)
+        if start is not None:
+            selected &= self.day >= np.datetime64(start, 'D')
+        if end is not None:
+            selected &= self.day <= np.datetime64(end, 'D')
+        for column, value in filters.items():
+            if value is not None and value != '':
+                selected &= self.codes[column] == self.dictionaries[column].code(value)
+        return selected
+
+    def _resolved(self):
+        return np.isin(self.codes['status'], [self.dictionaries['status'].code(status) for status in RESOLVED])
+
+    def resolution_seconds(self, selected):
+        """resolved_at - created_at of the resolved and closed complaints in ``selected`` with a resolved_at"""
+        timed = self._resolved() & selected & (self.resolved >= 0)
+        return (self.resolved[timed] - self.created[timed]).astype(np.float64)
+
+    def assignment_seconds(self, selected):
+        """assigned_at - created_at of the complaints in ``selected`` with an assigned_at"""
+        timed = selected & (self.assigned >= 0)
+        return (self.assigned[timed] - self.created[timed]).astype(np.float64)
+
+    def _tally(self, column, selected):
+        """``{value: count}`` of a coded column over ``selected``"""
+        counts = np.bincount(self.codes[column][selected], minlength=len(self.dictionaries[column].values))
+        values = self.dictionaries[column].values
+        return {values[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+    def summary(self, selected, top=5):
+        """The analytics dashboard figures (``rollups.figures``) for ``selected``"""
+        resolved = self._resolved() & selected
+        months = self.day[selected].astype('datetime64[M]')
+        month_values, month_counts = np.unique(months, return_counts=True)
+        tallies = {
+            'status': self._tally('status', selected),
+            'category': self._tally('category', selected),
+            'priority': self._tally('priority', selected),
+            'month': {month: int(count) for month, count in
+                      zip(month_values.astype('datetime64[D]').tolist(), month_counts)},
+            'department': {value or 0: count for value, count in self._tally('department', selected).items()},
+            'resolved_by': {value: count for value, count in self._tally('assignee', resolved).items() if value},
+        }
+        resolution = self.resolution_seconds(selected)
+        assignment = self.assignment_seconds(selected)
+        totals = {
+            'count': int(selected.sum()),
+            'resolved_count': len(resolution),
+            'resolution_seconds': float(resolution.sum()),
+            'assigned_count': len(assignment),
+            'assignment_seconds': float(assignment.sum()),
+            'sentiment_total': float(self.sentiment[selected].sum(dtype=np.float64)),
+        }
+        return figures(tallies, totals, top)
+
+    def crosstab(self, selected, rows, columns):
+        """``{row value: {column value: count}}`` of two coded columns over ``selected``"""
+        row_codes = self.codes[rows][selected]
+        column_codes = self.codes[columns][selected]
+        width = len(self.dictionaries[columns].values)
+        table = np.bincount(row_codes * width + column_codes,
+                            minlength=len(self.dictionaries[rows].values) * width).reshape(-1, width)
+        row_names = self.dictionaries[rows].values
+        column_names = self.dictionaries[columns].values
+        return {
+            row_names[row]: {column_names[column]: int(table[row, column])
+                             for column in np.flatnonzero(table[row])}
+            for row in np.flatnonzero(table.sum(axis=1))
+        }
+
+    def sentiment_histogram(self, selected, bins=10):
+        """(bin edges, counts) of sentiment scores over [-1, 1]"""
+        counts, edges = np.histogram(self.sentiment[selected], bins=bins, range=(-1.0, 1.0))
+        return [round(float(edge), 2) for edge in edges], [int(count) for count in counts]
+
+    def resolution_percentiles(self, selected, percentiles=(50, 90, 95)):
+        """``{percentile: timedelta}`` of resolution time, empty without resolved complaints"""
+        durations = self.resolution_seconds(selected)
+        if not len(durations):
+            return {}
+        values = np.percentile(durations, percentiles)
+        return {percentile: datetime.timedelta(seconds=float(value))
+                for percentile, value in zip(percentiles, values)}
+
+
+_cube = None
+_lock = threading.Lock()
+
+
+def get_cube():
+    """This process's cube, refreshed or rebuilt when due"""
+    global _cube
+    with _lock:
+        now = time.monotonic()
+        if _cube is None or now - _cube.built_at >= settings.ANALYTICS_CUBE_REBUILD:
+            _cube = ComplaintCube.build()
+        elif now - _cube.refreshed_at >= settings.ANALYTICS_CUBE_REFRESH:
+            _cube.refresh()
+        return _cube
+
+
+def reset_cube():
+    global _cube
+    with _lock:
+        _cube = None
@@ -0,0 +1,72 @@
+# directory.py
+"""Staff routing directory: which staff member handles each role.
+
+Routing a complaint needs "the first staff member with role X", optionally
+within a department, several times over. The directory answers those from
+two dictionaries built with a single query. It is stored in the Django
+cache (STAFF_DIRECTORY_CACHE_ALIAS), so workers sharing a cache backend also
+share one copy, and Staff post_save/post_delete signals drop it (see
+``signals.py``).
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_KEY = 'complaints:staff-directory'
+
+
+class StaffDirectory:
+    """Staff ids by role and by (role, department id), lowest id first like ``.first()``.
+
+    Also maps staff ids to user ids and departments to the user ids of their
+    HODs, for the viewer table (see ``access.py``).
+    """
+
+    def __init__(self, by_role, by_department, user_ids=None, heads=None):
+        self.by_role = by_role
+        self.by_department = by_department
+        self.user_ids = user_ids or {}
+        self.heads = heads or {}
+
+    @classmethod
+    def build(cls):
+        from .models import Staff
+
+        by_role = {}
+        by_department = {}
+        user_ids = {}
+        heads = {}
+        for staff_id, role, department_id, user_id in Staff.objects.order_by('pk').values_list(
+                'pk', 'role', 'department_id', 'user_id'):
+            by_role.setdefault(role, staff_id)
+            user_ids[staff_id] = user_id
+            if department_id is not None:
+                by_department.setdefault((role, department_id), staff_id)
+                if role == 'HOD':
+                    heads.setdefault(department_id, []).append(user_id)
+        return cls(by_role, by_department, user_ids, heads)
+
+    def first(self, role, department_id=None):
+        """Id of the staff member with ``role`` (in ``department_id`` if given), or None"""
+        if department_id is None:
+            return self.by_role.get(role)
+        return self.by_department.get((role, department_id))
+
+
+def _cache():
+    return caches[settings.STAFF_DIRECTORY_CACHE_ALIAS]
+
+
+def get_directory():
+    directory = _cache().get(CACHE_KEY)
+    if directory is None:
+        directory = StaffDirectory.build()
+        _cache().set(CACHE_KEY, directory, settings.STAFF_DIRECTORY_TIMEOUT)
+    return directory
+
+
+def invalidate_directory():
+    _cache().delete(CACHE_KEY)
+    # Another worker may rebuild from the old rows before this transaction
+    # commits, so drop the directory again once it has
+    transaction.on_commit(lambda: _cache().delete(CACHE_KEY))
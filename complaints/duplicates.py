@@ -0,0 +1,75 @@
+# duplicates.py
+"""Near-duplicate lookup for complaints being submitted.
+
+Every open complaint stores the LSH bucket keys of its text
+(``DuplicateBucket``), written by ``Complaint.save`` on submission and
+removed when the complaint is resolved or closed. A new complaint's keys are looked up through
+the index on ``key``, the open complaints sharing the most buckets are
+verified with the exact shingle Jaccard similarity, and those at or above
+COMPLAINT_DUPLICATE_THRESHOLD are offered to the student to follow.
+"""
+from django.conf import settings
+from django.db.models import Count, Q
+
+from analysis.minhash import band_keys, jaccard, shingles
+from .models import Complaint, DuplicateBucket
+
+OPEN_STATUSES = ['PEND', 'REVW', 'ASSG', 'PROG']
+
+# Never offered to other students as something to follow
+PRIVATE_CATEGORIES = ['HARASS']
+
+# Complaints sharing the most buckets that are verified exactly
+MAX_CANDIDATES = 20
+
+
+def followable(queryset):
+    """Complaints other students may see and follow"""
+    return queryset.filter(status__in=OPEN_STATUSES, is_confidential=False).exclude(
+        category__in=PRIVATE_CATEGORIES)
+
+
+def find_duplicates(title, description, student=None, limit=3):
+    """Open complaints that are likely duplicates, most similar first.
+
+    Each has a ``similarity`` attribute. The student's own complaints are left out.
+    """
+    query = shingles(f"{title}\n{description}")
+    keys = band_keys(query)
+    if not keys:
+        return []
+
+    candidates = followable(Complaint.objects.filter(duplicate_buckets__key__in=keys))
+    if student is not None:
+        candidates = candidates.exclude(student=student)
+    candidates = (
+        candidates.annotate(shared=Count('duplicate_buckets', filter=Q(duplicate_buckets__key__in=keys)))
+        .order_by('-shared', '-created_at')
+        .only('title', 'description', 'category', 'status', 'location', 'created_at')
+        [:MAX_CANDIDATES]
+    )
+
+    duplicates = []
+    for complaint in candidates:
+        complaint.similarity = jaccard(query, complaint.duplicate_shingles())
+        if complaint.similarity >= settings.COMPLAINT_DUPLICATE_THRESHOLD:
+            duplicates.append(complaint)
+    duplicates.sort(key=lambda complaint: complaint.similarity, reverse=True)
+    return duplicates[:limit]
+
+
+def rebuild_index(batch_size=1000):
+    """Recompute the bucket keys of every open complaint; returns how many were indexed"""
+    DuplicateBucket.objects.all().delete()
+    indexed = 0
+    buckets = []
+    for complaint in Complaint.objects.filter(status__in=OPEN_STATUSES).only(
+            'title', 'description').iterator(chunk_size=batch_size):
+        buckets.extend(DuplicateBucket(complaint=complaint, key=key)
+                       for key in set(band_keys(complaint.duplicate_shingles())))
+        indexed += 1
+        if len(buckets) >= batch_size:
+            DuplicateBucket.objects.bulk_create(buckets)
+            buckets = []
+    DuplicateBucket.objects.bulk_create(buckets)
+    return indexed
@@ -0,0 +1,161 @@
+# events.py
+"""The complaint timeline.
+
+``ComplaintEvent`` rows are added, never changed: on creation, when the
+assignee or status changes (``Complaint.save`` compares with the values
+loaded from the database), on escalation and on every comment. The first
+assignment and the latest resolution are also kept on the complaint
+(``assigned_at``, ``resolved_at``), so time-to-assign and time-to-resolve
+are sums in the analytics rollups. The tracking page reads a complaint's
+timeline with one query on the (complaint, created_at) index.
+"""
+import re
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Comment, Complaint, ComplaintEvent
+
+RESOLVED = ('RESV', 'CLSD')
+STATUS_CODES = {name: code for code, name in Complaint.STATUS_CHOICES}
+
+
+def creation_events(complaint, actor=None):
+    """Events of a complaint just inserted"""
+    events = [ComplaintEvent(complaint=complaint, kind=ComplaintEvent.CREATED, actor=actor,
+                             to_status=complaint.status, created_at=complaint.created_at)]
+    if complaint.assigned_to_id is not None:
+        # Routed as part of the submission
+        events.append(ComplaintEvent(complaint=complaint, kind=ComplaintEvent.ASSIGNED,
+                                     assignee_id=complaint.assigned_to_id, created_at=complaint.created_at))
+    return events
+
+
+def change_events(complaint, actor=None, update_fields=None):
+    """Events for the changes ``complaint.save`` is about to write.
+
+    Sets ``assigned_at`` and ``resolved_at`` as needed and returns the events
+    with the names of the fields it set.
+    """
+    stored = getattr(complaint, '_stored', {})
+    saving = None if update_fields is None else set(update_fields)
+    now = timezone.now()
+    events, changed = [], []
+
+    if ('assigned_to_id' in stored and (saving is None or 'assigned_to' in saving)
+            and complaint.assigned_to_id != stored['assigned_to_id'] and complaint.assigned_to_id is not None):
+        events.append(ComplaintEvent(complaint=complaint, kind=ComplaintEvent.ASSIGNED, actor=actor,
+                                     assignee_id=complaint.assigned_to_id, created_at=now))
+        if complaint.assigned_at is None:
+            complaint.assigned_at = now
+            changed.append('assigned_at')
+
+    if ('status' in stored and (saving is None or 'status' in saving)
+            and complaint.status != stored['status']):
+        resolving = complaint.status in RESOLVED and stored['status'] not in RESOLVED
+        events.append(ComplaintEvent(
+            complaint=complaint, kind=ComplaintEvent.RESOLVED if resolving else ComplaintEvent.STATUS_CHANGED,
+            actor=actor, from_status=stored['status'], to_status=complaint.status, created_at=now))
+        if resolving:
+            complaint.resolved_at = now
+            changed.append('resolved_at')
+    return events, changed
+
+
+def record(complaint, kind, actor=None, **fields):
+    """Add one event to ``complaint``'s timeline, e.g. an escalation"""
+    return ComplaintEvent.objects.create(complaint=complaint, kind=kind, actor=actor, **fields)
+
+
+def timeline(complaint, internal=False):
+    """Events of ``complaint`` in order, without internal ones unless asked for"""
+    events = ComplaintEvent.objects.filter(complaint=complaint)
+    if not internal:
+        events = events.filter(is_internal=False)
+    return events.select_related('actor', 'assignee__user', 'comment').order_by('created_at', 'pk')
+
+
+# Backfill from the comments written before the timeline existed
+
+STATUS_LINE = re.compile(r'^Status changed from (.+) to (.+)$')
+ESCALATION = 'ESCALATED by student'
+STUDENT_RESOLVED = 'Student marked this complaint as resolved'
+ESTIMATED = 'Time estimated from the complaint'
+
+
+def _parse(comment, status):
+    """The event for an old comment, given the status before it (or '')"""
+    event = ComplaintEvent(complaint_id=comment.complaint_id, kind=ComplaintEvent.COMMENTED,
+                           actor_id=comment.author.user_id if comment.author_id else None,
+                           comment=comment, is_internal=comment.is_internal, created_at=comment.created_at)
+    content = comment.content.strip()
+    match = STATUS_LINE.match(content)
+    # Old status comments named the new status on both sides, so the previous
+    # status is taken from the comments before instead
+    new_status = STATUS_CODES.get(match.group(2).strip()) if match else None
+    if content.startswith(STUDENT_RESOLVED):
+        new_status = 'RESV'
+    if new_status is not None:
+        resolving = new_status in RESOLVED and status not in RESOLVED
+        event.kind = ComplaintEvent.RESOLVED if resolving else ComplaintEvent.STATUS_CHANGED
+        event.from_status, event.to_status = status, new_status
+    elif content.startswith(ESCALATION):
+        event.kind = ComplaintEvent.ESCALATED
+        event.note = content[len(ESCALATION):].strip()
+    return event
+
+
+def backfill_events(batch_size=500):
+    """Timelines for the complaints without any event, parsed from their comments.
+
+    Assignment times not found are estimated as the creation time (routing
+    runs on submission) and resolution times as the last update. Sets
+    ``assigned_at`` and ``resolved_at``; returns the number of complaints done.
+    """
+    pending = Complaint.objects.exclude(pk__in=ComplaintEvent.objects.values('complaint_id')).order_by('pk')
+    done = last = 0
+    while True:
+        batch = list(pending.filter(pk__gt=last).only(
+            'status', 'created_at', 'updated_at', 'assigned_to', 'assigned_at', 'resolved_at')[:batch_size])
+        if not batch:
+            return done
+        threads = {complaint.pk: [] for complaint in batch}
+        for comment in Comment.objects.filter(complaint_id__in=threads).select_related('author').order_by(
+                'complaint_id', 'created_at', 'pk'):
+            threads[comment.complaint_id].append(comment)
+
+        events, timed = [], []
+        with transaction.atomic():
+            for complaint in batch:
+                timeline = [ComplaintEvent(complaint=complaint, kind=ComplaintEvent.CREATED,
+                                           created_at=complaint.created_at)]
+                if complaint.assigned_to_id is not None:
+                    timeline.append(ComplaintEvent(complaint=complaint, kind=ComplaintEvent.ASSIGNED,
+                                                   assignee_id=complaint.assigned_to_id, note=ESTIMATED,
+                                                   created_at=complaint.assigned_at or complaint.created_at))
+                status, resolved_at = '', None
+                for comment in threads[complaint.pk]:
+                    event = _parse(comment, status)
+                    timeline.append(event)
+                    if event.to_status:
+                        status = event.to_status
+                    if event.kind == ComplaintEvent.RESOLVED:
+                        resolved_at = event.created_at
+                if complaint.status in RESOLVED and resolved_at is None:
+                    resolved_at = complaint.resolved_at or complaint.updated_at
+                    timeline.append(ComplaintEvent(complaint=complaint, kind=ComplaintEvent.RESOLVED,
+                                                   from_status=status if status not in RESOLVED else '',
+                                                   to_status=complaint.status, note=ESTIMATED,
+                                                   created_at=resolved_at))
+                events.extend(timeline)
+
+                if complaint.assigned_to_id is not None and complaint.assigned_at is None:
+                    complaint.assigned_at = complaint.created_at
+                if complaint.status in RESOLVED and complaint.resolved_at is None:
+                    complaint.resolved_at = resolved_at
+                timed.append(complaint)
+            ComplaintEvent.objects.bulk_create(events, batch_size=batch_size)
+            # The rollup triggers follow the new times
+            Complaint.objects.bulk_update(timed, ['assigned_at', 'resolved_at'], batch_size=batch_size)
+        done += len(batch)
+        last = batch[-1].pk
@@ -0,0 +1,150 @@
+# export.py
+"""Streaming exports of complaints and their comment threads.
+
+Records are read with ``.iterator(chunk_size=...)`` in id order, with the
+comments of each chunk of complaints fetched in one query, encoded as CSV or
+JSON Lines into ~64 KiB pieces and optionally gzip-compressed on the fly. At
+no point is more than one chunk held in memory, whatever the number of rows.
+Used by the ``export_complaints`` view and management command.
+"""
+import csv
+import datetime
+import io
+import json
+import zlib
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils.dateparse import parse_date
+
+from .models import Comment
+
+COMPLAINTS = 'complaints'
+COMMENTS = 'comments'
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = {CSV: 'text/csv', JSONL: 'application/x-ndjson'}
+
+COMPLAINT_FIELDS = ['id', 'title', 'description', 'category', 'priority', 'status', 'location',
+                    'location_type', 'sentiment_score', 'created_at', 'updated_at']
+COMPLAINT_RELATED = {
+    'student_number': F('student__student_id'),
+    'department': F('student__department__name'),
+    'assignee': F('assigned_to__user__username'),
+}
+COMMENT_FIELDS = ['id', 'complaint_id', 'content', 'is_internal', 'created_at']
+COMMENT_RELATED = {'author_username': F('author__user__username')}
+
+PIECE_SIZE = 64 * 1024
+
+
+def parse_day(value):
+    """A YYYY-MM-DD value as a date, or None if missing or invalid"""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def filter_complaints(complaints, filters):
+    """Apply the dashboard filters (start, end, department, category, status, priority, location_type).
+
+    Values are strings as found in a query string; start and end are UTC
+    creation days, inclusive, and status may be a comma-separated list.
+    """
+    start = parse_day(filters.get('start'))
+    end = parse_day(filters.get('end'))
+    if start is not None:
+        complaints = complaints.filter(created_at__gte=datetime.datetime.combine(
+            start, datetime.time.min, tzinfo=datetime.timezone.utc))
+    if end is not None:
+        complaints = complaints.filter(created_at__lt=datetime.datetime.combine(
+            end + datetime.timedelta(days=1), datetime.time.min, tzinfo=datetime.timezone.utc))
+    department = filters.get('department')
+    if department and str(department).isdigit():
+        complaints = complaints.filter(student__department_id=int(department))
+    if filters.get('status'):
+        complaints = complaints.filter(status__in=filters['status'].split(','))
+    for name in ('category', 'priority', 'location_type'):
+        if filters.get(name):
+            complaints = complaints.filter(**{name: filters[name]})
+    return complaints
+
+
+def complaint_records(complaints, with_comments=False, chunk_size=2000):
+    """Complaint dicts in id order, each with its ``comments`` thread if asked for"""
+    rows = complaints.order_by('pk').values(*COMPLAINT_FIELDS, **COMPLAINT_RELATED).iterator(chunk_size=chunk_size)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        if with_comments:
+            threads = {row['id']: [] for row in batch}
+            comments = Comment.objects.filter(complaint_id__in=threads).order_by('complaint_id', 'created_at', 'pk')
+            for comment in comments.values(*COMMENT_FIELDS, **COMMENT_RELATED):
+                threads[comment['complaint_id']].append(comment)
+            for row in batch:
+                row['comments'] = threads[row['id']]
+        yield from batch
+
+
+def comment_records(complaints, chunk_size=2000):
+    """Comment dicts of ``complaints``, by complaint and then in thread order"""
+    return Comment.objects.filter(complaint__in=complaints.order_by().values('pk')).order_by(
+        'complaint_id', 'created_at', 'pk').values(*COMMENT_FIELDS, **COMMENT_RELATED).iterator(chunk_size=chunk_size)
+
+
+def csv_pieces(records, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fields, extrasaction='ignore')
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        if buffer.tell() >= PIECE_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_pieces(records):
+    lines, size = [], 0
+    for record in records:
+        line = json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= PIECE_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines, size = [], 0
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzipped(pieces):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for piece in pieces:
+        data = compressor.compress(piece)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(complaints, kind=COMPLAINTS, fmt=CSV, compress=True, chunk_size=2000):
+    """Byte pieces of an export of ``complaints`` (or of their comments).
+
+    JSON Lines complaints carry their comment thread; CSV has one row per
+    complaint, so the threads are a separate ``comments`` export.
+    """
+    if kind == COMMENTS:
+        records = comment_records(complaints, chunk_size)
+        fields = COMMENT_FIELDS + list(COMMENT_RELATED)
+    else:
+        records = complaint_records(complaints, with_comments=fmt == JSONL, chunk_size=chunk_size)
+        fields = COMPLAINT_FIELDS + list(COMPLAINT_RELATED)
+    pieces = (piece.encode() for piece in (jsonl_pieces(records) if fmt == JSONL else csv_pieces(records, fields)))
+    return gzipped(pieces) if compress else pieces
+
+
+def filename(kind=COMPLAINTS, fmt=CSV, compress=True):
+    return f"{kind}-{datetime.date.today():%Y%m%d}.{fmt}{'.gz' if compress else ''}"
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from analysis import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the fast (regex) analyzer backend with the spaCy backend on the labelled "
+        "corpus and list the complaints whose category or priority differ."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help="Generated complaints added to the comparison")
+        parser.add_argument('--reference', choices=['spacy', 'fast'], default='spacy')
+        parser.add_argument('--candidate', choices=['spacy', 'fast'], default='fast')
+        parser.add_argument('--json', action='store_true', help="Print the raw report as JSON")
+
+    def handle(self, *args, **options):
+        corpus = benchmark.load_corpus() + benchmark.synthetic_corpus(options['synthetic'])
+        report = benchmark.compare_backends(corpus, options['reference'], options['candidate'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        startup = report['candidate_startup']
+        self.stdout.write(
+            f"{report['candidate']} backend first use: {startup['seconds'] * 1000:.1f} ms, "
+            f"{startup['resident_bytes'] / 2**20:.1f} MiB"
+        )
+        agreement = ', '.join(f"{field} {share:.1%}" for field, share in report['agreement'].items())
+        self.stdout.write(f"{report['candidate']} vs {report['reference']} on {report['compared']} docs: "
+                          f"{agreement}; largest sentiment difference "
+                          f"{report['max_sentiment_delta']:.3f}")
+        for difference in report['differences']:
+            reference, candidate = difference['reference'], difference['candidate']
+            self.stdout.write(self.style.WARNING(
+                f"  {difference['id']}: {reference['category']}/{reference['priority']} -> "
+                f"{candidate['category']}/{candidate['priority']}"
+            ))
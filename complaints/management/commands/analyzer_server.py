@@ -0,0 +1,41 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.nlp import warm_up
+from analysis.server import AnalyzerServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the shared complaint analyzer on a Unix socket. Web workers reach it "
+        "through ANALYSIS_SOCKET instead of each loading the spaCy model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.ANALYSIS_SOCKET,
+                            help="Socket path (default: ANALYSIS_SOCKET)")
+        parser.add_argument('--max-batch', type=int, default=64,
+                            help="Most requests analyzed in one nlp.pipe call")
+        parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                            help="How long the first request of a batch waits for others")
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError("No socket path; pass --socket or set ANALYSIS_SOCKET")
+
+        warm_up(local=True)
+        server = AnalyzerServer(options['socket'], max_batch=options['max_batch'],
+                                max_wait=options['max_wait_ms'] / 1000)
+        # serve_forever() only returns when shutdown() is called from another
+        # thread, so SIGTERM is turned into KeyboardInterrupt
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.stdout.write(f"Analyzer listening on {options['socket']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Stopped after {server.analyzed} complaints in {server.batches} batches")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from complaints.events import backfill_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the timeline of complaints that have none, from their comments, and set their "
+        "assigned_at and resolved_at. Run once after migration 0010; complaints that already "
+        "have events are skipped, so it can be re-run safely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        done = backfill_events(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Built the timeline of {done} complaints"))
@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from analysis import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the complaint analyzer: throughput, per-stage latency, peak memory "
+        "and agreement with the labelled corpus and the frozen baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, default=2000,
+                            help="Generated complaints added to the throughput run")
+        parser.add_argument('--batch-size', type=int, default=256)
+        parser.add_argument('--backend', choices=['spacy', 'fast'],
+                            help="Analyzer backend to measure (default: ANALYSIS_BACKEND)")
+        parser.add_argument('--freeze-baseline', action='store_true',
+                            help="Store the current results on the labelled corpus as the new baseline")
+        parser.add_argument('--json', action='store_true', help="Print the raw report as JSON")
+
+    def handle(self, *args, **options):
+        report = benchmark.run_benchmark(synthetic=options['synthetic'],
+                                         batch_size=options['batch_size'],
+                                         backend=options['backend'])
+
+        if options['freeze_baseline']:
+            baseline = benchmark.freeze_baseline(report['corpus'], report['results'],
+                                                 backend=report['backend'])
+            report['labelled']['baseline'] = benchmark.baseline_agreement(
+                report['corpus'], report['results'], baseline)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {benchmark.BASELINE_PATH}"))
+
+        report.pop('results')
+        report.pop('corpus')
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        throughput = report['throughput']
+        self.stdout.write(f"Backend: {report['backend']}, model load: {report['load_seconds']:.2f}s")
+        self.stdout.write(
+            f"Throughput: {throughput['docs_per_second']:.0f} docs/sec "
+            f"({throughput['documents']} docs in {throughput['seconds']:.2f}s)"
+        )
+        self.stdout.write(
+            f"Peak Python memory: {throughput['peak_python_bytes'] / 2**10:.0f} KiB, "
+            f"RSS: {throughput['resident_bytes'] / 2**20:.1f} MiB"
+        )
+        vectorized = report['vectorized']
+        self.stdout.write(
+            f"Vectorized scorer: {vectorized['docs_per_second']:.0f} docs/sec, "
+            f"{vectorized['mismatches']} results differing from the analyzer"
+        )
+        self.stdout.write("Per-stage latency (ms/doc):")
+        for stage, percentiles in report['stages'].items():
+            values = ', '.join(f"{name} {value:.3f}" for name, value in percentiles.items())
+            self.stdout.write(f"  {stage:<9} {values}")
+
+        labelled = report['labelled']
+        agreement = ', '.join(f"{field} {share:.1%}" for field, share in labelled['label_agreement'].items())
+        self.stdout.write(f"Labelled corpus ({labelled['documents']} docs) vs labels: {agreement}")
+        if 'synthetic' in report:
+            share = report['synthetic']['label_agreement']['category']
+            self.stdout.write(f"Synthetic corpus vs generated category: {share:.1%}")
+
+        baseline = labelled.get('baseline')
+        if baseline is None:
+            self.stdout.write(self.style.WARNING("No frozen baseline; run with --freeze-baseline"))
+            return
+        self.stdout.write(f"Agreement with frozen baseline: {baseline['agreement']:.1%} "
+                          f"of {baseline['compared']} docs")
+        for difference in baseline['differences']:
+            self.stdout.write(self.style.WARNING(
+                f"  {difference['id']}: {difference['baseline']} -> {difference['current']}"
+            ))
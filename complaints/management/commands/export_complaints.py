@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from complaints import export
+from complaints.models import Complaint
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream complaints (or their comments) to a CSV or JSON Lines file, optionally gzipped, "
+        "in constant memory. Takes the same filters as the dashboards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=[export.COMPLAINTS, export.COMMENTS], default=export.COMPLAINTS)
+        parser.add_argument('--format', choices=list(export.FORMATS), default=export.CSV)
+        parser.add_argument('--gzip', action='store_true', help="Compress the output with gzip")
+        parser.add_argument('--output', default='-', help="File to write, or - for standard output")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Rows fetched from the database at a time")
+        parser.add_argument('--start', help="First creation day (YYYY-MM-DD, UTC)")
+        parser.add_argument('--end', help="Last creation day (YYYY-MM-DD, UTC)")
+        parser.add_argument('--department', help="Department id")
+        parser.add_argument('--status', help="Status code, or several separated by commas")
+        for name in ('category', 'priority', 'location-type'):
+            parser.add_argument(f'--{name}')
+
+    def handle(self, *args, **options):
+        complaints = export.filter_complaints(Complaint.objects.all(), options)
+        pieces = export.export(complaints, options['kind'], options['format'], options['gzip'],
+                               options['chunk_size'])
+        written = 0
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for piece in pieces:
+                output.write(piece)
+                written += len(piece)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        if options['output'] != '-':
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
@@ -0,0 +1,133 @@
+import json
+from collections import Counter, deque
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from analysis.sentiment import ComplaintAnalyzer
+from analysis.vectorized import VectorizedScorer
+from complaints.models import Complaint
+from complaints.tasks import apply_analysis, finalize_analysis
+
+ANALYZED_FIELDS = ['category', 'priority', 'sentiment_score']
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run the complaint analyzer over existing complaints and store the new "
+        "category, priority and sentiment score. Assignment and tracking are left alone. "
+        "With --pending, finish the analysis and routing of complaints left provisional instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Complaints fetched, analyzed and written per batch")
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Tokenizer processes used by the analyzer")
+        parser.add_argument('--engine', choices=['analyzer', 'vectorized'], default='analyzer',
+                            help="Score with ComplaintAnalyzer or the batched NumPy scorer (same results)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would change without writing anything")
+        parser.add_argument('--checkpoint',
+                            help="File recording the last complaint id written, updated after every batch")
+        parser.add_argument('--resume', action='store_true',
+                            help="Continue after the id stored in --checkpoint")
+        parser.add_argument('--pending', action='store_true',
+                            help="Analyze and route the complaints still waiting for their full analysis "
+                                 "(ANALYSIS_ASYNC_SUBMIT), e.g. after a crash or restart")
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            return self._finish_pending()
+
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        checkpoint = Path(options['checkpoint']) if options['checkpoint'] else None
+
+        start_after = 0
+        if options['resume']:
+            if checkpoint is None:
+                raise CommandError("--resume needs --checkpoint")
+            if checkpoint.exists():
+                start_after = json.loads(checkpoint.read_text())['last_id']
+                self.stdout.write(f"Resuming after complaint #{start_after}")
+
+        complaints = (
+            Complaint.objects.filter(pk__gt=start_after)
+            .order_by('pk')
+            .only('pk', 'title', 'description', *ANALYZED_FIELDS)
+            .iterator(chunk_size=batch_size)
+        )
+
+        # Complaints waiting for their analysis result, in input order
+        in_flight = deque()
+
+        def texts():
+            for complaint in complaints:
+                in_flight.append(complaint)
+                yield complaint.description, complaint.title
+
+        if options['engine'] == 'vectorized':
+            results = VectorizedScorer().score_many(texts(), batch_size=batch_size,
+                                                    n_process=options['processes'])
+        else:
+            results = ComplaintAnalyzer().analyze_many(texts(), batch_size=batch_size,
+                                                       n_process=options['processes'])
+
+        seen = 0
+        changed = []
+        transitions = Counter()
+        batch_end = None
+        for analysis in results:
+            complaint = in_flight.popleft()
+            before = {field: getattr(complaint, field) for field in ANALYZED_FIELDS}
+            apply_analysis(complaint, analysis)
+            seen += 1
+            batch_end = complaint.pk
+
+            if (complaint.category, complaint.priority) != (before['category'], before['priority']):
+                transitions[(before['category'], before['priority'],
+                             complaint.category, complaint.priority)] += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f"#{complaint.pk}: {before['category']}/{before['priority']} -> "
+                        f"{complaint.category}/{complaint.priority}"
+                    )
+            if any(getattr(complaint, field) != value for field, value in before.items()):
+                changed.append(complaint)
+
+            if seen % batch_size == 0:
+                self._flush(changed, batch_end, checkpoint, dry_run)
+                changed = []
+
+        if batch_end is not None:
+            self._flush(changed, batch_end, checkpoint, dry_run)
+
+        self._report(seen, transitions, dry_run)
+
+    def _finish_pending(self):
+        pending = list(Complaint.objects.filter(analysis_pending=True).order_by('pk').values_list('pk', flat=True))
+        for complaint_id in pending:
+            # Skips complaints a worker finished meanwhile
+            finalize_analysis(complaint_id)
+        left = Complaint.objects.filter(pk__in=pending, analysis_pending=True).count()
+        self.stdout.write(self.style.SUCCESS(f"Finished {len(pending) - left} pending complaints"))
+
+    def _flush(self, changed, last_id, checkpoint, dry_run):
+        if dry_run:
+            return
+        # bulk_update skips Complaint.save(), so nothing is re-assigned or re-tracked
+        with transaction.atomic():
+            Complaint.objects.bulk_update(changed, [*ANALYZED_FIELDS, 'priority_rank'])
+        if checkpoint is not None:
+            checkpoint.write_text(json.dumps({'last_id': last_id}))
+
+    def _report(self, seen, transitions, dry_run):
+        reclassified = sum(transitions.values())
+        verb = "would change" if dry_run else "changed"
+        self.stdout.write(f"Analyzed {seen} complaints; category/priority {verb} for {reclassified}")
+        for (old_cat, old_pri, new_cat, new_pri), count in transitions.most_common():
+            self.stdout.write(f"  {old_cat}/{old_pri} -> {new_cat}/{new_pri}: {count}")
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from complaints.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the dashboard counters from complaints, trackers and viewer rows. "
+        "Repairs counts after a student changes department or after raw SQL edits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = rebuild_counters(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} counter rows"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from complaints.duplicates import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the near-duplicate bucket keys of all open complaints. Needed after "
+        "changing the MinHash parameters; also drops keys of resolved and closed complaints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = rebuild_index(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} open complaints"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from complaints.access import rebuild_viewers
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the complaint viewer table from complaints, followers, trackers and "
+        "staff. Repairs visibility after bulk edits that bypass the model signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = rebuild_viewers(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} viewer rows"))
@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from complaints.rollups import reconcile_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily analytics rollups of recent days from the complaints and correct any drift. "
+        "Meant to run nightly; use --all after a student changes department or after raw SQL edits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=31,
+                            help="Number of most recent days (UTC) to reconcile")
+        parser.add_argument('--all', action='store_true', help="Reconcile every day")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = None
+        if not options['all']:
+            today = datetime.datetime.now(datetime.timezone.utc).date()
+            start = today - datetime.timedelta(days=max(options['days'], 1) - 1)
+        with transaction.atomic():
+            corrected = reconcile_rollups(start, batch_size=options['batch_size'])
+        since = "all days" if start is None else f"days since {start}"
+        self.stdout.write(self.style.SUCCESS(f"Corrected {corrected} rollup rows ({since})"))
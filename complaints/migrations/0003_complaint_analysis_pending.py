@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0002_complaint_location_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='analysis_pending',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from analysis.minhash import band_keys, shingles
+
+OPEN_STATUSES = ['PEND', 'REVW', 'ASSG', 'PROG']
+
+
+def index_open_complaints(apps, schema_editor):
+    Complaint = apps.get_model('complaints', 'Complaint')
+    DuplicateBucket = apps.get_model('complaints', 'DuplicateBucket')
+    buckets = []
+    for complaint in Complaint.objects.filter(status__in=OPEN_STATUSES).only('title', 'description').iterator():
+        keys = set(band_keys(shingles(f"{complaint.title}\n{complaint.description}")))
+        buckets.extend(DuplicateBucket(complaint_id=complaint.pk, key=key) for key in keys)
+    DuplicateBucket.objects.bulk_create(buckets, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0003_complaint_analysis_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='followers',
+            field=models.ManyToManyField(blank=True, related_name='followed_complaints', to='complaints.student'),
+        ),
+        migrations.CreateModel(
+            name='DuplicateBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('complaint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_buckets', to='complaints.complaint')),
+            ],
+        ),
+        migrations.RunPython(index_open_complaints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+from django.db import migrations
+
+# FTS5 index over complaint text and public comments, kept in sync by triggers
+# (see complaints/search.py). Only created on SQLite.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE complaints_search USING fts5(
+        title, description, location, comments,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO complaints_search (rowid, title, description, location, comments)
+    SELECT c.id, c.title, c.description, coalesce(c.location, ''),
+           coalesce((SELECT group_concat(m.content, ' ') FROM complaints_comment m
+                     WHERE m.complaint_id = c.id AND NOT m.is_internal), '')
+    FROM complaints_complaint c
+    """,
+    """
+    CREATE TRIGGER complaints_search_complaint_insert AFTER INSERT ON complaints_complaint
+    BEGIN
+        INSERT INTO complaints_search (rowid, title, description, location, comments)
+        VALUES (new.id, new.title, new.description, coalesce(new.location, ''), '');
+    END
+    """,
+    """
+    CREATE TRIGGER complaints_search_complaint_update
+    AFTER UPDATE OF title, description, location ON complaints_complaint
+    WHEN old.title IS NOT new.title OR old.description IS NOT new.description
+         OR old.location IS NOT new.location
+    BEGIN
+        UPDATE complaints_search
+        SET title = new.title, description = new.description, location = coalesce(new.location, '')
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER complaints_search_complaint_delete AFTER DELETE ON complaints_complaint
+    BEGIN
+        DELETE FROM complaints_search WHERE rowid = old.id;
+    END
+    """,
+]
+
+COMMENTS_SQL = """
+    UPDATE complaints_search
+    SET comments = coalesce((SELECT group_concat(content, ' ') FROM complaints_comment
+                             WHERE complaint_id = {row}.complaint_id AND NOT is_internal), '')
+    WHERE rowid = {row}.complaint_id;
+"""
+
+CREATE_SQL += [
+    f"""
+    CREATE TRIGGER complaints_search_comment_insert AFTER INSERT ON complaints_comment
+    WHEN NOT new.is_internal
+    BEGIN {COMMENTS_SQL.format(row='new')} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_search_comment_update
+    AFTER UPDATE OF content, is_internal, complaint_id ON complaints_comment
+    BEGIN {COMMENTS_SQL.format(row='old')} {COMMENTS_SQL.format(row='new')} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_search_comment_delete AFTER DELETE ON complaints_comment
+    WHEN NOT old.is_internal
+    BEGIN {COMMENTS_SQL.format(row='old')} END
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS complaints_search_comment_delete",
+    "DROP TRIGGER IF EXISTS complaints_search_comment_update",
+    "DROP TRIGGER IF EXISTS complaints_search_comment_insert",
+    "DROP TRIGGER IF EXISTS complaints_search_complaint_delete",
+    "DROP TRIGGER IF EXISTS complaints_search_complaint_update",
+    "DROP TRIGGER IF EXISTS complaints_search_complaint_insert",
+    "DROP TABLE IF EXISTS complaints_search",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0004_complaint_followers_duplicatebucket'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
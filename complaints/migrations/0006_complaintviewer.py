@@ -0,0 +1,61 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def iter_viewers(complaints, staff):
+    """(user id, complaint id, reason) of every viewer, as access.iter_viewers
+    computed them when this migration was written"""
+    yield from ((user_id, pk, 'OWN')
+                for pk, user_id in complaints.objects.values_list('pk', 'student__user_id').iterator())
+    yield from ((user_id, pk, 'ASSG')
+                for pk, user_id in complaints.objects.filter(assigned_to__isnull=False).values_list(
+                    'pk', 'assigned_to__user_id').iterator())
+    yield from ((user_id, pk, 'FOLL')
+                for pk, user_id in complaints.followers.through.objects.values_list(
+                    'complaint_id', 'student__user_id').iterator())
+    yield from ((user_id, pk, 'TRCK')
+                for pk, user_id in complaints.trackers.through.objects.values_list(
+                    'complaint_id', 'staff__user_id').iterator())
+    for user_id, department_id in staff.objects.filter(
+            role='HOD', department__isnull=False).values_list('user_id', 'department_id'):
+        yield from ((user_id, pk, 'DEPT')
+                    for pk in complaints.objects.filter(student__department_id=department_id).values_list(
+                        'pk', flat=True).iterator())
+
+
+def fill_viewers(apps, schema_editor):
+    Complaint = apps.get_model('complaints', 'Complaint')
+    ComplaintViewer = apps.get_model('complaints', 'ComplaintViewer')
+    Staff = apps.get_model('complaints', 'Staff')
+    ComplaintViewer.objects.bulk_create(
+        (ComplaintViewer(user_id=user_id, complaint_id=complaint_id, reason=reason)
+         for user_id, complaint_id, reason in iter_viewers(Complaint, Staff)),
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0005_complaint_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintViewer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('OWN', 'Submitted by'), ('FOLL', 'Following'), ('ASSG', 'Assigned to'), ('TRCK', 'Tracking'), ('DEPT', 'Head of department')], max_length=4)),
+                ('complaint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='viewers', to='complaints.complaint')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='complaint_access', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'complaint', 'reason'), name='unique_complaint_viewer')],
+            },
+        ),
+        migrations.RunPython(fill_viewers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:17
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+PRIORITY_RANKS = {'LOW': 1, 'MED': 2, 'HIGH': 3, 'CRIT': 4}
+
+search_index = import_module('complaints.migrations.0005_complaint_search_index')
+
+
+def fill_priority_rank(apps, schema_editor):
+    Complaint = apps.get_model('complaints', 'Complaint')
+    for priority, rank in PRIORITY_RANKS.items():
+        Complaint.objects.filter(priority=priority).update(priority_rank=rank)
+
+
+def restore_search_triggers(apps, schema_editor):
+    """SQLite adds and drops the NOT NULL column by rebuilding the complaint
+    table, which drops the search index triggers defined on it (migration 0005)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search_index.CREATE_SQL:
+        if 'TRIGGER' in statement and 'ON complaints_complaint\n' in statement:
+            name = statement.split('TRIGGER', 1)[1].split()[0]
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0006_complaintviewer'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='complaint',
+            options={'ordering': ['-priority_rank', '-created_at'], 'verbose_name': 'Complaint', 'verbose_name_plural': 'Complaints'},
+        ),
+        # Removing the column on the way back rebuilds the table as well
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='complaint',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(fill_priority_rank, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['student', 'status'], name='complaint_student_status'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['assigned_to', 'status', 'priority_rank', 'created_at'], name='complaint_assignee_queue'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['category', 'location_type', 'status'], name='complaint_category_location'),
+        ),
+    ]
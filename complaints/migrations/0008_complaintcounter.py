@@ -0,0 +1,161 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+# Dashboard counters kept up to date by triggers (see complaints/counters.py).
+# Only created on SQLite.
+STAFF_REASONS = "('ASSG', 'TRCK', 'DEPT')"
+DEPARTMENT_OF = "(SELECT department_id FROM complaints_student WHERE id = {row}.student_id)"
+
+
+def bump(scope, scope_id, row, delta, source='', condition='true'):
+    """Add ``delta`` to the ``scope`` counter matching ``row``'s status, priority, category and location"""
+    return f"""
+        INSERT INTO complaints_complaintcounter
+            (scope, scope_id, status, priority, category, location_type, count)
+        SELECT '{scope}', {scope_id}, {row}.status, {row}.priority, {row}.category,
+               coalesce({row}.location_type, ''), {delta}
+        {source} WHERE {scope_id} IS NOT NULL AND {condition}
+        ON CONFLICT (scope, scope_id, status, priority, category, location_type)
+        DO UPDATE SET count = count + excluded.count;
+    """
+
+
+def every_scope(row, delta):
+    return ''.join([
+        bump('student', f'{row}.student_id', row, delta),
+        bump('department', DEPARTMENT_OF.format(row=row), row, delta),
+        bump('assignee', f'{row}.assigned_to_id', row, delta),
+        bump('tracker', 't.staff_id', row, delta, 'FROM complaints_complaint_trackers t',
+             f't.complaint_id = {row}.id'),
+        bump('visible', 'v.user_id', row, delta,
+             f"FROM (SELECT DISTINCT user_id FROM complaints_complaintviewer "
+             f"WHERE complaint_id = {row}.id AND reason IN {STAFF_REASONS}) v"),
+    ])
+
+
+def staff_views(row):
+    return (f"SELECT 1 FROM complaints_complaintviewer WHERE user_id = {row}.user_id "
+            f"AND complaint_id = {row}.complaint_id AND reason IN {STAFF_REASONS}")
+
+
+CREATE_SQL = [
+    f"""
+    CREATE TRIGGER complaints_counter_complaint_insert AFTER INSERT ON complaints_complaint
+    BEGIN {every_scope('new', 1)} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_counter_complaint_update
+    AFTER UPDATE OF status, priority, category, location_type, assigned_to_id, student_id
+    ON complaints_complaint
+    WHEN old.status IS NOT new.status OR old.priority IS NOT new.priority
+         OR old.category IS NOT new.category OR old.location_type IS NOT new.location_type
+         OR old.assigned_to_id IS NOT new.assigned_to_id OR old.student_id IS NOT new.student_id
+    BEGIN {every_scope('old', -1)} {every_scope('new', 1)} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_counter_complaint_delete AFTER DELETE ON complaints_complaint
+    BEGIN {every_scope('old', -1)} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_counter_tracker_insert AFTER INSERT ON complaints_complaint_trackers
+    BEGIN {bump('tracker', 'new.staff_id', 'c', 1, 'FROM complaints_complaint c',
+                'c.id = new.complaint_id')} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_counter_tracker_delete AFTER DELETE ON complaints_complaint_trackers
+    BEGIN {bump('tracker', 'old.staff_id', 'c', -1, 'FROM complaints_complaint c',
+                'c.id = old.complaint_id')} END
+    """,
+    # A staff user is counted once per complaint, whatever the number of reasons
+    f"""
+    CREATE TRIGGER complaints_counter_viewer_insert AFTER INSERT ON complaints_complaintviewer
+    WHEN new.reason IN {STAFF_REASONS} AND (SELECT count(*) FROM ({staff_views('new')})) = 1
+    BEGIN {bump('visible', 'new.user_id', 'c', 1, 'FROM complaints_complaint c',
+                'c.id = new.complaint_id')} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_counter_viewer_delete AFTER DELETE ON complaints_complaintviewer
+    WHEN old.reason IN {STAFF_REASONS} AND NOT EXISTS ({staff_views('old')})
+    BEGIN {bump('visible', 'old.user_id', 'c', -1, 'FROM complaints_complaint c',
+                'c.id = old.complaint_id')} END
+    """,
+]
+
+COUNTER_COLUMNS = "scope, scope_id, status, priority, category, location_type, count"
+COMPLAINT_BREAKDOWN = "c.status, c.priority, c.category, coalesce(c.location_type, '')"
+
+FILL_SQL = [
+    f"""
+    INSERT INTO complaints_complaintcounter ({COUNTER_COLUMNS})
+    SELECT 'student', c.student_id, {COMPLAINT_BREAKDOWN}, count(*)
+    FROM complaints_complaint c GROUP BY 2, 3, 4, 5, 6
+    """,
+    f"""
+    INSERT INTO complaints_complaintcounter ({COUNTER_COLUMNS})
+    SELECT 'department', s.department_id, {COMPLAINT_BREAKDOWN}, count(*)
+    FROM complaints_complaint c JOIN complaints_student s ON s.id = c.student_id GROUP BY 2, 3, 4, 5, 6
+    """,
+    f"""
+    INSERT INTO complaints_complaintcounter ({COUNTER_COLUMNS})
+    SELECT 'assignee', c.assigned_to_id, {COMPLAINT_BREAKDOWN}, count(*)
+    FROM complaints_complaint c WHERE c.assigned_to_id IS NOT NULL GROUP BY 2, 3, 4, 5, 6
+    """,
+    f"""
+    INSERT INTO complaints_complaintcounter ({COUNTER_COLUMNS})
+    SELECT 'tracker', t.staff_id, {COMPLAINT_BREAKDOWN}, count(*)
+    FROM complaints_complaint_trackers t JOIN complaints_complaint c ON c.id = t.complaint_id
+    GROUP BY 2, 3, 4, 5, 6
+    """,
+    f"""
+    INSERT INTO complaints_complaintcounter ({COUNTER_COLUMNS})
+    SELECT 'visible', v.user_id, {COMPLAINT_BREAKDOWN}, count(DISTINCT c.id)
+    FROM complaints_complaintviewer v JOIN complaints_complaint c ON c.id = v.complaint_id
+    WHERE v.reason IN {STAFF_REASONS} GROUP BY 2, 3, 4, 5, 6
+    """,
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {name}" for name in [
+        'complaints_counter_viewer_delete', 'complaints_counter_viewer_insert',
+        'complaints_counter_tracker_delete', 'complaints_counter_tracker_insert',
+        'complaints_counter_complaint_delete', 'complaints_counter_complaint_update',
+        'complaints_counter_complaint_insert',
+    ]
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0007_complaint_priority_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=10)),
+                ('scope_id', models.BigIntegerField()),
+                ('status', models.CharField(max_length=4)),
+                ('priority', models.CharField(max_length=4)),
+                ('category', models.CharField(max_length=6)),
+                ('location_type', models.CharField(blank=True, default='', max_length=10)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'scope_id', 'status', 'priority', 'category', 'location_type'), name='unique_complaint_counter')],
+            },
+        ),
+        migrations.RunPython(_run(CREATE_SQL + FILL_SQL), _run(DROP_SQL)),
+    ]
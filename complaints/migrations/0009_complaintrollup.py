@@ -0,0 +1,115 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+# Daily analytics rollups kept up to date by triggers (see complaints/rollups.py).
+# Only created on SQLite.
+RESOLVED = "('RESV', 'CLSD')"
+DEPARTMENT_OF = "(SELECT department_id FROM complaints_student WHERE id = {row}.student_id)"
+
+
+def bump(row, delta):
+    """Add ``row``'s complaint, times ``delta``, to the rollup of its creation day and breakdown"""
+    return f"""
+        INSERT INTO complaints_complaintrollup
+            (day, category, priority, status, department_id, assignee_id,
+             count, resolution_seconds, sentiment_total)
+        VALUES (
+            date({row}.created_at), {row}.category, {row}.priority, {row}.status,
+            coalesce({DEPARTMENT_OF.format(row=row)}, 0), coalesce({row}.assigned_to_id, 0),
+            {delta},
+            CASE WHEN {row}.status IN {RESOLVED}
+                 THEN {delta} * (julianday({row}.updated_at) - julianday({row}.created_at)) * 86400
+                 ELSE 0 END,
+            {delta} * coalesce({row}.sentiment_score, 0)
+        )
+        ON CONFLICT (day, category, priority, status, department_id, assignee_id)
+        DO UPDATE SET count = count + excluded.count,
+                      resolution_seconds = resolution_seconds + excluded.resolution_seconds,
+                      sentiment_total = sentiment_total + excluded.sentiment_total;
+    """
+
+
+CREATE_SQL = [
+    f"""
+    CREATE TRIGGER complaints_rollup_complaint_insert AFTER INSERT ON complaints_complaint
+    BEGIN {bump('new', 1)} END
+    """,
+    # updated_at only counts towards the rollups of resolved and closed complaints
+    f"""
+    CREATE TRIGGER complaints_rollup_complaint_update
+    AFTER UPDATE OF status, priority, category, assigned_to_id, student_id, created_at, updated_at,
+                    sentiment_score
+    ON complaints_complaint
+    WHEN old.status IS NOT new.status OR old.priority IS NOT new.priority
+         OR old.category IS NOT new.category OR old.assigned_to_id IS NOT new.assigned_to_id
+         OR old.student_id IS NOT new.student_id OR old.created_at IS NOT new.created_at
+         OR old.sentiment_score IS NOT new.sentiment_score
+         OR (old.updated_at IS NOT new.updated_at AND new.status IN {RESOLVED})
+    BEGIN {bump('old', -1)} {bump('new', 1)} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_rollup_complaint_delete AFTER DELETE ON complaints_complaint
+    BEGIN {bump('old', -1)} END
+    """,
+]
+
+FILL_SQL = [
+    f"""
+    INSERT INTO complaints_complaintrollup
+        (day, category, priority, status, department_id, assignee_id,
+         count, resolution_seconds, sentiment_total)
+    SELECT date(c.created_at), c.category, c.priority, c.status,
+           coalesce(s.department_id, 0), coalesce(c.assigned_to_id, 0), count(*),
+           sum(CASE WHEN c.status IN {RESOLVED}
+                    THEN (julianday(c.updated_at) - julianday(c.created_at)) * 86400 ELSE 0 END),
+           sum(coalesce(c.sentiment_score, 0))
+    FROM complaints_complaint c LEFT JOIN complaints_student s ON s.id = c.student_id
+    GROUP BY 1, 2, 3, 4, 5, 6
+    """,
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {name}" for name in [
+        'complaints_rollup_complaint_delete', 'complaints_rollup_complaint_update',
+        'complaints_rollup_complaint_insert',
+    ]
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0008_complaintcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(max_length=6)),
+                ('priority', models.CharField(max_length=4)),
+                ('status', models.CharField(max_length=4)),
+                ('department_id', models.BigIntegerField(default=0)),
+                ('assignee_id', models.BigIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('resolution_seconds', models.FloatField(default=0.0)),
+                ('sentiment_total', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'category', 'priority', 'status', 'department_id', 'assignee_id'), name='unique_complaint_rollup')],
+            },
+        ),
+        migrations.RunPython(_run(CREATE_SQL + FILL_SQL), _run(DROP_SQL)),
+    ]
@@ -0,0 +1,177 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:42
+
+from importlib import import_module
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# Complaint timeline (see complaints/events.py), and the analytics rollups
+# moved from updated_at to the exact assigned_at and resolved_at times. Events
+# and times of existing complaints come from the backfill_events command.
+RESOLVED = "('RESV', 'CLSD')"
+DEPARTMENT_OF = "(SELECT department_id FROM complaints_student WHERE id = {row}.student_id)"
+
+search_index = import_module('complaints.migrations.0005_complaint_search_index')
+counters = import_module('complaints.migrations.0008_complaintcounter')
+rollups = import_module('complaints.migrations.0009_complaintrollup')
+
+
+def seconds(row, field):
+    return f"(julianday({row}.{field}) - julianday({row}.created_at)) * 86400"
+
+
+def bump(row, delta):
+    """Add ``row``'s complaint, times ``delta``, to the rollup of its creation day and breakdown"""
+    resolved = f"{row}.status IN {RESOLVED} AND {row}.resolved_at IS NOT NULL"
+    assigned = f"{row}.assigned_at IS NOT NULL"
+    return f"""
+        INSERT INTO complaints_complaintrollup
+            (day, category, priority, status, department_id, assignee_id, count,
+             resolved_count, resolution_seconds, assigned_count, assignment_seconds, sentiment_total)
+        VALUES (
+            date({row}.created_at), {row}.category, {row}.priority, {row}.status,
+            coalesce({DEPARTMENT_OF.format(row=row)}, 0), coalesce({row}.assigned_to_id, 0),
+            {delta},
+            CASE WHEN {resolved} THEN {delta} ELSE 0 END,
+            CASE WHEN {resolved} THEN {delta} * {seconds(row, 'resolved_at')} ELSE 0 END,
+            CASE WHEN {assigned} THEN {delta} ELSE 0 END,
+            CASE WHEN {assigned} THEN {delta} * {seconds(row, 'assigned_at')} ELSE 0 END,
+            {delta} * coalesce({row}.sentiment_score, 0)
+        )
+        ON CONFLICT (day, category, priority, status, department_id, assignee_id)
+        DO UPDATE SET count = count + excluded.count,
+                      resolved_count = resolved_count + excluded.resolved_count,
+                      resolution_seconds = resolution_seconds + excluded.resolution_seconds,
+                      assigned_count = assigned_count + excluded.assigned_count,
+                      assignment_seconds = assignment_seconds + excluded.assignment_seconds,
+                      sentiment_total = sentiment_total + excluded.sentiment_total;
+    """
+
+
+CREATE_SQL = [
+    f"""
+    CREATE TRIGGER complaints_rollup_complaint_insert AFTER INSERT ON complaints_complaint
+    BEGIN {bump('new', 1)} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_rollup_complaint_update
+    AFTER UPDATE OF status, priority, category, assigned_to_id, student_id, created_at, sentiment_score,
+                    assigned_at, resolved_at
+    ON complaints_complaint
+    WHEN old.status IS NOT new.status OR old.priority IS NOT new.priority
+         OR old.category IS NOT new.category OR old.assigned_to_id IS NOT new.assigned_to_id
+         OR old.student_id IS NOT new.student_id OR old.created_at IS NOT new.created_at
+         OR old.sentiment_score IS NOT new.sentiment_score
+         OR old.assigned_at IS NOT new.assigned_at OR old.resolved_at IS NOT new.resolved_at
+    BEGIN {bump('old', -1)} {bump('new', 1)} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_rollup_complaint_delete AFTER DELETE ON complaints_complaint
+    BEGIN {bump('old', -1)} END
+    """,
+]
+
+FILL_SQL = [
+    "DELETE FROM complaints_complaintrollup",
+    f"""
+    INSERT INTO complaints_complaintrollup
+        (day, category, priority, status, department_id, assignee_id, count,
+         resolved_count, resolution_seconds, assigned_count, assignment_seconds, sentiment_total)
+    SELECT date(c.created_at), c.category, c.priority, c.status,
+           coalesce(s.department_id, 0), coalesce(c.assigned_to_id, 0), count(*),
+           sum(c.status IN {RESOLVED} AND c.resolved_at IS NOT NULL),
+           sum(CASE WHEN c.status IN {RESOLVED} AND c.resolved_at IS NOT NULL
+                    THEN {seconds('c', 'resolved_at')} ELSE 0 END),
+           sum(c.assigned_at IS NOT NULL),
+           sum(CASE WHEN c.assigned_at IS NOT NULL THEN {seconds('c', 'assigned_at')} ELSE 0 END),
+           sum(coalesce(c.sentiment_score, 0))
+    FROM complaints_complaint c LEFT JOIN complaints_student s ON s.id = c.student_id
+    GROUP BY 1, 2, 3, 4, 5, 6
+    """,
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def restore_complaint_triggers(apps, schema_editor):
+    """Dropping the new columns rebuilds the complaint table, which drops the
+    search, counter and rollup triggers defined on it (migrations 0005, 0008, 0009)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search_index.CREATE_SQL + counters.CREATE_SQL + rollups.CREATE_SQL:
+        if 'TRIGGER' in statement and 'ON complaints_complaint\n' in statement:
+            name = statement.split('TRIGGER', 1)[1].split()[0]
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0009_complaintrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CRTD', 'Submitted'), ('ASSG', 'Assigned'), ('STAT', 'Status changed'), ('ESCL', 'Escalated'), ('CMNT', 'Commented'), ('RESV', 'Resolved')], max_length=4)),
+                ('from_status', models.CharField(blank=True, choices=[('PEND', 'Pending'), ('REVW', 'Under Review'), ('ASSG', 'Assigned'), ('PROG', 'In Progress'), ('RESV', 'Resolved'), ('CLSD', 'Closed')], default='', max_length=4)),
+                ('to_status', models.CharField(blank=True, choices=[('PEND', 'Pending'), ('REVW', 'Under Review'), ('ASSG', 'Assigned'), ('PROG', 'In Progress'), ('RESV', 'Resolved'), ('CLSD', 'Closed')], default='', max_length=4)),
+                ('is_internal', models.BooleanField(default=False)),
+                ('note', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('assignee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='complaints.staff')),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='complaints.comment')),
+                ('complaint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='complaints.complaint')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['complaint', 'created_at'], name='event_complaint_time')],
+            },
+        ),
+        # Removing the columns on the way back rebuilds the table
+        migrations.RunPython(migrations.RunPython.noop, restore_complaint_triggers),
+        migrations.AddField(
+            model_name='complaint',
+            name='assigned_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        # SQLite rebuilds the rollup table to add columns, which the triggers
+        # must not reference meanwhile; on the way back the rollups are
+        # recomputed as migration 0009 does
+        migrations.RunPython(_run(rollups.DROP_SQL), _run(rollups.CREATE_SQL + rollups.FILL_SQL)),
+        migrations.AddField(
+            model_name='complaintrollup',
+            name='assigned_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='complaintrollup',
+            name='assignment_seconds',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='complaintrollup',
+            name='resolved_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(_run(CREATE_SQL + FILL_SQL), _run(rollups.DROP_SQL + FILL_SQL[:1])),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:20
+
+from importlib import import_module
+
+from django.db import migrations
+
+# The rollups are bucketed by the creation day in TIME_ZONE, as the analytics
+# dashboard and its filters count days, instead of the UTC day. Django sets
+# the process time zone (TZ) to TIME_ZONE, which SQLite's 'localtime'
+# modifier follows.
+RESOLVED = "('RESV', 'CLSD')"
+DEPARTMENT_OF = "(SELECT department_id FROM complaints_student WHERE id = {row}.student_id)"
+
+previous = import_module('complaints.migrations.0010_complaintevent')
+rollups = import_module('complaints.migrations.0009_complaintrollup')
+
+
+def day(row):
+    return f"date({row}.created_at, 'localtime')"
+
+
+def seconds(row, field):
+    return f"(julianday({row}.{field}) - julianday({row}.created_at)) * 86400"
+
+
+def bump(row, delta):
+    """Add ``row``'s complaint, times ``delta``, to the rollup of its local creation day and breakdown"""
+    resolved = f"{row}.status IN {RESOLVED} AND {row}.resolved_at IS NOT NULL"
+    assigned = f"{row}.assigned_at IS NOT NULL"
+    return f"""
+        INSERT INTO complaints_complaintrollup
+            (day, category, priority, status, department_id, assignee_id, count,
+             resolved_count, resolution_seconds, assigned_count, assignment_seconds, sentiment_total)
+        VALUES (
+            {day(row)}, {row}.category, {row}.priority, {row}.status,
+            coalesce({DEPARTMENT_OF.format(row=row)}, 0), coalesce({row}.assigned_to_id, 0),
+            {delta},
+            CASE WHEN {resolved} THEN {delta} ELSE 0 END,
+            CASE WHEN {resolved} THEN {delta} * {seconds(row, 'resolved_at')} ELSE 0 END,
+            CASE WHEN {assigned} THEN {delta} ELSE 0 END,
+            CASE WHEN {assigned} THEN {delta} * {seconds(row, 'assigned_at')} ELSE 0 END,
+            {delta} * coalesce({row}.sentiment_score, 0)
+        )
+        ON CONFLICT (day, category, priority, status, department_id, assignee_id)
+        DO UPDATE SET count = count + excluded.count,
+                      resolved_count = resolved_count + excluded.resolved_count,
+                      resolution_seconds = resolution_seconds + excluded.resolution_seconds,
+                      assigned_count = assigned_count + excluded.assigned_count,
+                      assignment_seconds = assignment_seconds + excluded.assignment_seconds,
+                      sentiment_total = sentiment_total + excluded.sentiment_total;
+    """
+
+
+CREATE_SQL = [
+    f"""
+    CREATE TRIGGER complaints_rollup_complaint_insert AFTER INSERT ON complaints_complaint
+    BEGIN {bump('new', 1)} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_rollup_complaint_update
+    AFTER UPDATE OF status, priority, category, assigned_to_id, student_id, created_at, sentiment_score,
+                    assigned_at, resolved_at
+    ON complaints_complaint
+    WHEN old.status IS NOT new.status OR old.priority IS NOT new.priority
+         OR old.category IS NOT new.category OR old.assigned_to_id IS NOT new.assigned_to_id
+         OR old.student_id IS NOT new.student_id OR old.created_at IS NOT new.created_at
+         OR old.sentiment_score IS NOT new.sentiment_score
+         OR old.assigned_at IS NOT new.assigned_at OR old.resolved_at IS NOT new.resolved_at
+    BEGIN {bump('old', -1)} {bump('new', 1)} END
+    """,
+    f"""
+    CREATE TRIGGER complaints_rollup_complaint_delete AFTER DELETE ON complaints_complaint
+    BEGIN {bump('old', -1)} END
+    """,
+]
+
+FILL_SQL = [
+    "DELETE FROM complaints_complaintrollup",
+    f"""
+    INSERT INTO complaints_complaintrollup
+        (day, category, priority, status, department_id, assignee_id, count,
+         resolved_count, resolution_seconds, assigned_count, assignment_seconds, sentiment_total)
+    SELECT {day('c')}, c.category, c.priority, c.status,
+           coalesce(s.department_id, 0), coalesce(c.assigned_to_id, 0), count(*),
+           sum(c.status IN {RESOLVED} AND c.resolved_at IS NOT NULL),
+           sum(CASE WHEN c.status IN {RESOLVED} AND c.resolved_at IS NOT NULL
+                    THEN {seconds('c', 'resolved_at')} ELSE 0 END),
+           sum(c.assigned_at IS NOT NULL),
+           sum(CASE WHEN c.assigned_at IS NOT NULL THEN {seconds('c', 'assigned_at')} ELSE 0 END),
+           sum(coalesce(c.sentiment_score, 0))
+    FROM complaints_complaint c LEFT JOIN complaints_student s ON s.id = c.student_id
+    GROUP BY 1, 2, 3, 4, 5, 6
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0010_complaintevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            previous._run(rollups.DROP_SQL + CREATE_SQL + FILL_SQL),
+            previous._run(rollups.DROP_SQL + previous.CREATE_SQL + previous.FILL_SQL),
+        ),
+    ]
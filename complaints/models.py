@@ -1,9 +1,13 @@
 # models.py
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from analysis.minhash import band_keys, shingles
+from .assignment import add_trackers, plan_route
+
 class Department(models.Model):
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=10, unique=True)
@@ -53,6 +57,8 @@ class Complaint(models.Model):
         ('HIGH', 'High'),
         ('CRIT', 'Critical'),
     ]
+    # Severity order of the priority codes, stored in priority_rank for sorting
+    PRIORITY_RANKS = {'LOW': 1, 'MED': 2, 'HIGH': 3, 'CRIT': 4}
     
     STATUS_CHOICES = [
         ('PEND', 'Pending'),
@@ -84,6 +90,8 @@ class Complaint(models.Model):
     
     category = models.CharField(max_length=6, choices=CATEGORY_CHOICES)
     priority = models.CharField(max_length=4, choices=PRIORITY_CHOICES)
+    # Set from priority on save; the string codes do not sort by severity
+    priority_rank = models.PositiveSmallIntegerField(default=0, editable=False)
     status = models.CharField(max_length=4, choices=STATUS_CHOICES, default='PEND')
     
     assigned_to = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, related_name='assigned_complaints')
@@ -91,9 +99,26 @@ class Complaint(models.Model):
     
     sentiment_score = models.FloatField(default=0.0)
     is_confidential = models.BooleanField(default=False)
+    # Category and priority are provisional until the full analysis has run
+    analysis_pending = models.BooleanField(default=False)
+    # Students who reported the same problem and chose to follow this complaint
+    followers = models.ManyToManyField(Student, related_name='followed_complaints', blank=True)
+    # When the complaint was first assigned and last resolved or closed, set
+    # with the timeline events (see events.py)
+    assigned_at = models.DateTimeField(null=True, blank=True, editable=False)
+    resolved_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     class Meta:
-        ordering = ['-priority', '-created_at']
+        ordering = ['-priority_rank', '-created_at']
+        indexes = [
+            # Student dashboard
+            models.Index(fields=['student', 'status'], name='complaint_student_status'),
+            # Staff dashboards, most severe and newest first
+            models.Index(fields=['assigned_to', 'status', 'priority_rank', 'created_at'],
+                         name='complaint_assignee_queue'),
+            # Works dashboard filters
+            models.Index(fields=['category', 'location_type', 'status'], name='complaint_category_location'),
+        ]
         verbose_name = _('Complaint')
         verbose_name_plural = _('Complaints')
     
@@ -103,117 +128,82 @@ class Complaint(models.Model):
     def get_absolute_url(self):
         return reverse('complaint_detail', args=[str(self.id)])
     
-    def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-        
-        if is_new:
-            self._assign_complaint()
-            self._assign_trackers()
-    
-    def _assign_complaint(self):
-        """Enhanced assignment logic based on category and location"""
-        assigned_staff = None
-        
-        # Infrastructure complaints
-        if self.category == 'INFRA':
-            # All infrastructure issues go to Works Department
-            assigned_staff = Staff.objects.filter(role='WD').first()
-        
-        # Hostel complaints
-        elif self.category == 'HOSTEL':
-            # All hostel issues go to Hall Warden
-            assigned_staff = Staff.objects.filter(role='HW').first()
-        
-        # Safety complaints
-        elif self.category == 'SAFETY':
-            # Safety issues go to Student Affairs
-            assigned_staff = Staff.objects.filter(role='SA').first()
-        
-        # Harassment complaints
-        elif self.category == 'HARASS':
-            # Harassment issues go to Student Affairs
-            assigned_staff = Staff.objects.filter(role='SA').first()
-        
-        # Academic complaints
-        elif self.category == 'ACAD':
-            # Academic issues go to student's HOD
-            assigned_staff = Staff.objects.filter(
-                role='HOD', 
-                department=self.student.department
-            ).first()
-        
-        if assigned_staff:
-            self.assigned_to = assigned_staff
-            self.status = 'ASSG'
-            self.save(update_fields=['assigned_to', 'status'])
-    
-    def _assign_trackers(self):
-        """Enhanced tracking logic based on complaint type and context"""
-        trackers_to_add = []
-        
-        # Critical complaints are always tracked by VC and Registrar
-        if self.priority in ['HIGH', 'CRIT']:
-            vc = Staff.objects.filter(role='VC').first()
-            reg = Staff.objects.filter(role='REG').first()
-            if vc:
-                trackers_to_add.append(vc)
-            if reg:
-                trackers_to_add.append(reg)
-        
-        # Infrastructure complaints in hostel - both Works Dept and Hall Warden track
-        if self.category == 'INFRA' and (
-            self.location_type == 'HOSTEL' or 
-            (self.location and 'hostel' in self.location.lower())
-        ):
-            hw = Staff.objects.filter(role='HW').first()
-            if hw:
-                trackers_to_add.append(hw)
-        
-        # Infrastructure complaints in lecture rooms - HOD tracks
-        elif self.category == 'INFRA' and (
-            self.location_type in ['LECTURE', 'LAB'] or
-            (self.location and any(term in self.location.lower() 
-                                 for term in ['lecture', 'classroom', 'lab']))
-        ):
-            hod = Staff.objects.filter(
-                role='HOD', 
-                department=self.student.department
-            ).first()
-            if hod:
-                trackers_to_add.append(hod)
-        
-        # Harassment/Safety complaints - student's HOD tracks
-        elif self.category in ['HARASS', 'SAFETY']:
-            hod = Staff.objects.filter(
-                role='HOD', 
-                department=self.student.department
-            ).first()
-            if hod:
-                trackers_to_add.append(hod)
-        
-        # Academic complaints - only student's HOD handles and tracks
-        elif self.category == 'ACAD':
-            hod = Staff.objects.filter(
-                role='HOD', 
-                department=self.student.department
-            ).first()
-            if hod:
-                trackers_to_add.append(hod)
-        
-        # Hostel complaints - student's HOD also tracks
-        elif self.category == 'HOSTEL':
-            hod = Staff.objects.filter(
-                role='HOD', 
-                department=self.student.department
-            ).first()
-            if hod:
-                trackers_to_add.append(hod)
-        
-        # Add all trackers
-        for tracker in trackers_to_add:
-            self.trackers.add(tracker)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_state()
+        return instance
+
+    def _remember_state(self):
+        """Note the status and assignee as stored, to record their changes as events"""
+        self._stored = {name: self.__dict__[name] for name in ('status', 'assigned_to_id') if name in self.__dict__}
+
+    def save(self, *args, actor=None, **kwargs):
+        """Save, recording status and assignment changes in the timeline.
+
+        ``actor`` is the user making the change, if any.
+        """
+        # Imported here: these modules import this one
+        from .access import grant_new_complaint
+        from .events import change_events, creation_events
+
+        self.priority_rank = self.PRIORITY_RANKS.get(self.priority, 0)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'priority' in update_fields:
+            kwargs['update_fields'] = update_fields = [*update_fields, 'priority_rank']
+
+        if self.pk is not None:
+            with transaction.atomic():
+                events, changed = change_events(self, actor, update_fields)
+                if update_fields is not None and changed:
+                    kwargs['update_fields'] = [*update_fields, *changed]
+                super().save(*args, **kwargs)
+                ComplaintEvent.objects.bulk_create(events)
+                if 'status' in self._stored and (update_fields is None or 'status' in update_fields):
+                    self._follow_duplicate_index(self._stored['status'])
+            self._remember_state()
+            return
+
+        # A new complaint is routed in memory and inserted already assigned,
+        # together with its duplicate index keys, trackers, viewer rows and first
+        # timeline events. Provisionally classified complaints are routed once
+        # analysis finishes.
+        with transaction.atomic():
+            route = None if self.analysis_pending else plan_route(self)
+            if route is not None:
+                route.apply(self)
+            if self.assigned_to_id is not None:
+                # Routed on submission, just before the row is written
+                self.assigned_at = timezone.now()
+            super().save(*args, **kwargs)
+            self._index_duplicate_buckets()
+            tracker_ids = route.tracker_ids if route is not None else []
+            add_trackers(self, tracker_ids, grant=False)
+            grant_new_complaint(self, tracker_ids)
+            ComplaintEvent.objects.bulk_create(creation_events(self, actor))
+        self._remember_state()
     
+    def duplicate_shingles(self):
+        return shingles(f"{self.title}\n{self.description}")
+
+    def _index_duplicate_buckets(self):
+        """Record the LSH bucket keys used to find near-duplicates of this complaint"""
+        DuplicateBucket.objects.bulk_create([
+            DuplicateBucket(complaint=self, key=key)
+            for key in set(band_keys(self.duplicate_shingles()))
+        ])
+
+    def _follow_duplicate_index(self, stored_status):
+        """Drop the bucket keys of a complaint leaving the open statuses, and
+        index it again when it is reopened"""
+        from .duplicates import OPEN_STATUSES
+
+        was_open, is_open = stored_status in OPEN_STATUSES, self.status in OPEN_STATUSES
+        if was_open and not is_open:
+            self.duplicate_buckets.all().delete()
+        elif is_open and not was_open:
+            self._index_duplicate_buckets()
+
     def get_all_authorized_viewers(self):
         """Get all users who can view this complaint"""
         authorized_users = []
@@ -232,31 +222,106 @@ class Complaint(models.Model):
         return authorized_users
     
     def can_user_view(self, user):
-        """Check if a user can view this complaint"""
-        # Student who created the complaint
-        try:
-            if user.student == self.student:
-                return True
-        except:
-            pass
-        
-        # Staff members
-        try:
-            staff = user.staff
-            # Assigned staff
-            if staff == self.assigned_to:
-                return True
-            # Trackers
-            if staff in self.trackers.all():
-                return True
-            # HODs can view complaints from their department students
-            if (staff.role == 'HOD' and 
-                staff.department == self.student.department):
-                return True
-        except:
-            pass
-        
-        return False
+        """Check if a user can view this complaint (one lookup in the viewer table)"""
+        return user.is_authenticated and self.viewers.filter(user=user).exists()
+
+class DuplicateBucket(models.Model):
+    """One LSH bucket key of a complaint; complaints sharing a key are near-duplicate candidates"""
+    complaint = models.ForeignKey(Complaint, on_delete=models.CASCADE, related_name='duplicate_buckets')
+    key = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"Bucket {self.key} of {self.complaint_id}"
+
+class ComplaintViewer(models.Model):
+    """One reason a user may view a complaint, kept in sync where visibility changes (see access.py)"""
+    OWNER = 'OWN'
+    FOLLOWER = 'FOLL'
+    ASSIGNEE = 'ASSG'
+    TRACKER = 'TRCK'
+    DEPARTMENT = 'DEPT'
+    REASON_CHOICES = [
+        (OWNER, 'Submitted by'),
+        (FOLLOWER, 'Following'),
+        (ASSIGNEE, 'Assigned to'),
+        (TRACKER, 'Tracking'),
+        (DEPARTMENT, 'Head of department'),
+    ]
+    STAFF_REASONS = [ASSIGNEE, TRACKER, DEPARTMENT]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='complaint_access')
+    complaint = models.ForeignKey(Complaint, on_delete=models.CASCADE, related_name='viewers')
+    reason = models.CharField(max_length=4, choices=REASON_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'complaint', 'reason'], name='unique_complaint_viewer'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} may view {self.complaint_id} ({self.get_reason_display()})"
+
+class ComplaintCounter(models.Model):
+    """Number of complaints in a scope with one status/priority/category/location type.
+
+    Maintained by database triggers (migration 0008, see counters.py).
+    """
+    STUDENT = 'student'
+    DEPARTMENT = 'department'
+    ASSIGNEE = 'assignee'
+    TRACKER = 'tracker'
+    # Complaints a staff user may view; scope_id is the user id
+    VISIBLE = 'visible'
+
+    scope = models.CharField(max_length=10)
+    scope_id = models.BigIntegerField()
+    status = models.CharField(max_length=4)
+    priority = models.CharField(max_length=4)
+    category = models.CharField(max_length=6)
+    location_type = models.CharField(max_length=10, blank=True, default='')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'scope_id', 'status', 'priority', 'category', 'location_type'],
+                name='unique_complaint_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.scope_id}: {self.count}"
+
+class ComplaintRollup(models.Model):
+    """Complaints created on one day with one category/priority/status, department and assignee.
+
+    Maintained by database triggers (migrations 0009 and 0010, see
+    rollups.py). A department or assignee of 0 means none.
+    """
+    day = models.DateField()
+    category = models.CharField(max_length=6)
+    priority = models.CharField(max_length=4)
+    status = models.CharField(max_length=4)
+    department_id = models.BigIntegerField(default=0)
+    assignee_id = models.BigIntegerField(default=0)
+    count = models.IntegerField(default=0)
+    # Resolved and closed complaints with a resolved_at, and the sum of their
+    # resolved_at - created_at
+    resolved_count = models.IntegerField(default=0)
+    resolution_seconds = models.FloatField(default=0.0)
+    # Complaints with an assigned_at, and the sum of their assigned_at - created_at
+    assigned_count = models.IntegerField(default=0)
+    assignment_seconds = models.FloatField(default=0.0)
+    sentiment_total = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'category', 'priority', 'status', 'department_id', 'assignee_id'],
+                name='unique_complaint_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category}/{self.priority}/{self.status}: {self.count}"
 
 class Comment(models.Model):
     complaint = models.ForeignKey(Complaint, on_delete=models.CASCADE, related_name='comments')
@@ -271,4 +336,56 @@ class Comment(models.Model):
         verbose_name_plural = _('Comments')
     
     def __str__(self):
-        return f"Comment by {self.author} on {self.complaint}"
\ No newline at end of file
+        return f"Comment by {self.author} on {self.complaint}"
+
+
+class ComplaintEvent(models.Model):
+    """One entry of a complaint's timeline; events are only ever added"""
+    CREATED = 'CRTD'
+    ASSIGNED = 'ASSG'
+    STATUS_CHANGED = 'STAT'
+    ESCALATED = 'ESCL'
+    COMMENTED = 'CMNT'
+    RESOLVED = 'RESV'
+    KIND_CHOICES = [
+        (CREATED, 'Submitted'),
+        (ASSIGNED, 'Assigned'),
+        (STATUS_CHANGED, 'Status changed'),
+        (ESCALATED, 'Escalated'),
+        (COMMENTED, 'Commented'),
+        (RESOLVED, 'Resolved'),
+    ]
+
+    complaint = models.ForeignKey(Complaint, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=4, choices=KIND_CHOICES)
+    # The user who acted; None for the system (routing, analysis)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    from_status = models.CharField(max_length=4, choices=Complaint.STATUS_CHOICES, blank=True, default='')
+    to_status = models.CharField(max_length=4, choices=Complaint.STATUS_CHOICES, blank=True, default='')
+    assignee = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    comment = models.ForeignKey(Comment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Hidden from students, like internal comments
+    is_internal = models.BooleanField(default=False)
+    note = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['complaint', 'created_at'], name='event_complaint_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} on {self.complaint_id} at {self.created_at}"
+
+    def describe(self):
+        """One line for the timeline"""
+        if self.kind == self.ASSIGNED and self.assignee is not None:
+            return f"Assigned to {self.assignee.user.get_full_name() or self.assignee.get_role_display()}"
+        if self.kind in (self.STATUS_CHANGED, self.RESOLVED) and self.to_status:
+            if self.from_status:
+                return f"Status changed from {self.get_from_status_display()} to {self.get_to_status_display()}"
+            return f"Status changed to {self.get_to_status_display()}"
+        if self.kind == self.COMMENTED and self.comment is not None:
+            return self.comment.content
+        return self.note or self.get_kind_display()
@@ -0,0 +1,49 @@
+# notifications.py
+"""WebSocket notifications about complaints.
+
+``NotificationConsumer`` puts the connections of each user in a
+``user_<id>`` group. A notification goes to the student who submitted the
+complaint, its assignee and its trackers, read from the viewer table
+(access.py) in one query. It is sent once the current transaction commits,
+so a rolled-back request notifies no one. The group sends of one
+notification run concurrently, in a single call into the event loop.
+"""
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .models import ComplaintViewer
+
+RECIPIENT_REASONS = [ComplaintViewer.OWNER, ComplaintViewer.ASSIGNEE, ComplaintViewer.TRACKER]
+
+
+def recipients(complaint_id):
+    """Ids of the users to notify about a complaint"""
+    return list(ComplaintViewer.objects.filter(complaint_id=complaint_id, reason__in=RECIPIENT_REASONS)
+                .order_by('user_id').values_list('user_id', flat=True).distinct())
+
+
+async def fan_out(channel_layer, user_ids, event):
+    await asyncio.gather(*(channel_layer.group_send(f'user_{user_id}', event) for user_id in user_ids))
+
+
+def send(complaint_id, message):
+    """Send ``message`` to the users of a complaint now"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    user_ids = recipients(complaint_id)
+    if user_ids:
+        event = {'type': 'notification.message', 'message': message, 'complaint_id': complaint_id}
+        async_to_sync(fan_out)(channel_layer, user_ids, event)
+
+
+def notify(complaint, message):
+    """Send ``message`` to the users of ``complaint`` when the current transaction commits.
+
+    A failing channel layer is logged by Django rather than failing the request.
+    """
+    complaint_id = complaint.pk
+    transaction.on_commit(lambda: send(complaint_id, message), robust=True)
@@ -0,0 +1,166 @@
+# pagination.py
+"""Cursor pagination for the dashboards.
+
+``KeysetPaginator`` pages through a queryset in a fixed order ending in a
+unique column, e.g. (-priority_rank, -created_at, -id). Each page is fetched
+with a WHERE on the sort key of the row it continues from, so page N costs
+the same as page 1: no COUNT(*) and no OFFSET. The next and previous links
+carry opaque signed tokens holding that key and the filters of the listing;
+a token for other filters (or a tampered one) starts again at the first
+page. The total shown is an optional approximate figure supplied by the view
+(from the dashboard counters).
+
+Search results are ranked by relevance rather than a stored column, so
+``OffsetPaginator`` gives them the same page interface with offset tokens.
+"""
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.http import urlencode
+
+SALT = 'complaints.pagination'
+
+
+class CursorPage:
+    """One page of results; behaves like the list of objects on it.
+
+    ``query`` is the URL query string of the listing's filters, for links
+    that carry a token.
+    """
+
+    def __init__(self, object_list, next_token=None, previous_token=None, approximate_total=None,
+                 query=''):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+        self.approximate_total = approximate_total
+        self.query = query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class _Paginator:
+    def __init__(self, per_page, filters=None, approximate_total=None):
+        self.per_page = per_page
+        self.filters = {name: value for name, value in (filters or {}).items() if value}
+        self.approximate_total = approximate_total
+
+    def _token(self, **position):
+        return signing.dumps({'filters': self.filters, **position}, salt=SALT, compress=True)
+
+    def _position(self, token):
+        """The position stored in ``token``, or None to start at the first page"""
+        if not token:
+            return None
+        try:
+            data = signing.loads(token, salt=SALT)
+        except signing.BadSignature:
+            return None
+        if data.pop('filters', None) != self.filters:
+            return None
+        return data
+
+
+class KeysetPaginator(_Paginator):
+    """Pages of ``queryset`` in ``ordering``, whose last field must be unique"""
+
+    def __init__(self, queryset, ordering, per_page, filters=None, approximate_total=None):
+        super().__init__(per_page, filters, approximate_total)
+        self.queryset = queryset
+        self.fields = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+    def _key(self, obj):
+        key = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            key.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return key
+
+    def _parse_key(self, key):
+        if not isinstance(key, list) or len(key) != len(self.fields):
+            raise TypeError("Key does not match the ordering")
+        model = self.queryset.model
+        return [model._meta.get_field(name).to_python(value) for (name, _), value in zip(self.fields, key)]
+
+    def _ordered(self, forward):
+        return self.queryset.order_by(*(
+            f"{'-' if descending == forward else ''}{name}" for name, descending in self.fields))
+
+    def _beyond(self, key, forward):
+        """Rows after ``key`` in the direction of travel"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, key):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Bound on the leading column alone, so an index on it gives a range scan
+        (name, descending), value = self.fields[0], key[0]
+        return Q(**{f"{name}__{'lte' if descending == forward else 'gte'}": value}) & condition
+
+    def get_page(self, token=None):
+        position = self._position(token)
+        forward = position is None or position.get('direction') == 'next'
+        rows = self._ordered(forward)
+        if position is not None:
+            try:
+                key = self._parse_key(position['key'])
+            except (KeyError, TypeError, ValidationError):
+                return self.get_page()
+            rows = rows.filter(self._beyond(key, forward))
+
+        rows = list(rows[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        has_next = more if forward else True
+        has_previous = position is not None if forward else more
+        return CursorPage(
+            rows,
+            next_token=self._token(direction='next', key=self._key(rows[-1])) if rows and has_next else None,
+            previous_token=(self._token(direction='previous', key=self._key(rows[0]))
+                            if rows and has_previous else None),
+            approximate_total=self.approximate_total,
+            query=urlencode(self.filters),
+        )
+
+
+class OffsetPaginator(_Paginator):
+    """Pages of ranked search results"""
+
+    def __init__(self, results, per_page, filters=None):
+        super().__init__(per_page, filters, results.count())
+        self.results = results
+
+    def get_page(self, token=None):
+        position = self._position(token) or {}
+        offset = position.get('offset', 0)
+        if not isinstance(offset, int) or offset < 0:
+            offset = 0
+        rows = list(self.results[offset:offset + self.per_page + 1])
+        more = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page],
+            next_token=self._token(offset=offset + self.per_page) if more else None,
+            previous_token=self._token(offset=max(offset - self.per_page, 0)) if offset else None,
+            approximate_total=self.approximate_total,
+            query=urlencode(self.filters),
+        )
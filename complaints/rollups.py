@@ -0,0 +1,187 @@
+# rollups.py
+"""Daily rollups behind the analytics dashboard.
+
+``ComplaintRollup`` holds, for each day (creation date in TIME_ZONE) and each
+(category, priority, status, department, assignee), the number of complaints
+with the sums the dashboard averages: time to resolve of resolved and closed
+complaints (to ``resolved_at``), time to first assignment (to
+``assigned_at``), and sentiment. On SQLite, triggers (migrations 0009 to
+0011) adjust the rollups in the same transaction as every write to
+complaints, so the dashboard reads a number of rows that depends on the date range, not on the
+size of the complaint table. On other databases the same rows are
+aggregated from the live table.
+
+A student changing department is not tracked. ``reconcile_rollups``
+(command ``reconcile_rollups``, meant to run nightly) recomputes a range of
+days from the complaints and corrects any drift.
+"""
+import datetime
+import math
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Complaint, ComplaintRollup, Department, Staff
+
+RESOLVED = ['RESV', 'CLSD']
+KEY = ('day', 'category', 'priority', 'status', 'department_id', 'assignee_id')
+TOTALS = ('count', 'resolved_count', 'resolution_seconds', 'assigned_count', 'assignment_seconds',
+          'sentiment_total')
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _since_creation(field):
+    return ExpressionWrapper(F(field) - F('created_at'), output_field=DurationField())
+
+
+def _live(start=None, end=None):
+    """Rollup rows for the days ``start`` to ``end`` (inclusive), from the complaint table"""
+    complaints = Complaint.objects.all()
+    if start is not None:
+        complaints = complaints.filter(created_at__gte=_day_start(start))
+    if end is not None:
+        complaints = complaints.filter(created_at__lt=_day_start(end + datetime.timedelta(days=1)))
+
+    resolved = Q(status__in=RESOLVED, resolved_at__isnull=False)
+    assigned = Q(assigned_at__isnull=False)
+    rows = complaints.annotate(
+        day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()),
+    ).values_list(
+        'day', 'category', 'priority', 'status', 'student__department_id', 'assigned_to_id',
+    ).annotate(
+        count=Count('pk'),
+        resolved_count=Count('pk', filter=resolved),
+        resolution=Sum(_since_creation('resolved_at'), filter=resolved),
+        assigned_count=Count('pk', filter=assigned),
+        assignment=Sum(_since_creation('assigned_at'), filter=assigned),
+        sentiment_total=Sum('sentiment_score'),
+    ).order_by()
+    for (day, category, priority, status, department_id, assignee_id, count,
+         resolved_count, resolution, assigned_count, assignment, sentiment) in rows:
+        yield ComplaintRollup(
+            day=day, category=category, priority=priority, status=status,
+            department_id=department_id or 0, assignee_id=assignee_id or 0, count=count,
+            resolved_count=resolved_count,
+            resolution_seconds=resolution.total_seconds() if resolution else 0.0,
+            assigned_count=assigned_count,
+            assignment_seconds=assignment.total_seconds() if assignment else 0.0,
+            sentiment_total=sentiment or 0.0,
+        )
+
+
+def get_rollups(start=None, end=None):
+    """Rollup rows for the days ``start`` to ``end`` (inclusive; None leaves that side open)"""
+    if connection.vendor != 'sqlite':
+        return list(_live(start, end))
+    rows = ComplaintRollup.objects.filter(count__gt=0)
+    if start is not None:
+        rows = rows.filter(day__gte=start)
+    if end is not None:
+        rows = rows.filter(day__lte=end)
+    return list(rows)
+
+
+def summarize(rows, top=5):
+    """The analytics dashboard figures for a list of rollup rows"""
+    tallies = {name: defaultdict(int) for name in ('status', 'category', 'priority', 'month', 'department',
+                                                   'resolved_by')}
+    totals = dict.fromkeys(TOTALS, 0)
+    for row in rows:
+        for field in TOTALS:
+            totals[field] += getattr(row, field)
+        tallies['status'][row.status] += row.count
+        tallies['category'][row.category] += row.count
+        tallies['priority'][row.priority] += row.count
+        tallies['month'][row.day.replace(day=1)] += row.count
+        tallies['department'][row.department_id] += row.count
+        if row.status in RESOLVED and row.assignee_id:
+            tallies['resolved_by'][row.assignee_id] += row.count
+    return figures(tallies, totals, top)
+
+
+def crosstab(rows, rows_by, columns_by):
+    """``{row value: {column value: count}}`` of two rollup key fields, like ``ComplaintCube.crosstab``"""
+    table = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        if row.count:
+            table[getattr(row, rows_by)][getattr(row, columns_by)] += row.count
+    return {value: dict(counts) for value, counts in table.items()}
+
+
+def _average(seconds, count):
+    return datetime.timedelta(seconds=seconds / count) if count else None
+
+
+def figures(tallies, totals, top=5):
+    """The analytics dashboard context from complaint counts.
+
+    ``tallies`` maps 'status', 'category', 'priority', 'month' (first day),
+    'department' (id, 0 for none) and 'resolved_by' (assignee id) to counts;
+    ``totals`` maps each of TOTALS to its sum.
+    """
+    total = totals['count']
+    by_department = tallies['department']
+    departments = Department.objects.in_bulk([pk for pk in by_department if pk])
+    leaders = sorted(tallies['resolved_by'].items(), key=lambda item: (-item[1], item[0]))[:top]
+    staff = Staff.objects.select_related('user').in_bulk([pk for pk, _ in leaders])
+    top_resolvers = []
+    for pk, count in leaders:
+        if pk in staff:
+            staff[pk].resolved_count = count
+            top_resolvers.append(staff[pk])
+
+    def listed(name, key=None):
+        return [{name: value, 'count': tallies[name][value]} for value in sorted(tallies[name], key=key)]
+
+    return {
+        'total_complaints': total,
+        'complaints_by_status': listed('status'),
+        'complaints_by_category': listed('category'),
+        'complaints_by_priority': listed('priority', key=lambda priority: Complaint.PRIORITY_RANKS.get(priority, 0)),
+        'complaints_by_month': listed('month'),
+        'avg_resolution_time': _average(totals['resolution_seconds'], totals['resolved_count']),
+        'avg_assignment_time': _average(totals['assignment_seconds'], totals['assigned_count']),
+        'complaints_by_department': [
+            {'name': departments[pk].name if pk in departments else None, 'count': count}
+            for pk, count in sorted(by_department.items(), key=lambda item: -item[1])
+        ],
+        'top_resolvers': top_resolvers,
+        'sentiment_stats': {'avg_sentiment': totals['sentiment_total'] / total if total else None},
+    }
+
+
+def _differs(stored, live):
+    return not all(math.isclose(getattr(stored, field), getattr(live, field), abs_tol=0.01) for field in TOTALS)
+
+
+def reconcile_rollups(start=None, end=None, batch_size=1000):
+    """Make the stored rollups for ``start`` to ``end`` match the complaints; returns the rows corrected"""
+    stored = ComplaintRollup.objects.all()
+    if start is not None:
+        stored = stored.filter(day__gte=start)
+    if end is not None:
+        stored = stored.filter(day__lte=end)
+    stored = {tuple(getattr(row, field) for field in KEY): row for row in stored}
+
+    created, changed = [], []
+    for row in _live(start, end):
+        current = stored.pop(tuple(getattr(row, field) for field in KEY), None)
+        if current is None:
+            created.append(row)
+        elif _differs(current, row):
+            for field in TOTALS:
+                setattr(current, field, getattr(row, field))
+            changed.append(current)
+    # Groups without complaints left; only those still holding totals were wrong
+    stale = [row for row in stored.values() if _differs(row, ComplaintRollup())]
+
+    ComplaintRollup.objects.bulk_create(created, batch_size=batch_size)
+    ComplaintRollup.objects.bulk_update(changed, TOTALS, batch_size=batch_size)
+    ComplaintRollup.objects.filter(pk__in=[row.pk for row in stored.values()]).delete()
+    return len(created) + len(changed) + len(stale)
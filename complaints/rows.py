@@ -0,0 +1,101 @@
+# rows.py
+"""Dashboard rows: what the dashboard templates show about each complaint.
+
+Templates that walk relations per complaint (student, department, assignee,
+trackers, comments) issue one or more queries per row. ``complaint_rows``
+instead reads everything for a page of complaints in one query, a
+``values()`` projection with joins and ``Exists``/``Subquery``
+annotations, plus one query for the latest public comments when asked for.
+The cost is the same whatever the page size.
+"""
+from django.db.models import Exists, F, OuterRef, Subquery
+
+from .models import Comment, Complaint
+
+CATEGORY_NAMES = dict(Complaint.CATEGORY_CHOICES)
+PRIORITY_NAMES = dict(Complaint.PRIORITY_CHOICES)
+STATUS_NAMES = dict(Complaint.STATUS_CHOICES)
+
+FIELDS = ('id', 'title', 'description', 'location', 'location_type', 'category', 'priority',
+          'status', 'created_at', 'assigned_to_id')
+RELATED_FIELDS = {
+    'student_first_name': 'student__user__first_name',
+    'student_last_name': 'student__user__last_name',
+    'student_number': 'student__student_id',
+    'department_name': 'student__department__name',
+    'assignee_first_name': 'assigned_to__user__first_name',
+    'assignee_last_name': 'assigned_to__user__last_name',
+}
+
+
+def full_name(first_name, last_name):
+    """Same as ``User.get_full_name``"""
+    return f"{first_name or ''} {last_name or ''}".strip()
+
+
+class CommentRow:
+    def __init__(self, values):
+        self.content = values['content']
+        self.created_at = values['created_at']
+        self.author_name = full_name(values['author__user__first_name'], values['author__user__last_name'])
+
+
+class ComplaintRow:
+    """One listed complaint, with display values and the viewer-specific flags"""
+
+    def __init__(self, values, staff_id=None, latest_comment=None):
+        for field in FIELDS:
+            setattr(self, field, values[field])
+        self.category_display = CATEGORY_NAMES.get(self.category, self.category)
+        self.priority_display = PRIORITY_NAMES.get(self.priority, self.priority)
+        self.status_display = STATUS_NAMES.get(self.status, self.status)
+        self.student_name = full_name(values['student_first_name'], values['student_last_name'])
+        self.student_number = values['student_number']
+        self.department_name = values['department_name']
+        self.assigned_to_name = (full_name(values['assignee_first_name'], values['assignee_last_name'])
+                                 if self.assigned_to_id is not None else None)
+        self.is_assigned_to_me = staff_id is not None and self.assigned_to_id == staff_id
+        self.is_tracked_by_me = values.get('is_tracked_by_me', False)
+        self.latest_comment = latest_comment
+
+
+def complaint_rows(complaints, staff=None, with_comments=False):
+    """Rows for ``complaints`` (model instances or ids), in the same order.
+
+    ``staff`` sets the "assigned to me" and "tracked by me" flags;
+    ``with_comments`` adds each complaint's latest public comment.
+    """
+    ids = [getattr(complaint, 'pk', complaint) for complaint in complaints]
+    if not ids:
+        return []
+
+    annotations = {}
+    if staff is not None:
+        annotations['is_tracked_by_me'] = Exists(Complaint.trackers.through.objects.filter(
+            complaint_id=OuterRef('pk'), staff_id=staff.pk))
+    if with_comments:
+        annotations['latest_comment_id'] = Subquery(
+            Comment.objects.filter(complaint_id=OuterRef('pk'), is_internal=False)
+            .order_by('-created_at', '-pk').values('pk')[:1])
+
+    found = {
+        values['id']: values
+        for values in Complaint.objects.filter(pk__in=ids).annotate(**annotations).values(
+            *FIELDS, *annotations, **{name: F(path) for name, path in RELATED_FIELDS.items()})
+    }
+
+    comments = {}
+    if with_comments:
+        comment_ids = [values['latest_comment_id'] for values in found.values() if values['latest_comment_id']]
+        if comment_ids:
+            comments = {
+                values['id']: CommentRow(values)
+                for values in Comment.objects.filter(pk__in=comment_ids).values(
+                    'id', 'content', 'created_at', 'author__user__first_name', 'author__user__last_name')
+            }
+
+    return [
+        ComplaintRow(found[pk], staff.pk if staff is not None else None,
+                     comments.get(found[pk].get('latest_comment_id')))
+        for pk in ids if pk in found
+    ]
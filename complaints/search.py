@@ -0,0 +1,87 @@
+# search.py
+"""Ranked full-text search over complaints.
+
+On SQLite the ``complaints_search`` FTS5 table (migration 0005) holds each
+complaint's title, description, location and the text of its public
+comments, keyed by complaint id. Triggers on the complaint and comment tables
+keep it in sync on every write, including ``bulk_update`` and
+``QuerySet.update``. Searches are always run within a queryset of
+complaints the user may already see, so results never widen visibility.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+SEARCH_TABLE = 'complaints_search'
+
+# bm25() weights of the indexed columns: title, description, location, comments
+COLUMN_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+
+def fts_query(text):
+    """FTS5 query matching every word of ``text`` as a prefix; user syntax is never passed through"""
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', text.lower()))
+
+
+class SearchResults:
+    """Ranked matches within a queryset.
+
+    Supports ``count()`` and slicing, so it can be handed to ``Paginator``;
+    each slice runs one ranked query and one ``in_bulk`` lookup.
+    """
+
+    def __init__(self, query, within):
+        self.match = fts_query(query)
+        self.within = within
+        self._count = None
+
+    def _where(self):
+        visible_sql, visible_params = self.within.order_by().values('pk').query.sql_with_params()
+        return (f"{SEARCH_TABLE} MATCH %s AND +rowid IN ({visible_sql})",
+                [self.match, *visible_params])
+
+    def count(self):
+        if self._count is None:
+            self._count = 0
+            if self.match:
+                where, params = self._where()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {where}", params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = self.count() if key.stop is None else key.stop
+        if not self.match or stop <= start:
+            return []
+
+        where, params = self._where()
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {where} "
+                f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s OFFSET %s",
+                [*params, stop - start, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        complaints = self.within.model._default_manager.select_related('student__user').in_bulk(ids)
+        return [complaints[pk] for pk in ids if pk in complaints]
+
+
+def search_complaints(query, within):
+    """Complaints in ``within`` matching ``query``, best matches first"""
+    if connection.vendor == 'sqlite':
+        return SearchResults(query, within)
+
+    # No FTS5 index on other databases: unranked substring search
+    return within.filter(
+        Q(title__icontains=query) | Q(description__icontains=query) | Q(location__icontains=query)
+        | Q(comments__content__icontains=query, comments__is_internal=False)
+    ).distinct()
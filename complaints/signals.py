@@ -0,0 +1,55 @@
+# signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .access import set_assignee, sync_followers, sync_staff, sync_trackers
+from .directory import invalidate_directory
+from .models import Comment, Complaint, ComplaintEvent, Staff
+
+
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def staff_changed(sender, **kwargs):
+    """Any change to staff roles or departments can change routing"""
+    invalidate_directory()
+
+
+@receiver(post_save, sender=Staff)
+def staff_saved(sender, instance, **kwargs):
+    sync_staff(instance)
+
+
+@receiver(post_delete, sender=Staff)
+def staff_deleted(sender, instance, **kwargs):
+    sync_staff(instance, deleted=True)
+
+
+@receiver(post_save, sender=Complaint)
+def complaint_saved(sender, instance, created, update_fields=None, **kwargs):
+    """New complaints get their viewer rows in ``Complaint.save``"""
+    if not created and (update_fields is None or 'assigned_to' in update_fields):
+        set_assignee(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    """Every comment is a timeline event, internal ones hidden from students"""
+    if created and not raw:
+        ComplaintEvent.objects.create(
+            complaint_id=instance.complaint_id, kind=ComplaintEvent.COMMENTED,
+            actor_id=instance.author.user_id if instance.author_id else None,
+            comment=instance, is_internal=instance.is_internal, created_at=instance.created_at,
+        )
+
+
+@receiver(m2m_changed, sender=Complaint.trackers.through)
+def trackers_changed(sender, instance, action, reverse, **kwargs):
+    """Tracker changes through the ORM or the admin (``add_trackers`` grants rows itself)"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        sync_trackers(instance, reverse)
+
+
+@receiver(m2m_changed, sender=Complaint.followers.through)
+def followers_changed(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        sync_followers(instance, reverse)
@@ -0,0 +1,150 @@
+# tasks.py
+"""Complaint analysis that runs outside the request/response cycle.
+
+With ANALYSIS_ASYNC_SUBMIT enabled, ``submit_complaint`` saves the complaint
+straight away with a keyword-only provisional classification and hands the
+full analysis, routing and tracker setup to a pool of worker processes, each
+holding its own analyzer. A job that fails in the pool is run again in this
+process; complaints still pending after a crash or restart are finished by
+``reanalyze --pending``.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from analysis.sentiment import ComplaintAnalyzer
+from .models import Complaint
+from .assignment import route_complaint
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def apply_analysis(complaint, analysis):
+    """Copy analyzer output onto a complaint, with the submission-time academic rules"""
+    complaint.category = analysis['category']
+    complaint.priority = analysis['priority']
+    complaint.sentiment_score = analysis['sentiment_score']
+
+    # Enhanced priority logic for academic complaints
+    if complaint.category == 'ACAD':
+        # Check for exam-related urgency keywords
+        urgency_keywords = ['exam', 'test', 'weeks', 'days', 'assessment', 'evaluation']
+        complaint_text = (complaint.title + ' ' + complaint.description).lower()
+
+        if any(keyword in complaint_text for keyword in urgency_keywords):
+            # Extract time mentions and assess urgency
+            if any(phrase in complaint_text for phrase in ['3 weeks', 'two weeks', '2 weeks', 'few weeks']):
+                complaint.priority = 'HIGH'
+            elif any(phrase in complaint_text for phrase in ['week', 'days', 'soon']):
+                complaint.priority = 'CRIT'
+            elif complaint.priority == 'LOW':
+                complaint.priority = 'MED'
+
+    complaint.priority_rank = Complaint.PRIORITY_RANKS[complaint.priority]
+    return complaint
+
+
+def _init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'complaint_system.settings')
+    import django
+    django.setup()
+
+    # Load the model now rather than while the first complaint waits
+    from analysis.nlp import warm_up
+    warm_up()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Spawned (not forked) workers never share the web process's
+                # database connections
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.ANALYSIS_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                )
+    return _executor
+
+
+def schedule_analysis(complaint):
+    """Run ``finalize_analysis`` for the complaint once the current transaction commits"""
+    transaction.on_commit(lambda: _submit(complaint.pk))
+
+
+def _submit(complaint_id):
+    global _executor
+    try:
+        future = get_executor().submit(finalize_analysis, complaint_id)
+    except (BrokenProcessPool, RuntimeError):
+        logger.exception("Analysis pool unavailable, analyzing complaint %s inline", complaint_id)
+        _executor = None
+        finalize_analysis(complaint_id)
+    else:
+        future.add_done_callback(lambda done: _retry_failure(done, complaint_id))
+
+
+def _retry_failure(future, complaint_id):
+    """Finish a complaint whose pool job raised or whose worker died"""
+    global _executor
+    if future.cancelled() or future.exception() is None:
+        return
+    logger.error("Analysis of complaint %s failed in the pool, retrying inline", complaint_id,
+                 exc_info=future.exception())
+    if isinstance(future.exception(), BrokenProcessPool):
+        # The next submission starts a new pool
+        _executor = None
+    # Not on the pool's result thread, which would hold up every other job
+    threading.Thread(target=_finalize_inline, args=(complaint_id,), daemon=True).start()
+
+
+def _finalize_inline(complaint_id):
+    try:
+        finalize_analysis(complaint_id)
+    except Exception:
+        logger.exception("Analysis of complaint %s failed; run reanalyze --pending to finish it", complaint_id)
+    finally:
+        connection.close()
+
+
+def finalize_analysis(complaint_id):
+    """Replace a provisional classification with the full analysis, then route the complaint.
+
+    Does nothing if the complaint is no longer pending, so running it twice is harmless.
+    """
+    # Imported here: views imports this module
+    from .views import send_complaint_notification
+
+    complaint = Complaint.objects.filter(pk=complaint_id, analysis_pending=True).only(
+        'title', 'description').first()
+    if complaint is None:
+        return
+    analysis = ComplaintAnalyzer().analyze(complaint.description, complaint.title)
+
+    # Classification, routing and trackers are written together or not at all;
+    # the notification is sent on commit
+    with transaction.atomic():
+        complaint = Complaint.objects.select_for_update().select_related('student').filter(
+            pk=complaint_id, analysis_pending=True).first()
+        if complaint is None:
+            return
+        apply_analysis(complaint, analysis)
+        complaint.analysis_pending = False
+        route_complaint(complaint, ['category', 'priority', 'sentiment_score', 'analysis_pending'])
+
+        send_complaint_notification(
+            complaint,
+            f"Complaint #{complaint.id} classified as {complaint.get_category_display()} "
+            f"({complaint.get_priority_display()} priority)"
+        )
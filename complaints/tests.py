@@ -1,3 +1,1219 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import gzip
+import io
+import json
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.dispatch import receiver
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.signals import setting_changed
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from analysis import benchmark
+from analysis.cache import AnalysisCache, make_key, reset_analysis_cache
+from analysis.client import AnalyzerClient, AnalyzerUnavailable
+from analysis.matcher import KeywordMatcher, simple_tokenize
+from analysis.nlp import registry
+from analysis.polarity import POLARITY_TOLERANCE, PolarityLexicon
+from analysis.sentiment import ComplaintAnalyzer
+from analysis.server import AnalyzerServer
+from analysis.vectorized import VectorizedScorer
+from .directory import StaffDirectory, get_directory, invalidate_directory
+from .counters import get_tallies, rebuild_counters
+from . import cube as cube_module
+from .cube import ComplaintCube, get_cube, reset_cube
+from .notifications import notify
+from .rollups import get_rollups, reconcile_rollups, summarize
+from .models import Comment, Complaint, ComplaintCounter, ComplaintEvent, Department, Staff, Student
+from .assignment import plan_route
+from . import tasks
+from .tasks import finalize_analysis
+
+
+def split_tokens(text):
+    return re.findall(r"\n|[^\s]+", text)
+
+
+# The analyzer only uses the spaCy tokenizer, which a blank English pipeline
+# shares with en_core_web_sm, so the tests do not need the model files.
+# Results are cached in memory instead of BASE_DIR/cache/analysis.
+ANALYZER_SETTINGS = {'ANALYSIS_SPACY_MODEL': 'blank:en', 'ANALYSIS_CACHE_ALIAS': 'default'}
+
+
+@receiver(setting_changed)
+def rebuild_analysis_cache(setting, **kwargs):
+    # The process-wide analysis cache is built once from these settings
+    if setting.startswith('ANALYSIS_CACHE'):
+        reset_analysis_cache()
+
+
+class RoutingTestCase(TestCase):
+    def setUp(self):
+        # Staff rows are rolled back between tests without signals
+        invalidate_directory()
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = KeywordMatcher(split_tokens)
+        self.matcher.add_keywords('category', {
+            'ACAD': ['test', 'lecture'],
+            'INFRA': ['lecture hall', 'room'],
+        })
+        self.matcher.add_sequences('time', {
+            'CRIT': [(['tomorrow'], ['exam'])],
+        })
+
+    def test_matches_whole_tokens_only(self):
+        matches = self.matcher.scan(split_tokens('the latest results'))
+        self.assertFalse(matches.any('category', 'ACAD'))
+
+    def test_counts_occurrences_and_nested_phrases(self):
+        matches = self.matcher.scan(split_tokens('lecture hall and lecture room room'))
+        self.assertEqual(matches.count('category', 'ACAD'), 2)
+        self.assertEqual(matches.count('category', 'INFRA'), 3)
+        self.assertEqual(matches.distinct('category', 'INFRA'), 2)
+
+    def test_sequences_must_be_ordered_on_one_line(self):
+        self.assertEqual(self.matcher.scan(split_tokens('tomorrow is the exam')).sequences('time'), {'CRIT'})
+        self.assertEqual(self.matcher.scan(split_tokens('exam is tomorrow')).sequences('time'), set())
+        self.assertEqual(self.matcher.scan(split_tokens('tomorrow \n exam')).sequences('time'), set())
+
+
+class AnalysisCacheTests(SimpleTestCase):
+    def test_key_ignores_whitespace_but_not_line_breaks(self):
+        key = make_key('rules', 'Water  is\r\nleaking ', 'Leak')
+        self.assertEqual(key, make_key('rules', 'Water is\nleaking', ' Leak'))
+        self.assertNotEqual(key, make_key('rules', 'Water is leaking', 'Leak'))
+        self.assertNotEqual(key, make_key('other rules', 'Water is\nleaking', 'Leak'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = AnalysisCache(max_entries=2)
+        cache.set('a', {'priority': 'LOW'})
+        cache.set('b', {'priority': 'MED'})
+        cache.get('a')
+        cache.set('c', {'priority': 'HIGH'})
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), {'priority': 'LOW'})
+
+
+@override_settings(**ANALYZER_SETTINGS)
+class ComplaintAnalyzerTests(SimpleTestCase):
+    def setUp(self):
+        self.analyzer = ComplaintAnalyzer()
+
+    def test_infrastructure_complaint(self):
+        result = self.analyzer.analyze(
+            "The window in lecture hall B is broken and water leaks during rain.",
+            "Broken window in lecture hall")
+        self.assertEqual(result['category'], 'INFRA')
+
+    def test_exam_tomorrow_is_critical(self):
+        result = self.analyzer.analyze(
+            "The exam is tomorrow and we still have no syllabus.", "Exam tomorrow")
+        self.assertEqual(result['category'], 'ACAD')
+        self.assertEqual(result['priority'], 'CRIT')
+
+    def test_lecturer_absence_before_exam_is_high(self):
+        result = self.analyzer.analyze(
+            "Our lecturer hasn't been coming to class for weeks and the exam is in 3 weeks.",
+            "Lecturer absent")
+        self.assertEqual(result['priority'], 'HIGH')
+
+    def test_sentiment_matches_textblob(self):
+        from textblob import TextBlob
+
+        for text in [
+            "I am very unhappy with the terrible state of the hostel bathroom!!",
+            "The lecturer is not good at all, and the course is really not helpful.",
+            "This is not a good situation :( please help",
+            "I don't like the new timetable, it's confusing and badly organised.",
+            "They promised a high-quality fix but we still have a broken pipe.",
+            "The hostel kitchen is a first-class mess.",
+            "The lab assistant is short-tempered and rude.",
+            "The so-called repair was half-done.",
+            "Low-quality chairs and ill-mannered security guards.",
+            "It's ok-ish",
+            "I am so sad :'(",
+            "My roommate's music is loud - very loud - every night.",
+        ]:
+            with self.subTest(text=text):
+                self.assertAlmostEqual(self.analyzer.analyze(text)['sentiment_score'],
+                                       TextBlob(text).sentiment.polarity,
+                                       delta=POLARITY_TOLERANCE)
+
+    def test_labelled_corpus_matches_frozen_baseline(self):
+        corpus = benchmark.load_corpus()
+        results, _ = benchmark.measure_throughput(corpus, self.analyzer)
+        agreement = benchmark.baseline_agreement(corpus, results, benchmark.load_baseline())
+        self.assertEqual(agreement['compared'], len(corpus))
+        self.assertEqual(agreement['differences'], [])
+
+    def test_analyze_many_preserves_input_order(self):
+        complaints = [
+            ("The exam is tomorrow.", "Exam"),
+            ("Water is leaking from the ceiling.", None),
+            ("My roommate keeps taking my things in the hostel.", "Hostel"),
+        ] * 5
+        results = list(self.analyzer.analyze_many(complaints, batch_size=2))
+        self.assertEqual([result['category'] for result in results],
+                         ['ACAD', 'INFRA', 'HOSTEL'] * 5)
+        self.assertEqual(results[0], self.analyzer.analyze("The exam is tomorrow.", "Exam"))
+
+    def test_keyword_change_changes_fingerprint(self):
+        fingerprint = ComplaintAnalyzer.fingerprint()
+        keywords = dict(ComplaintAnalyzer.PRIORITY_KEYWORDS, MED=['problem', 'trouble'])
+        with mock.patch.object(ComplaintAnalyzer, 'PRIORITY_KEYWORDS', keywords):
+            self.assertNotEqual(ComplaintAnalyzer.fingerprint(), fingerprint)
+            self.assertEqual(self.analyzer.analyze("There is some trouble.")['priority'], 'MED')
+
+    def test_fingerprint_is_remembered(self):
+        fingerprint = ComplaintAnalyzer.fingerprint()
+        with mock.patch('analysis.sentiment.json.dumps') as dumps:
+            self.assertEqual(ComplaintAnalyzer.fingerprint(), fingerprint)
+        dumps.assert_not_called()
+
+
+@override_settings(**ANALYZER_SETTINGS)
+class FastBackendTests(SimpleTestCase):
+    def test_fast_backend_never_loads_spacy(self):
+        registry.clear()
+        with override_settings(ANALYSIS_BACKEND='fast'):
+            result = ComplaintAnalyzer().analyze("The exam is tomorrow and nobody told us.", "Exam")
+        self.assertEqual((result['category'], result['priority']), ('ACAD', 'CRIT'))
+        self.assertEqual(registry.stats(), [])
+
+    def test_backends_have_separate_fingerprints(self):
+        self.assertNotEqual(ComplaintAnalyzer.fingerprint('fast'), ComplaintAnalyzer.fingerprint('spacy'))
+
+    def test_parity_with_spacy_backend(self):
+        report = benchmark.compare_backends(benchmark.load_corpus())
+        self.assertEqual(report['agreement']['category'], 1.0)
+        # spaCy does not split "haven’t" with a typographic apostrophe; the regex does
+        self.assertEqual([difference['id'] for difference in report['differences']], ['edge-03'])
+        self.assertLess(report['max_sentiment_delta'], POLARITY_TOLERANCE)
+
+    def test_emoticons_score_like_spacy_backend(self):
+        self.assertEqual(simple_tokenize("fix it:) now :-( or :p ok (really)"),
+                         ['fix', 'it', ':)', 'now', ':-(', 'or', ':p', 'ok', '(', 'really', ')'])
+        for text in [":(", ":-(", "The hostel water is off again :-(", "It broke :/ again", "Love it <3"]:
+            with self.subTest(text=text):
+                fast, spacy = (next(ComplaintAnalyzer(backend).analyze_many([(text, None)]))
+                               for backend in ('fast', 'spacy'))
+                self.assertAlmostEqual(fast['sentiment_score'], spacy['sentiment_score'])
+                self.assertEqual(fast['priority'], spacy['priority'])
+
+    def test_lexicon_snapshot_matches_textblob(self):
+        snapshot = PolarityLexicon.from_json()
+        current = PolarityLexicon.from_textblob()
+        self.assertEqual(snapshot.words, current.words)
+        self.assertEqual(snapshot.emoticons, current.emoticons)
+
+
+@override_settings(ANALYSIS_SPACY_MODEL='blank:en', ANALYSIS_CACHE_SIZE=0)
+class AnalyzerServerTests(SimpleTestCase):
+    def setUp(self):
+        reset_analysis_cache()
+        self.addCleanup(reset_analysis_cache)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = str(Path(directory.name) / 'analyzer.sock')
+
+        self.server = AnalyzerServer(self.path, max_wait=0.05)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_concurrent_requests_share_batches(self):
+        texts = [f"The projector in room {number} is broken." for number in range(16)]
+        client = AnalyzerClient(self.path)
+        results = [None] * len(texts)
+
+        def analyze(index):
+            results[index] = client.analyze(texts[index], 'Projector')
+
+        threads = [threading.Thread(target=analyze, args=(index,)) for index in range(len(texts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, list(ComplaintAnalyzer().analyze_many((text, 'Projector') for text in texts)))
+        self.assertEqual(self.server.analyzed, len(texts))
+        self.assertLess(self.server.batches, len(texts))
+
+    def test_one_request_retries_a_failed_server(self):
+        client = AnalyzerClient(self.path + '.missing', retry_interval=0.01)
+        with self.assertRaises(AnalyzerUnavailable):
+            client.analyze("The exam is tomorrow.")
+        time.sleep(0.02)
+
+        probing, release = threading.Event(), threading.Event()
+
+        def slow_request(request):
+            probing.set()
+            release.wait(5)
+            raise AnalyzerUnavailable("still down")
+
+        with mock.patch.object(client, '_request', side_effect=slow_request) as request:
+            probe = threading.Thread(target=lambda: self.assertRaises(AnalyzerUnavailable, client.analyze, "x"))
+            probe.start()
+            probing.wait(5)
+            with self.assertRaisesRegex(AnalyzerUnavailable, 'failed recently'):
+                client.analyze("The exam is tomorrow.")
+            release.set()
+            probe.join()
+        self.assertEqual(request.call_count, 1)
+
+    def test_analyzer_uses_server_when_configured(self):
+        with override_settings(ANALYSIS_SOCKET=self.path):
+            result = ComplaintAnalyzer().analyze("The exam is tomorrow.", "Exam")
+        self.assertEqual(result['priority'], 'CRIT')
+        self.assertEqual(self.server.analyzed, 1)
+
+    def test_falls_back_in_process_without_server(self):
+        with override_settings(ANALYSIS_SOCKET=self.path + '.missing'):
+            with self.assertLogs('analysis.sentiment', 'WARNING'):
+                result = ComplaintAnalyzer().analyze("The exam is tomorrow.", "Exam")
+        self.assertEqual(result['priority'], 'CRIT')
+        self.assertEqual(self.server.analyzed, 0)
+
+
+@override_settings(**ANALYZER_SETTINGS)
+class VectorizedScorerTests(SimpleTestCase):
+    def test_matches_analyzer_on_corpus(self):
+        corpus = benchmark.load_corpus() + benchmark.synthetic_corpus(300)
+        texts = [(item['description'], item['title']) for item in corpus]
+        expected = list(ComplaintAnalyzer().analyze_many(texts))
+        self.assertEqual(list(VectorizedScorer().score_many(texts, batch_size=64)), expected)
+
+    def test_weights_change_category(self):
+        text = [("The lecturer left the classroom with a broken projector.", None)]
+        self.assertEqual(next(VectorizedScorer().score_many(text))['category'], 'INFRA')
+        scorer = VectorizedScorer(weights={'ACAD': {'lecturer': 5}})
+        self.assertEqual(next(scorer.score_many(text))['category'], 'ACAD')
+
+
+@override_settings(**ANALYZER_SETTINGS)
+class SubmitComplaintTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        self.student = Student.objects.create(
+            user=User.objects.create_user('student', password='pass'),
+            student_id='CSC/001', department=department)
+        self.works = Staff.objects.create(
+            user=User.objects.create_user('works', password='pass'), role='WD')
+        self.client.login(username='student', password='pass')
+
+    def submit(self):
+        return self.client.post(reverse('submit_complaint'), {
+            'title': 'Broken window',
+            'description': 'The window in room 12 is broken and water leaks in.',
+            'location_type': 'LECTURE',
+        })
+
+    def test_submit_analyzes_and_assigns(self):
+        self.assertRedirects(self.submit(), reverse('student_dashboard'))
+        complaint = Complaint.objects.get()
+        self.assertEqual(complaint.category, 'INFRA')
+        self.assertEqual(complaint.assigned_to, self.works)
+        self.assertFalse(complaint.analysis_pending)
+
+    @override_settings(ANALYSIS_ASYNC_SUBMIT=True)
+    def test_async_submit_defers_analysis_and_routing(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertRedirects(self.submit(), reverse('student_dashboard'))
+        self.assertEqual(len(callbacks), 1)
+
+        complaint = Complaint.objects.get()
+        self.assertTrue(complaint.analysis_pending)
+        self.assertEqual(complaint.category, 'INFRA')
+        self.assertIsNone(complaint.assigned_to)
+
+        finalize_analysis(complaint.pk)
+        complaint.refresh_from_db()
+        self.assertFalse(complaint.analysis_pending)
+        self.assertEqual(complaint.assigned_to, self.works)
+        self.assertEqual(complaint.status, 'ASSG')
+
+    @override_settings(ANALYSIS_ASYNC_SUBMIT=True)
+    def test_failed_pool_job_is_retried_inline(self):
+        self.submit()
+        complaint = Complaint.objects.get()
+        future = mock.Mock(cancelled=mock.Mock(return_value=False),
+                           exception=mock.Mock(return_value=RuntimeError('worker died')))
+        with mock.patch('complaints.tasks.threading.Thread') as thread, self.assertLogs('complaints.tasks'):
+            tasks._retry_failure(future, complaint.pk)
+        self.assertEqual(thread.call_args.kwargs['args'], (complaint.pk,))
+
+    @override_settings(ANALYSIS_ASYNC_SUBMIT=True)
+    def test_reanalyze_finishes_pending_complaints(self):
+        self.submit()
+        out = io.StringIO()
+        call_command('reanalyze', '--pending', stdout=out)
+        self.assertIn('Finished 1 pending', out.getvalue())
+        complaint = Complaint.objects.get()
+        self.assertFalse(complaint.analysis_pending)
+        self.assertEqual(complaint.assigned_to, self.works)
+
+    @override_settings(ANALYSIS_ASYNC_SUBMIT=True)
+    def test_partial_route_is_rolled_back(self):
+        self.submit()
+        with mock.patch('complaints.assignment.add_trackers', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            finalize_analysis(Complaint.objects.get().pk)
+        complaint = Complaint.objects.get()
+        self.assertTrue(complaint.analysis_pending)
+        self.assertIsNone(complaint.assigned_to)
+
+
+@override_settings(**ANALYZER_SETTINGS)
+class DuplicateComplaintTests(RoutingTestCase):
+    OUTAGE = "There is no water in Block C hostel since this morning. The taps are dry and toilets cannot flush."
+
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        reporter = Student.objects.create(
+            user=User.objects.create_user('reporter'), student_id='CSC/001', department=department)
+        self.student = Student.objects.create(
+            user=User.objects.create_user('student', password='pass'),
+            student_id='CSC/002', department=department)
+        self.existing = Complaint.objects.create(student=reporter, title='No water in Block C',
+                                                 description=self.OUTAGE, category='INFRA', priority='HIGH')
+        self.client.login(username='student', password='pass')
+
+    def submit(self, **extra):
+        return self.client.post(reverse('submit_complaint'), {
+            'title': 'No water in Block C hostel',
+            'description': "No water in Block C hostel since this morning, the taps are dry and the toilets can't flush!",
+            **extra,
+        })
+
+    def test_similar_submission_is_offered_to_follow(self):
+        response = self.submit()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['duplicates'], [self.existing])
+        self.assertEqual(Complaint.objects.count(), 1)
+
+    def test_unrelated_submission_is_created(self):
+        self.client.post(reverse('submit_complaint'), {
+            'title': 'Projector', 'description': 'The projector in lecture hall 3 is broken.'})
+        self.assertEqual(Complaint.objects.count(), 2)
+
+    def test_confirmed_submission_is_created_anyway(self):
+        self.assertRedirects(self.submit(confirm_new='1'), reverse('student_dashboard'))
+        self.assertEqual(Complaint.objects.count(), 2)
+
+    def test_following_grants_access(self):
+        response = self.client.post(reverse('follow_complaint', args=[self.existing.pk]))
+        self.assertRedirects(response, reverse('complaint_detail', args=[self.existing.pk]))
+        self.assertEqual(list(self.existing.followers.all()), [self.student])
+
+    def test_confidential_and_closed_complaints_are_not_offered(self):
+        for changes in ({'is_confidential': True}, {'status': 'RESV'}):
+            with self.subTest(**changes):
+                Complaint.objects.filter(pk=self.existing.pk).update(
+                    **{'is_confidential': False, 'status': 'PEND', **changes})
+                self.assertNotIn('duplicates', self.submit().context or {})
+                Complaint.objects.exclude(pk=self.existing.pk).delete()
+        self.assertEqual(self.client.post(reverse('follow_complaint', args=[self.existing.pk])).status_code, 404)
+
+    def test_buckets_follow_the_open_statuses(self):
+        buckets = self.existing.duplicate_buckets.count()
+        self.assertGreater(buckets, 0)
+        self.existing.status = 'RESV'
+        self.existing.save(update_fields=['status'])
+        self.assertFalse(self.existing.duplicate_buckets.exists())
+        self.existing.status = 'PROG'
+        self.existing.save()
+        self.assertEqual(self.existing.duplicate_buckets.count(), buckets)
+
+
+class SearchTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        student = Student.objects.create(
+            user=User.objects.create_user('student'), student_id='CSC/001', department=department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works', password='pass'), role='WD')
+        Staff.objects.create(user=User.objects.create_user('warden'), role='HW')
+
+        def create(title, description, category='INFRA'):
+            return Complaint.objects.create(student=student, title=title, description=description,
+                                            category=category, priority='MED')
+
+        self.leak = create('Roof leaking', 'Water drips onto the desks in room 4.')
+        self.window = create('Broken window', 'The window frame leaks when it rains.')
+        self.socket = create('Dead socket', 'No power in the lab sockets.')
+        # Assigned to the hall warden, so not visible to the works department
+        self.hostel = create('Leaking shower', 'The hostel shower leaks.', category='HOSTEL')
+        self.client.login(username='works', password='pass')
+
+    def search(self, query):
+        response = self.client.get(reverse('works_dashboard'), {'q': query})
+        return [row.id for row in response.context['page_obj']]
+
+    def test_ranked_results_within_visible_complaints(self):
+        self.assertEqual(self.search('leak'), [self.leak.pk, self.window.pk])
+
+    def test_public_comments_are_indexed(self):
+        comment = Comment.objects.create(complaint=self.socket, author=self.works,
+                                         content='Electrician found a leak in the conduit.')
+        self.assertIn(self.socket.pk, self.search('conduit'))
+        comment.is_internal = True
+        comment.save()
+        self.assertEqual(self.search('conduit'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        Complaint.objects.filter(pk=self.socket.pk).update(description='Sparks from the lab sockets.')
+        self.assertEqual(self.search('sparks'), [self.socket.pk])
+        self.socket.delete()
+        self.assertEqual(self.search('sparks'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('window" OR (roof'), [])
+        self.assertEqual(self.search('broken WINDOW'), [self.window.pk])
+
+
+@override_settings(**ANALYZER_SETTINGS)
+class StaffDirectoryTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.department = Department.objects.create(name='Computer Science', code='CSC')
+        self.works = Staff.objects.create(user=User.objects.create_user('works'), role='WD')
+        self.hod = Staff.objects.create(user=User.objects.create_user('hod'), role='HOD',
+                                        department=self.department)
+
+    def test_lookups_need_no_queries_once_built(self):
+        get_directory()
+        with self.assertNumQueries(0):
+            directory = get_directory()
+            self.assertEqual(directory.first('WD'), self.works.pk)
+            self.assertEqual(directory.first('HOD', self.department.pk), self.hod.pk)
+            self.assertIsNone(directory.first('VC'))
+
+    def test_staff_changes_invalidate(self):
+        get_directory()
+        warden = Staff.objects.create(user=User.objects.create_user('warden'), role='HW')
+        self.assertEqual(get_directory().first('HW'), warden.pk)
+        warden.delete()
+        self.assertIsNone(get_directory().first('HW'))
+
+    def test_first_staff_member_wins(self):
+        Staff.objects.create(user=User.objects.create_user('works2'), role='WD')
+        self.assertEqual(StaffDirectory.build().first('WD'), self.works.pk)
+
+    def test_routing_does_not_query_staff(self):
+        student = Student.objects.create(user=User.objects.create_user('student'), student_id='CSC/001',
+                                         department=self.department)
+        get_directory()
+        with CaptureQueriesContext(connection) as queries:
+            complaint = Complaint.objects.create(student=student, title='Exam', category='ACAD',
+                                                 priority='HIGH', description='The exam is tomorrow.')
+        self.assertFalse([query for query in queries if 'FROM "complaints_staff"' in query['sql']])
+        self.assertEqual(complaint.assigned_to, self.hod)
+
+
+class RoutingEngineTests(RoutingTestCase):
+    DIRECTORY = StaffDirectory({'WD': 1, 'HW': 2, 'SA': 3, 'VC': 4, 'REG': 5}, {('HOD', 7): 6})
+
+    def plan(self, **fields):
+        complaint = Complaint(student=Student(department_id=7), **fields)
+        with self.assertNumQueries(0):
+            return plan_route(complaint, self.DIRECTORY)
+
+    def test_dry_run(self):
+        decision = self.plan(category='INFRA', priority='HIGH', location='Hostel B, room 4')
+        self.assertEqual(decision.assignee_id, 1)
+        self.assertEqual(decision.tracker_ids, [4, 5, 2])
+
+        decision = self.plan(category='INFRA', priority='LOW', location_type='LAB')
+        self.assertEqual((decision.assignee_id, decision.tracker_ids), (1, [6]))
+        decision = self.plan(category='ACAD', priority='MED')
+        self.assertEqual((decision.assignee_id, decision.tracker_ids), (6, [6]))
+        decision = self.plan(category='OTHER', priority='CRIT')
+        self.assertEqual((decision.assignee_id, decision.tracker_ids), (None, [4, 5]))
+
+    def test_new_complaint_is_inserted_routed(self):
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        student = Student.objects.create(user=User.objects.create_user('student'), student_id='CSC/001',
+                                         department=department)
+        works = Staff.objects.create(user=User.objects.create_user('works'), role='WD')
+        vc = Staff.objects.create(user=User.objects.create_user('vc'), role='VC')
+        hod = Staff.objects.create(user=User.objects.create_user('hod'), role='HOD', department=department)
+        get_directory()
+
+        with CaptureQueriesContext(connection) as queries:
+            complaint = Complaint.objects.create(student=student, title='Projector', category='INFRA',
+                                                 priority='CRIT', location='Lecture hall 2',
+                                                 description='The projector caught fire.')
+        sql = [query['sql'] for query in queries]
+        self.assertFalse([statement for statement in sql if statement.startswith('UPDATE')])
+        self.assertEqual(len([statement for statement in sql
+                              if '"complaints_complaint_trackers"' in statement]), 1)
+
+        complaint.refresh_from_db()
+        self.assertEqual((complaint.assigned_to, complaint.status), (works, 'ASSG'))
+        self.assertEqual(set(complaint.trackers.all()), {vc, hod})
+
+
+class ComplaintViewerTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.department = Department.objects.create(name='Computer Science', code='CSC')
+        self.student = Student.objects.create(user=User.objects.create_user('student'),
+                                              student_id='CSC/001', department=self.department)
+        self.other = Student.objects.create(user=User.objects.create_user('other'),
+                                            student_id='CSC/002', department=self.department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works'), role='WD')
+        self.warden = Staff.objects.create(user=User.objects.create_user('warden'), role='HW')
+        self.hod = Staff.objects.create(user=User.objects.create_user('hod'), role='HOD',
+                                        department=self.department)
+        self.complaint = Complaint.objects.create(student=self.student, title='Leak', category='INFRA',
+                                                  priority='MED', location='Hostel A',
+                                                  description='The roof leaks.')
+
+    def viewers(self):
+        return set(self.complaint.viewers.values_list('user__username', 'reason'))
+
+    def test_new_complaint_rows(self):
+        self.assertEqual(self.viewers(), {
+            ('student', 'OWN'), ('works', 'ASSG'), ('warden', 'TRCK'), ('hod', 'DEPT')})
+        self.assertTrue(self.complaint.can_user_view(self.hod.user))
+        self.assertFalse(self.complaint.can_user_view(self.other.user))
+
+    def test_changes_keep_rows_in_sync(self):
+        self.complaint.followers.add(self.other)
+        self.complaint.trackers.remove(self.warden)
+        self.complaint.assigned_to = self.warden
+        self.complaint.save()
+        self.hod.department = None
+        self.hod.save()
+        self.assertEqual(self.viewers(), {('student', 'OWN'), ('other', 'FOLL'), ('warden', 'ASSG')})
+
+        rows = self.viewers()
+        call_command('rebuild_viewers', stdout=io.StringIO())
+        self.assertEqual(self.viewers(), rows)
+
+    def test_staff_dashboard_lists_visible_complaints(self):
+        other_department = Department.objects.create(name='Physics', code='PHY')
+        outsider = Student.objects.create(user=User.objects.create_user('outsider'),
+                                          student_id='PHY/001', department=other_department)
+        Complaint.objects.create(student=outsider, title='Exam', category='ACAD', priority='LOW',
+                                 description='The exam timetable clashes.')
+        self.hod.user.set_password('pass')
+        self.hod.user.save()
+        self.client.login(username='hod', password='pass')
+        response = self.client.get(reverse('staff_dashboard'))
+        self.assertEqual([row.id for row in response.context['page_obj']], [self.complaint.pk])
+
+
+class PriorityRankTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        self.student = Student.objects.create(user=User.objects.create_user('student'),
+                                              student_id='CSC/001', department=department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works', password='pass'), role='WD')
+
+    def create(self, priority):
+        return Complaint.objects.create(student=self.student, title=priority, category='INFRA',
+                                        priority=priority, description='Broken.')
+
+    def test_dashboard_lists_most_severe_first(self):
+        for priority in ['MED', 'CRIT', 'LOW', 'HIGH']:
+            self.create(priority)
+        self.client.login(username='works', password='pass')
+        response = self.client.get(reverse('works_dashboard'))
+        self.assertEqual([complaint.priority for complaint in response.context['page_obj']],
+                         ['CRIT', 'HIGH', 'MED', 'LOW'])
+
+    def test_rank_follows_priority_updates(self):
+        complaint = self.create('LOW')
+        complaint.priority = 'CRIT'
+        complaint.save(update_fields=['priority'])
+        complaint.refresh_from_db()
+        self.assertEqual(complaint.priority_rank, 4)
+
+    def test_assignee_queue_uses_index(self):
+        queue = Complaint.objects.filter(assigned_to=self.works, status='ASSG').order_by(
+            '-priority_rank', '-created_at')
+        plan = queue.explain()
+        self.assertIn('complaint_assignee_queue', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class CounterTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.department = Department.objects.create(name='Computer Science', code='CSC')
+        self.student = Student.objects.create(user=User.objects.create_user('student', password='pass'),
+                                              student_id='CSC/001', department=self.department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works'), role='WD')
+        self.warden = Staff.objects.create(user=User.objects.create_user('warden'), role='HW')
+        self.vc = Staff.objects.create(user=User.objects.create_user('vc'), role='VC')
+        self.hod = Staff.objects.create(user=User.objects.create_user('hod'), role='HOD',
+                                        department=self.department)
+
+    def create(self, **fields):
+        return Complaint.objects.create(**{
+            'student': self.student, 'title': 'Leak', 'description': 'The roof leaks.',
+            'category': 'INFRA', 'priority': 'MED', 'location': 'Hostel A', **fields})
+
+    def counters(self):
+        return set(ComplaintCounter.objects.filter(count__gt=0).values_list(
+            'scope', 'scope_id', 'status', 'priority', 'category', 'location_type', 'count'))
+
+    def assertCountersMatchSources(self):
+        maintained = self.counters()
+        rebuild_counters()
+        self.assertEqual(maintained, self.counters())
+
+    def test_triggers_track_every_change(self):
+        leak = self.create()
+        exam = self.create(title='Exam', category='ACAD', priority='HIGH', location='')
+        self.assertCountersMatchSources()
+
+        leak.status = 'PROG'
+        leak.save()
+        Complaint.objects.filter(pk=exam.pk).update(priority='CRIT', category='HOSTEL')
+        leak.trackers.add(self.vc)
+        leak.trackers.remove(self.warden)
+        exam.assigned_to = self.warden
+        exam.save()
+        self.hod.department = None
+        self.hod.save()
+        self.assertCountersMatchSources()
+
+        leak.delete()
+        self.assertCountersMatchSources()
+
+    def test_student_dashboard_reads_counters(self):
+        self.create()
+        Complaint.objects.filter(pk=self.create(priority='CRIT').pk).update(status='RESV')
+        self.client.login(username='student', password='pass')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student_dashboard'))
+        self.assertEqual(response.context['stats']['total_count'], 2)
+        self.assertEqual(response.context['stats']['critical_count'], 1)
+        self.assertEqual(response.context['stats']['resolved_count'], 1)
+        self.assertEqual(len([query for query in queries if 'complaintcounter' in query['sql']]), 1)
+
+    def test_staff_stats_count_each_complaint_once(self):
+        # The HOD is assignee, tracker and department head of an academic complaint
+        self.create(title='Exam', category='ACAD', priority='HIGH', location='')
+        tallies = get_tallies((ComplaintCounter.VISIBLE, self.hod.user_id),
+                              (ComplaintCounter.TRACKER, self.hod.pk))
+        self.assertEqual(tallies[(ComplaintCounter.VISIBLE, self.hod.user_id)].count(category='ACAD'), 1)
+        self.assertEqual(tallies[(ComplaintCounter.TRACKER, self.hod.pk)].count(priority='HIGH'), 1)
+
+
+class CursorPaginationTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        student = Student.objects.create(user=User.objects.create_user('student'),
+                                         student_id='CSC/001', department=department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works', password='pass'), role='WD')
+        priorities = ['LOW', 'MED', 'HIGH', 'CRIT']
+        for number in range(23):
+            Complaint.objects.create(student=student, title=f'Leak {number}', category='INFRA',
+                                     priority=priorities[number % 4], description='Water leaks.')
+        self.client.login(username='works', password='pass')
+
+    def page(self, **params):
+        response = self.client.get(reverse('works_dashboard'), params)
+        return response.context['page_obj']
+
+    def ids(self, **params):
+        return [row.id for row in self.page(**params)]
+
+    def test_walks_forwards_and_back(self):
+        expected = list(Complaint.objects.order_by('-priority_rank', '-created_at', '-id').values_list('id', flat=True))
+        pages = [self.page()]
+        while pages[-1].has_next():
+            pages.append(self.page(cursor=pages[-1].next_token))
+        self.assertEqual([len(page) for page in pages], [10, 10, 3])
+        self.assertEqual([row.id for page in pages for row in page], expected)
+        self.assertEqual(pages[0].approximate_total, 23)
+
+        back = self.page(cursor=pages[2].previous_token)
+        self.assertEqual([row.id for row in back], [row.id for row in pages[1]])
+        self.assertEqual(self.ids(cursor=back.previous_token), [row.id for row in pages[0]])
+        self.assertFalse(self.page(cursor=back.previous_token).has_previous())
+
+    def test_deep_pages_need_no_count_or_offset(self):
+        token = self.page().next_token
+        with CaptureQueriesContext(connection) as queries:
+            self.page(cursor=token)
+        listing = [query['sql'] for query in queries if 'FROM "complaints_complaint"' in query['sql']]
+        self.assertTrue(listing)
+        self.assertFalse([sql for sql in listing if 'OFFSET' in sql or 'COUNT(' in sql])
+
+    def test_token_keeps_filters(self):
+        self.assertEqual(self.page(priority='CRIT').approximate_total, 5)
+        first = self.page(status='ASSG')
+        self.assertEqual(first.query, 'status=ASSG')
+        self.assertEqual(len(self.page(status='ASSG', cursor=first.next_token)), 10)
+        # A token is only honoured with the filters it was issued for
+        self.assertEqual(self.ids(cursor=first.next_token), self.ids())
+        self.assertEqual(self.ids(cursor='forged'), self.ids())
+
+
+class DashboardRowTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        self.student = Student.objects.create(user=User.objects.create_user('student', password='pass'),
+                                              student_id='CSC/001', department=department)
+        self.hod = Staff.objects.create(user=User.objects.create_user('hod', password='pass', first_name='Ada',
+                                                                      last_name='Obi'),
+                                        role='HOD', department=department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works', password='pass'), role='WD')
+
+    def create(self, count):
+        for number in range(count):
+            infra = Complaint.objects.create(student=self.student, title=f'Leak {number}', category='INFRA',
+                                             priority='HIGH', description='Water leaks.')
+            exam = Complaint.objects.create(student=self.student, title=f'Exam {number}', category='ACAD',
+                                            description='Results are missing.')
+            Comment.objects.create(complaint=infra, author=self.works, content='Plumber booked.')
+            Comment.objects.create(complaint=exam, author=self.hod, content='Checking.')
+            Comment.objects.create(complaint=exam, author=self.hod, content='Staff notes.', is_internal=True)
+
+    def queries(self, username, view):
+        self.client.login(username=username, password='pass')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(view))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.context['page_obj']
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.create(1)
+        few = {view: self.queries(username, view)[0] for username, view in [
+            ('student', 'student_dashboard'), ('hod', 'staff_dashboard'), ('works', 'works_dashboard')]}
+        self.create(6)
+        for username, view in [('student', 'student_dashboard'), ('hod', 'staff_dashboard'),
+                               ('works', 'works_dashboard')]:
+            count, page = self.queries(username, view)
+            self.assertGreater(len(page), 2)
+            self.assertEqual(count, few[view], view)
+
+    def test_rows_carry_what_the_templates_show(self):
+        self.create(1)
+        _, page = self.queries('student', 'student_dashboard')
+        exam = next(row for row in page if row.category == 'ACAD')
+        self.assertEqual(exam.latest_comment.content, 'Checking.')
+        self.assertEqual(exam.latest_comment.author_name, 'Ada Obi')
+        self.assertEqual(exam.category_display, 'Academic')
+
+        _, page = self.queries('hod', 'staff_dashboard')
+        exam = next(row for row in page if row.category == 'ACAD')
+        self.assertEqual((exam.is_assigned_to_me, exam.is_tracked_by_me), (True, True))
+        self.assertEqual((exam.student_number, exam.department_name), ('CSC/001', 'Computer Science'))
+
+
+class RollupTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.department = Department.objects.create(name='Computer Science', code='CSC')
+        self.student = Student.objects.create(user=User.objects.create_user('student'),
+                                              student_id='CSC/001', department=self.department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works', password='pass'), role='WD')
+        Staff.objects.create(user=User.objects.create_user('warden'), role='HW')
+
+    def create(self, **fields):
+        return Complaint.objects.create(**{
+            'student': self.student, 'title': 'Leak', 'description': 'The roof leaks.',
+            'category': 'INFRA', 'priority': 'MED', **fields})
+
+    def test_days_are_local(self):
+        # 00:30 on March 1st in Lagos is still February in UTC
+        just_after_midnight = timezone.make_aware(datetime.datetime(2026, 3, 1, 0, 30))
+        leak = self.create()
+        Complaint.objects.filter(pk=leak.pk).update(created_at=just_after_midnight)
+        march = datetime.date(2026, 3, 1)
+
+        self.assertEqual([(row.day, row.count) for row in get_rollups() if row.count], [(march, 1)])
+        self.assertEqual(reconcile_rollups(), 0)
+        self.assertEqual(summarize(get_rollups(march, march))['complaints_by_month'], [{'month': march, 'count': 1}])
+        cube = ComplaintCube.build()
+        self.assertEqual(int(cube.mask(march, march).sum()), 1)
+        self.assertEqual(cube.summary(cube.mask())['complaints_by_month'], [{'month': march, 'count': 1}])
+
+    def test_triggers_keep_rollups_reconciled(self):
+        leak = self.create()
+        exam = self.create(title='Exam', category='ACAD', priority='HIGH')
+        self.assertEqual(reconcile_rollups(), 0)
+
+        leak.status = 'RESV'
+        leak.save()
+        leak.save()
+        Complaint.objects.filter(pk=exam.pk).update(priority='CRIT', sentiment_score=-0.5)
+        self.create(category='HOSTEL').delete()
+        self.assertEqual(reconcile_rollups(), 0)
+
+        # A department change is not tracked until the nightly reconcile
+        self.student.department = Department.objects.create(name='Physics', code='PHY')
+        self.student.save()
+        # Each of the two remaining complaints leaves one row and needs another
+        self.assertEqual(reconcile_rollups(), 4)
+        self.assertEqual(reconcile_rollups(), 0)
+
+    def test_dashboard_reads_rollups_for_the_range(self):
+        self.create()
+        resolved = self.create(priority='HIGH')
+        Complaint.objects.filter(pk=resolved.pk).update(status='RESV', resolved_at=timezone.now())
+        Complaint.objects.filter(pk=self.create(category='HOSTEL').pk).update(
+            created_at=datetime.datetime(2020, 1, 15, tzinfo=datetime.timezone.utc))
+
+        self.client.login(username='works', password='pass')
+        reset_cube()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('analytics_dashboard'), {'start': '2021-01-01'})
+        # Neither the complaint table nor the cube are read without a drill-down
+        self.assertFalse([query for query in queries if 'FROM "complaints_complaint"' in query['sql']])
+        self.assertIsNone(cube_module._cube)
+        self.assertEqual(response.context['category_by_status']['rows'], [('INFRA', [1, 1])])
+        self.assertEqual(response.context['total_complaints'], 2)
+        self.assertEqual(response.context['complaints_by_status'], [
+            {'status': 'ASSG', 'count': 1}, {'status': 'RESV', 'count': 1}])
+        self.assertEqual(response.context['complaints_by_department'], [{'name': 'Computer Science', 'count': 2}])
+        self.assertEqual([staff.resolved_count for staff in response.context['top_resolvers']], [1])
+        self.assertIsNotNone(response.context['avg_resolution_time'])
+
+        everything = summarize(get_rollups())
+        self.assertEqual(everything['total_complaints'], 3)
+        self.assertEqual(everything['complaints_by_month'][0]['month'], datetime.date(2020, 1, 1))
+
+
+class ComplaintCubeTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.science = Department.objects.create(name='Computer Science', code='CSC')
+        self.physics = Department.objects.create(name='Physics', code='PHY')
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f'student{number}'),
+                                   student_id=f'S/{number}', department=department)
+            for number, department in enumerate([self.science, self.physics])
+        ]
+        Staff.objects.create(user=User.objects.create_user('works'), role='WD')
+        Staff.objects.create(user=User.objects.create_user('warden'), role='HW')
+        self.staff = Staff.objects.create(user=User.objects.create_user('vc', password='pass'), role='VC')
+        categories = ['INFRA', 'HOSTEL', 'ACAD']
+        locations = ['LAB', 'HOSTEL', '']
+        for number in range(12):
+            Complaint.objects.create(
+                student=self.students[number % 2], title=f'Complaint {number}', description='Details.',
+                category=categories[number % 3], priority='MED', location_type=locations[number % 3],
+                sentiment_score=number / 12 - 0.5)
+        Complaint.objects.filter(title__in=['Complaint 0', 'Complaint 4']).update(status='RESV', resolved_at=timezone.now())
+
+    def test_slices_match_the_database(self):
+        cube = ComplaintCube.build()
+        for filters, queryset in [
+            ({}, Complaint.objects.all()),
+            ({'department': self.physics.pk}, Complaint.objects.filter(student__department=self.physics)),
+            ({'category': 'INFRA', 'status': 'RESV'}, Complaint.objects.filter(category='INFRA', status='RESV')),
+            ({'location_type': 'HOSTEL', 'department': self.science.pk},
+             Complaint.objects.filter(location_type='HOSTEL', student__department=self.science)),
+            ({'category': 'UNKNOWN'}, Complaint.objects.none()),
+        ]:
+            self.assertEqual(int(cube.mask(**filters).sum()), queryset.count(), filters)
+
+        everything = cube.mask()
+        from_cube, from_rollups = cube.summary(everything), summarize(get_rollups())
+        for figure in ('total_complaints', 'complaints_by_status', 'complaints_by_category',
+                       'complaints_by_priority', 'complaints_by_month', 'complaints_by_department', 'top_resolvers'):
+            self.assertEqual(from_cube[figure], from_rollups[figure], figure)
+        self.assertAlmostEqual(from_cube['sentiment_stats']['avg_sentiment'],
+                               from_rollups['sentiment_stats']['avg_sentiment'], places=5)
+        self.assertEqual(cube.crosstab(everything, 'category', 'status')['INFRA'], {'ASSG': 3, 'RESV': 1})
+        self.assertEqual(sum(cube.sentiment_histogram(everything)[1]), 12)
+        self.assertEqual(set(cube.resolution_percentiles(everything)), {50, 90, 95})
+        self.assertEqual(cube.resolution_percentiles(cube.mask(category='ACAD')), {})
+
+    def test_refresh_reads_saved_and_deleted_complaints(self):
+        cube = ComplaintCube.build()
+        Complaint.objects.get(title='Complaint 1').delete()
+        changed = Complaint.objects.get(title='Complaint 2')
+        changed.status = 'PROG'
+        changed.save()
+        Complaint.objects.create(student=self.students[0], title='New', description='Details.',
+                                 category='SAFETY', priority='LOW')
+        cube.refresh()
+        self.assertEqual(len(cube), 12)
+        self.assertEqual(int(cube.mask(status='PROG').sum()), 1)
+        self.assertEqual(int(cube.mask(category='SAFETY').sum()), 1)
+
+    def test_refresh_reconciles_ids_when_the_count_is_unchanged(self):
+        cube = ComplaintCube.build()
+        Complaint.objects.get(title='Complaint 1').delete()
+        # Committed late, with an updated_at the cube has already gone past
+        late = Complaint.objects.create(student=self.students[0], title='Late', description='Details.',
+                                        category='SAFETY', priority='LOW')
+        Complaint.objects.filter(pk=late.pk).update(updated_at=cube.watermark - datetime.timedelta(minutes=1))
+        cube.refresh()
+        self.assertEqual(sorted(cube.ids.tolist()), sorted(Complaint.objects.values_list('id', flat=True)))
+        self.assertEqual(int(cube.mask(category='SAFETY').sum()), 1)
+
+    def test_dashboard_drill_down(self):
+        reset_cube()
+        self.client.login(username='vc', password='pass')
+        response = self.client.get(reverse('analytics_dashboard'),
+                                   {'department': self.science.pk, 'category': 'INFRA'})
+        self.assertEqual(response.context['total_complaints'],
+                         Complaint.objects.filter(student__department=self.science, category='INFRA').count())
+        self.assertEqual(response.context['complaints_by_department'],
+                         [{'name': 'Computer Science', 'count': response.context['total_complaints']}])
+
+
+class ExportTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        student = Student.objects.create(user=User.objects.create_user('student'),
+                                         student_id='CSC/001', department=department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works', password='pass'), role='WD')
+        Staff.objects.create(user=User.objects.create_user('warden'), role='HW')
+        Staff.objects.create(user=User.objects.create_user('registrar', password='pass'), role='REG')
+        self.leak = Complaint.objects.create(student=student, title='Leak', description='The roof leaks, badly.',
+                                             category='INFRA', priority='HIGH')
+        self.shower = Complaint.objects.create(student=student, title='Shower', description='No hot water.',
+                                               category='HOSTEL', priority='LOW')
+        Comment.objects.create(complaint=self.leak, author=self.works, content='Plumber booked.')
+        Comment.objects.create(complaint=self.leak, author=self.works, content='Fixed.')
+
+    def download(self, username, **params):
+        self.client.login(username=username, password='pass')
+        response = self.client.get(reverse('export_complaints'), params)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+        if params.get('compress') != '0':
+            self.assertEqual(response['Content-Type'], 'application/gzip')
+            content = gzip.decompress(content)
+        return content.decode()
+
+    def test_csv_follows_filters(self):
+        rows = list(csv.DictReader(io.StringIO(self.download('registrar'))))
+        self.assertEqual([row['title'] for row in rows], ['Leak', 'Shower'])
+        self.assertEqual(rows[0]['description'], 'The roof leaks, badly.')
+        rows = list(csv.DictReader(io.StringIO(self.download('registrar', category='HOSTEL', compress='0'))))
+        self.assertEqual([row['title'] for row in rows], ['Shower'])
+
+    def test_jsonl_carries_comment_threads(self):
+        records = [json.loads(line) for line in self.download('registrar', format='jsonl').splitlines()]
+        self.assertEqual([comment['content'] for comment in records[0]['comments']], ['Plumber booked.', 'Fixed.'])
+        self.assertEqual(records[1]['comments'], [])
+        comments = list(csv.DictReader(io.StringIO(self.download('registrar', kind='comments'))))
+        self.assertEqual([row['author_username'] for row in comments], ['works', 'works'])
+
+    def test_staff_export_what_they_can_view(self):
+        rows = list(csv.DictReader(io.StringIO(self.download('works'))))
+        self.assertEqual([row['title'] for row in rows], ['Leak'])
+
+    def test_command_writes_gzip_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'complaints.jsonl.gz'
+            call_command('export_complaints', format='jsonl', gzip=True, output=str(path),
+                         chunk_size=1, status='ASSG', stdout=io.StringIO())
+            records = [json.loads(line) for line in gzip.decompress(path.read_bytes()).splitlines()]
+        self.assertEqual([record['title'] for record in records], ['Leak', 'Shower'])
+        self.assertEqual(len(records[0]['comments']), 2)
+
+
+class ComplaintEventTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        self.student = Student.objects.create(user=User.objects.create_user('student', password='pass'),
+                                              student_id='CSC/001', department=department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works', password='pass'), role='WD')
+        Staff.objects.create(user=User.objects.create_user('warden'), role='HW')
+
+    def create(self, **fields):
+        return Complaint.objects.create(**{
+            'student': self.student, 'title': 'Leak', 'description': 'The roof leaks.',
+            'category': 'INFRA', 'priority': 'MED', **fields})
+
+    def kinds(self, complaint):
+        return list(complaint.events.values_list('kind', 'from_status', 'to_status'))
+
+    def test_changes_are_recorded(self):
+        leak = self.create()
+        self.assertEqual(self.kinds(leak), [('CRTD', '', 'ASSG'), ('ASSG', '', '')])
+        self.assertIsNotNone(leak.assigned_at)
+
+        leak = Complaint.objects.get(pk=leak.pk)
+        leak.priority = 'HIGH'
+        leak.save()
+        leak.status = 'PROG'
+        leak.save(actor=self.works.user)
+        leak.status = 'RESV'
+        leak.save(update_fields=['status'])
+        Comment.objects.create(complaint=leak, author=self.works, content='Fixed.', is_internal=True)
+
+        self.assertEqual(self.kinds(leak)[2:], [('STAT', 'ASSG', 'PROG'), ('RESV', 'PROG', 'RESV'), ('CMNT', '', '')])
+        self.assertEqual(leak.events.get(kind='STAT').actor, self.works.user)
+        self.assertEqual(Complaint.objects.get(pk=leak.pk).resolved_at, leak.resolved_at)
+        self.assertEqual(reconcile_rollups(), 0)
+        self.assertIsNotNone(summarize(get_rollups())['avg_assignment_time'])
+
+    def test_tracking_view_reads_the_timeline_in_one_query(self):
+        leak = self.create()
+        self.client.login(username='works', password='pass')
+        self.client.post(reverse('complaint_detail', args=[leak.pk]), {'status': 'PROG'})
+        Comment.objects.create(complaint=leak, author=self.works, content='On it.')
+        Comment.objects.create(complaint=leak, author=self.works, content='Internal.', is_internal=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('complaint_tracking', args=[leak.pk]))
+        self.assertEqual(len([query for query in queries if 'complaints_complaintevent' in query['sql']]), 1)
+        self.assertEqual([event.describe() for event in response.context['updates']], [
+            'Submitted', 'Assigned to Works Department', 'Status changed from Assigned to In Progress', 'On it.'])
+        self.assertFalse(leak.comments.filter(content__startswith='Status changed').exists())
+
+    def test_escalation_is_shown_on_the_detail_page(self):
+        leak = self.create()
+        self.client.login(username='student', password='pass')
+        self.client.post(reverse('complaint_detail', args=[leak.pk]), {
+            'student_action': 'escalate', 'escalation_reason': 'no_response',
+            'escalation_details': 'Nobody has replied in two weeks.'})
+        self.assertEqual(leak.events.get(kind='ESCL').actor, self.student.user)
+
+        response = self.client.get(reverse('complaint_detail', args=[leak.pk]))
+        self.assertContains(response, 'No response from assigned staff')
+        self.assertContains(response, 'Nobody has replied in two weeks.')
+
+    def test_status_changes_are_shown_on_the_detail_page(self):
+        leak = self.create()
+        self.client.login(username='works', password='pass')
+        self.client.post(reverse('complaint_detail', args=[leak.pk]), {'status': 'PROG'})
+        response = self.client.get(reverse('complaint_detail', args=[leak.pk]))
+        self.assertContains(response, 'Status changed from Assigned to In Progress')
+
+    def test_backfill_parses_comments(self):
+        leak = self.create()
+        Complaint.objects.filter(pk=leak.pk).update(status='RESV', assigned_at=None)
+        for content in ['Status changed from In Progress to In Progress', 'Looking into it.',
+                        'Status changed from Resolved to Resolved']:
+            Comment.objects.create(complaint=leak, author=self.works, content=content)
+        # As before the timeline existed
+        ComplaintEvent.objects.all().delete()
+
+        call_command('backfill_events', stdout=io.StringIO())
+        self.assertEqual(self.kinds(leak), [
+            ('CRTD', '', ''), ('ASSG', '', ''), ('STAT', '', 'PROG'), ('CMNT', '', ''), ('RESV', 'PROG', 'RESV')])
+        leak.refresh_from_db()
+        self.assertEqual(leak.resolved_at, leak.events.get(kind='RESV').created_at)
+        self.assertEqual(leak.assigned_at, leak.created_at)
+        self.assertEqual(reconcile_rollups(), 0)
+
+        call_command('backfill_events', stdout=io.StringIO())
+        self.assertEqual(leak.events.count(), 5)
+
+
+class NotificationTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        self.student = Student.objects.create(user=User.objects.create_user('student'),
+                                              student_id='CSC/001', department=department)
+        self.works = Staff.objects.create(user=User.objects.create_user('works', password='pass'), role='WD')
+        self.warden = Staff.objects.create(user=User.objects.create_user('warden'), role='HW')
+        self.bystander = Staff.objects.create(user=User.objects.create_user('registrar'), role='REG')
+        self.leak = Complaint.objects.create(student=self.student, title='Leak', description='The roof leaks.',
+                                             category='INFRA', priority='MED')
+        self.leak.trackers.add(self.warden)
+        self.layer = get_channel_layer()
+        self.channels = {}
+        for user in User.objects.all():
+            self.channels[user.pk] = async_to_sync(self.layer.new_channel)()
+            async_to_sync(self.layer.group_add)(f'user_{user.pk}', self.channels[user.pk])
+
+    def tearDown(self):
+        async_to_sync(self.layer.flush)()
+
+    async def drain(self, channel):
+        events = []
+        while True:
+            try:
+                events.append(await asyncio.wait_for(self.layer.receive(channel), 0.05))
+            except asyncio.TimeoutError:
+                return events
+
+    def received(self):
+        """Usernames with a pending notification, and the messages"""
+        users, messages = set(), set()
+        for user in User.objects.all():
+            for event in async_to_sync(self.drain)(self.channels[user.pk]):
+                users.add(user.username)
+                messages.add(event['message'])
+        return users, messages
+
+    def test_sent_to_student_assignee_and_trackers_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            notify(self.leak, 'Status updated')
+        self.assertEqual(self.received(), (set(), set()))
+
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        self.assertEqual(self.received(), ({'student', 'works', 'warden'}, {'Status updated'}))
+
+    def test_views_notify(self):
+        self.client.login(username='works', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('complaint_detail', args=[self.leak.pk]), {'status': 'PROG'})
+        self.assertEqual(self.received(), ({'student', 'works', 'warden'}, {'Status updated to In Progress'}))
+
+
+@override_settings(**ANALYZER_SETTINGS)
+class ReanalyzeCommandTests(RoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Computer Science', code='CSC')
+        student = Student.objects.create(
+            user=User.objects.create_user('student'), student_id='CSC/001', department=department)
+        # Created with a stale classification and no staff to route to
+        self.complaints = [
+            Complaint.objects.create(student=student, title='Leak', category='ACAD', priority='LOW',
+                                     description='Water is leaking from the ceiling.'),
+            Complaint.objects.create(student=student, title='Exam', category='ACAD', priority='LOW',
+                                     description='The exam is tomorrow and nobody told us.'),
+        ]
+        Staff.objects.create(user=User.objects.create_user('works'), role='WD')
+
+    def test_dry_run_reports_without_writing(self):
+        out = io.StringIO()
+        call_command('reanalyze', '--dry-run', stdout=out)
+        self.assertIn('would change for 2', out.getvalue())
+        self.assertEqual(Complaint.objects.get(pk=self.complaints[0].pk).category, 'ACAD')
+
+    def test_updates_analysis_without_rerouting(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Path(directory) / 'reanalyze.json'
+            call_command('reanalyze', '--batch-size', '1', '--checkpoint', str(checkpoint),
+                         stdout=io.StringIO())
+            self.assertIn(str(self.complaints[1].pk), checkpoint.read_text())
+
+        leak, exam = Complaint.objects.order_by('pk')
+        self.assertEqual(leak.category, 'INFRA')
+        self.assertIsNone(leak.assigned_to)
+        self.assertEqual((exam.category, exam.priority), ('ACAD', 'CRIT'))
@@ -23,5 +23,8 @@ urlpatterns = [
     path('register/staff/', views.register_staff_view, name='register_staff'),   
     path('works/', views.works_dashboard, name='works_dashboard'),
     path('complaint/<int:complaint_id>/track/', views.complaint_tracking_view, name='complaint_tracking'),
+    path('complaint/<int:complaint_id>/status/', views.complaint_status, name='complaint_status'),
+    path('complaint/<int:complaint_id>/follow/', views.follow_complaint, name='follow_complaint'),
     path('analytics/', views.analytics_dashboard, name='analytics_dashboard'),
+    path('export/', views.export_complaints, name='export_complaints'),
 ]
\ No newline at end of file
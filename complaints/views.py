@@ -1,16 +1,29 @@
 # views.py
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib import messages
+from django.conf import settings
 from django.db.models import Q
-from django.core.paginator import Paginator
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from asgiref.sync import sync_to_async
 
-from .models import Complaint, Comment, Staff, Student, Department
+from .models import Complaint, ComplaintCounter, ComplaintEvent, ComplaintViewer, Comment, Staff, Student, Department
 from .forms import ComplaintForm, CommentForm, StatusUpdateForm
 from analysis.sentiment import ComplaintAnalyzer
+from .tasks import apply_analysis, schedule_analysis
+from .duplicates import find_duplicates, followable
+from .search import search_complaints
+from .directory import get_directory
+from .assignment import add_trackers
+from .access import visible_to
+from .counters import counter_filters, get_tallies
+from .rows import complaint_rows
+from .rollups import crosstab, get_rollups, summarize
+from .cube import get_cube
+from . import events, export, notifications
+from .export import parse_day
+from .pagination import KeysetPaginator, OffsetPaginator
 from .forms import StudentRegistrationForm, StaffRegistrationForm
 
 from django.contrib.auth import authenticate, login, logout
@@ -48,7 +61,7 @@ def student_dashboard(request):
         messages.error(request, "You need a student account to access this page")
         return redirect('login')
     
-    complaints = Complaint.objects.filter(student=student).order_by('-created_at')
+    complaints = Complaint.objects.filter(student=student)
     
     # Apply filters
     status_filter = request.GET.get('status')
@@ -68,20 +81,25 @@ def student_dashboard(request):
     if category_filter:
         complaints = complaints.filter(category=category_filter)
     
-    # Pagination
-    paginator = Paginator(complaints, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Statistics for dashboard
+    # Statistics for dashboard, from the maintained counters
+    tally = get_tallies((ComplaintCounter.STUDENT, student.pk))[(ComplaintCounter.STUDENT, student.pk)]
     stats = {
-        'total_count': Complaint.objects.filter(student=student).count(),
-        'pending_count': Complaint.objects.filter(student=student, status='PEND').count(),
-        'in_progress_count': Complaint.objects.filter(student=student, status__in=['REVW', 'ASSG', 'PROG']).count(),
-        'resolved_count': Complaint.objects.filter(student=student, status='RESV').count(),
-        'closed_count': Complaint.objects.filter(student=student, status='CLSD').count(),
-        'critical_count': Complaint.objects.filter(student=student, priority='CRIT').count(),
+        'total_count': tally.count(),
+        'pending_count': tally.count(status='PEND'),
+        'in_progress_count': tally.count(status=['REVW', 'ASSG', 'PROG']),
+        'resolved_count': tally.count(status='RESV'),
+        'closed_count': tally.count(status='CLSD'),
+        'critical_count': tally.count(priority='CRIT'),
     }
+
+    # Cursor pagination, newest first
+    filters = {'status': status_filter, 'priority': priority_filter, 'category': category_filter}
+    page_obj = KeysetPaginator(
+        complaints.only('id', 'created_at'), ['-created_at', '-id'], 10, filters,
+        approximate_total=tally.count(**counter_filters(filters)),
+    ).get_page(request.GET.get('cursor'))
+    # Everything the cards show, read for the whole page at once
+    page_obj.object_list = complaint_rows(page_obj, with_comments=True)
     
     # Add filter context for template highlighting
     current_filters = {
@@ -111,36 +129,38 @@ def submit_complaint(request):
         if form.is_valid():
             complaint = form.save(commit=False)
             complaint.student = student
-            
-            # Analyze complaint text
+
+            # Offer to follow a matching open complaint before creating a new one
+            if not request.POST.get('confirm_new'):
+                duplicates = find_duplicates(complaint.title, complaint.description, student)
+                if duplicates:
+                    return render(request, 'submit_complaint.html', {
+                        'form': form,
+                        'duplicates': duplicates,
+                    })
+
             analyzer = ComplaintAnalyzer()
+
+            if settings.ANALYSIS_ASYNC_SUBMIT:
+                # Save straight away with a provisional classification; the
+                # full analysis, assignment and tracking run in the analysis pool
+                apply_analysis(complaint, analyzer.quick_analyze(complaint.description, complaint.title))
+                complaint.analysis_pending = True
+                complaint.save(actor=request.user)
+                schedule_analysis(complaint)
+
+                messages.success(request,
+                    "Complaint submitted successfully! "
+                    "It is being classified and will be assigned shortly."
+                )
+                return redirect('student_dashboard')
+
+            # Analyze complaint text
             analysis = analyzer.analyze(complaint.description, complaint.title)
-            
-            complaint.category = analysis['category']
-            complaint.priority = analysis['priority']
-            complaint.sentiment_score = analysis['sentiment_score']
-            
-            # Enhanced priority logic for academic complaints
-            if complaint.category == 'ACAD':
-                # Check for exam-related urgency keywords
-                urgency_keywords = ['exam', 'test', 'weeks', 'days', 'assessment', 'evaluation']
-                complaint_text = (complaint.title + ' ' + complaint.description).lower()
-                
-                if any(keyword in complaint_text for keyword in urgency_keywords):
-                    # Extract time mentions and assess urgency
-                    if any(phrase in complaint_text for phrase in ['3 weeks', 'two weeks', '2 weeks', 'few weeks']):
-                        complaint.priority = 'HIGH'
-                    elif any(phrase in complaint_text for phrase in ['week', 'days', 'soon']):
-                        complaint.priority = 'CRIT'
-                    elif complaint.priority == 'LOW':
-                        complaint.priority = 'MED'
-            
-            # Save complaint first to get an ID
-            complaint.save()
-            
-            # Enhanced assignment and tracking logic
-            assign_complaint_to_department(complaint)
-            setup_complaint_tracking(complaint)
+            apply_analysis(complaint, analysis)
+
+            # Saving routes the complaint (assignee and trackers)
+            complaint.save(actor=request.user)
             
             messages.success(request, 
                 f"Complaint submitted successfully! "
@@ -153,104 +173,28 @@ def submit_complaint(request):
     
     return render(request, 'submit_complaint.html', {'form': form})
 
-def assign_complaint_to_department(complaint):
-    """Enhanced assignment logic based on category and context"""
-    assigned_staff = None
-    
-    # Infrastructure complaints
-    if complaint.category == 'INFRA':
-        # All infrastructure issues go to Works Department
-        assigned_staff = Staff.objects.filter(role='WD').first()
-        
-    # Hostel complaints
-    elif complaint.category == 'HOSTEL':
-        # All hostel issues go to Hall Warden
-        assigned_staff = Staff.objects.filter(role='HW').first()
-        
-    # Safety complaints
-    elif complaint.category == 'SAFETY':
-        # Safety issues go to Student Affairs
-        assigned_staff = Staff.objects.filter(role='SA').first()
-        
-    # Harassment complaints
-    elif complaint.category == 'HARASS':
-        # Harassment issues go to Student Affairs
-        assigned_staff = Staff.objects.filter(role='SA').first()
-        
-    # Academic complaints
-    elif complaint.category == 'ACAD':
-        # Academic issues go to student's HOD
-        assigned_staff = Staff.objects.filter(
-            role='HOD', 
-            department=complaint.student.department
-        ).first()
-    
-    if assigned_staff:
-        complaint.assigned_to = assigned_staff
-        complaint.status = 'ASSG'
-        complaint.save(update_fields=['assigned_to', 'status'])
-
-def setup_complaint_tracking(complaint):
-    """Enhanced tracking logic based on complaint type and priority"""
-    trackers_to_add = []
-    
-    # Critical and High priority complaints are always tracked by VC and Registrar
-    if complaint.priority in ['HIGH', 'CRIT']:
-        vc = Staff.objects.filter(role='VC').first()
-        reg = Staff.objects.filter(role='REG').first()
-        if vc:
-            trackers_to_add.append(vc)
-        if reg:
-            trackers_to_add.append(reg)
-    
-    # Special tracking rules based on category and location
-    
-    # Infrastructure complaints in hostel - Hall Warden tracks (Works Dept handles)
-    if complaint.category == 'INFRA' and (
-        complaint.location_type == 'HOSTEL' or 
-        (complaint.location and 'hostel' in complaint.location.lower())
-    ):
-        hw = Staff.objects.filter(role='HW').first()
-        if hw and hw not in trackers_to_add:
-            trackers_to_add.append(hw)
-    
-    # Infrastructure complaints in lecture rooms/labs - Student's HOD tracks
-    elif complaint.category == 'INFRA' and (
-        complaint.location_type in ['LECTURE', 'LAB'] or
-        (complaint.location and any(term in complaint.location.lower() 
-                                 for term in ['lecture', 'classroom', 'lab', 'laboratory']))
-    ):
-        hod = Staff.objects.filter(
-            role='HOD', 
-            department=complaint.student.department
-        ).first()
-        if hod and hod not in trackers_to_add:
-            trackers_to_add.append(hod)
-    
-    # Harassment/Safety complaints - Student's HOD tracks (Student Affairs handles)
-    elif complaint.category in ['HARASS', 'SAFETY']:
-        hod = Staff.objects.filter(
-            role='HOD', 
-            department=complaint.student.department
-        ).first()
-        if hod and hod not in trackers_to_add:
-            trackers_to_add.append(hod)
-    
-    # Hostel complaints - Student's HOD also tracks (Hall Warden handles)
-    elif complaint.category == 'HOSTEL':
-        hod = Staff.objects.filter(
-            role='HOD', 
-            department=complaint.student.department
-        ).first()
-        if hod and hod not in trackers_to_add:
-            trackers_to_add.append(hod)
-    
-    # Academic complaints - Only student's HOD handles (no additional trackers needed)
-    # The HOD is already assigned as the handler
-    
-    # Add all trackers
-    for tracker in trackers_to_add:
-        complaint.trackers.add(tracker)
+@login_required
+def follow_complaint(request, complaint_id):
+    """Attach the student to an existing complaint instead of submitting a duplicate"""
+    try:
+        student = request.user.student
+    except:
+        messages.error(request, "You need a student account to follow complaints")
+        return redirect('login')
+
+    if request.method != 'POST':
+        return redirect('submit_complaint')
+
+    complaint = get_object_or_404(followable(Complaint.objects.all()), id=complaint_id)
+    if complaint.student == student:
+        return redirect('complaint_detail', complaint_id=complaint.id)
+
+    complaint.followers.add(student)
+    messages.success(request,
+        f"You are now following complaint #{complaint.id}. "
+        f"You will see its progress on the complaint page."
+    )
+    return redirect('complaint_detail', complaint_id=complaint.id)
 
 @login_required
 def complaint_detail(request, complaint_id):
@@ -267,7 +211,7 @@ def complaint_detail(request, complaint_id):
     is_staff = hasattr(user, 'staff')
     is_student = hasattr(user, 'student')
     is_assigned_staff = is_staff and user.staff == complaint.assigned_to
-    is_tracker = is_staff and user.staff in complaint.trackers.all()
+    is_tracker = is_staff and complaint.viewers.filter(user=user, reason=ComplaintViewer.TRACKER).exists()
     is_hod = is_staff and user.staff.role == 'HOD'
 
     if request.method == 'POST':
@@ -286,7 +230,7 @@ def complaint_detail(request, complaint_id):
                 # Auto-update status when assigned staff first comments
                 if is_assigned_staff and complaint.status == 'ASSG':
                     complaint.status = 'PROG'
-                    complaint.save()
+                    complaint.save(actor=user)
                     messages.success(request, "Comment added and status updated to 'In Progress'")
                 else:
                     messages.success(request, "Comment added successfully")
@@ -304,18 +248,9 @@ def complaint_detail(request, complaint_id):
             
             status_form = StatusUpdateForm(request.POST)
             if status_form.is_valid():
-                old_status = complaint.status
-                new_status = status_form.cleaned_data['status']
-                complaint.status = new_status
-                complaint.save()
-                
-                # Add automatic comment for status change
-                Comment.objects.create(
-                    complaint=complaint,
-                    author=user.staff,
-                    content=f"Status changed from {complaint.get_status_display()} to {dict(complaint.STATUS_CHOICES)[new_status]}",
-                    is_internal=False
-                )
+                # The change is recorded in the complaint's timeline
+                complaint.status = status_form.cleaned_data['status']
+                complaint.save(actor=user)
                 
                 messages.success(request, f"Complaint status updated to {complaint.get_status_display()}")
                 
@@ -358,15 +293,7 @@ def complaint_detail(request, complaint_id):
             elif action == 'mark_resolved':
                 if complaint.status == 'PROG':
                     complaint.status = 'RESV'
-                    complaint.save()
-                    
-                    # Add automatic comment
-                    Comment.objects.create(
-                        complaint=complaint,
-                        author=None,  # Student comment
-                        content="Student marked this complaint as resolved and satisfactory",
-                        is_internal=False
-                    )
+                    complaint.save(actor=user)
                     
                     # Notify staff
                     if complaint.assigned_to:
@@ -388,11 +315,10 @@ def complaint_detail(request, complaint_id):
                     
                     if escalation_reason and escalation_details:
                         # Upgrade priority
-                        old_priority = complaint.priority
                         complaint.priority = 'HIGH' if complaint.priority != 'HIGH' else 'CRIT'
-                        complaint.save()
+                        complaint.save(actor=user)
                         
-                        # Add escalation comment
+                        # Record the escalation in the timeline
                         reason_map = {
                             'no_response': 'No response from assigned staff',
                             'delayed_resolution': 'Resolution is taking too long',
@@ -401,20 +327,17 @@ def complaint_detail(request, complaint_id):
                             'other': 'Other'
                         }
                         
-                        Comment.objects.create(
-                            complaint=complaint,
-                            author=None,  # Student comment
-                            content=f"ESCALATED by student\nReason: {reason_map.get(escalation_reason, escalation_reason)}\n\nDetails: {escalation_details}",
-                            is_internal=False
+                        events.record(
+                            complaint, ComplaintEvent.ESCALATED, actor=user,
+                            note=f"Reason: {reason_map.get(escalation_reason, escalation_reason)}\n\nDetails: {escalation_details}",
                         )
                         
                         # Add VC and Registrar as trackers for escalated complaints
-                        vc = Staff.objects.filter(role='VC').first()
-                        reg = Staff.objects.filter(role='REG').first()
-                        if vc:
-                            complaint.trackers.add(vc)
-                        if reg:
-                            complaint.trackers.add(reg)
+                        directory = get_directory()
+                        add_trackers(complaint, [
+                            staff_id for staff_id in (directory.first('VC'), directory.first('REG'))
+                            if staff_id is not None
+                        ])
                         
                         # Send notifications
                         send_complaint_notification(
@@ -441,6 +364,10 @@ def complaint_detail(request, complaint_id):
     if is_student:
         comments = comments.filter(is_internal=False)
 
+    # Status changes and escalation reasons are kept in the timeline only
+    history = events.timeline(complaint).filter(kind__in=[
+        ComplaintEvent.STATUS_CHANGED, ComplaintEvent.RESOLVED, ComplaintEvent.ESCALATED])
+
     # Get tracking information
     tracking_info = {
         'assigned_to': complaint.assigned_to,
@@ -453,6 +380,7 @@ def complaint_detail(request, complaint_id):
     context = {
         'complaint': complaint,
         'comments': comments,
+        'history': history,
         'comment_form': comment_form,
         'status_form': status_form,
         'is_staff': is_staff,
@@ -464,20 +392,24 @@ def complaint_detail(request, complaint_id):
     }
     return render(request, 'complaint_detail.html', context)
 
+@login_required
+def complaint_status(request, complaint_id):
+    """Current classification and assignment, polled while analysis is pending"""
+    complaint = get_object_or_404(Complaint.objects.select_related('assigned_to'), pk=complaint_id)
+    if not complaint.can_user_view(request.user):
+        return HttpResponseForbidden()
+
+    return JsonResponse({
+        'analysis_pending': complaint.analysis_pending,
+        'category': complaint.get_category_display(),
+        'priority': complaint.get_priority_display(),
+        'status': complaint.get_status_display(),
+        'assigned_to': complaint.assigned_to.get_role_display() if complaint.assigned_to else None,
+    })
+
 def send_complaint_notification(complaint, message):
-    """Send notifications via WebSockets (placeholder for implementation)"""
-    # This would integrate with your WebSocket setup
-    # channel_layer = get_channel_layer()
-    # group_name = f'complaint_{complaint.id}'
-    # async_to_sync(channel_layer.group_send)(
-    #     group_name,
-    #     {
-    #         'type': 'complaint_update',
-    #         'message': message,
-    #         'complaint_id': complaint.id,
-    #     }
-    # )
-    pass
+    """Notify the student, assignee and trackers over WebSockets once the transaction commits"""
+    notifications.notify(complaint, message)
 
 @login_required
 def staff_dashboard(request):
@@ -488,19 +420,9 @@ def staff_dashboard(request):
         messages.error(request, "You need a staff account to access this page.")
         return redirect('login')
 
-    # Base queryset: complaints assigned to or tracked by this staff member
-    base_complaints = Complaint.objects.filter(
-        Q(assigned_to=staff) | Q(trackers=staff)
-    ).distinct()
-
-    # Special rules for HODs - they can see all complaints from their department students
-    # AND complaints assigned to them (which includes academic complaints)
-    if staff.role == 'HOD' and staff.department:
-        department_complaints = Complaint.objects.filter(
-            student__department=staff.department
-        ).distinct()
-        # This union ensures HODs see both tracked complaints AND department complaints
-        base_complaints = (base_complaints | department_complaints).distinct()
+    # Base queryset: complaints assigned to or tracked by this staff member and,
+    # for HODs, all complaints from their department students
+    base_complaints = visible_to(request.user, ComplaintViewer.STAFF_REASONS)
 
     # Apply filters
     filtered_complaints = base_complaints
@@ -521,30 +443,51 @@ def staff_dashboard(request):
     elif assignment_filter == 'tracking':
         filtered_complaints = filtered_complaints.filter(trackers=staff)
 
-    # Order complaints by priority and creation date
-    filtered_complaints = filtered_complaints.order_by('-priority', '-created_at')
-
-    # Pagination
-    paginator = Paginator(filtered_complaints, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Statistics for dashboard - Fixed to include assigned complaints
+    # Statistics for dashboard, from the maintained counters
+    is_department_head = staff.role == 'HOD' and staff.department_id is not None
+    scopes = {
+        'visible': (ComplaintCounter.VISIBLE, request.user.pk),
+        'assigned': (ComplaintCounter.ASSIGNEE, staff.pk),
+        'tracking': (ComplaintCounter.TRACKER, staff.pk),
+        'department': (ComplaintCounter.DEPARTMENT, staff.department_id if is_department_head else None),
+    }
+    tallies = get_tallies(*scopes.values())
+    visible = tallies[scopes['visible']]
     stats = {
-        'total_assigned': base_complaints.filter(assigned_to=staff).count(),
-        'total_tracking': base_complaints.filter(trackers=staff).count(),
-        'total_department': base_complaints.filter(student__department=staff.department).count() if staff.role == 'HOD' and staff.department else 0,
-        'pending_count': base_complaints.filter(status='PEND').count(),
-        'in_progress_count': base_complaints.filter(status__in=['REVW', 'ASSG', 'PROG']).count(),
-        'critical_count': base_complaints.filter(priority='CRIT').count(),
-        'high_priority_count': base_complaints.filter(priority='HIGH').count(),
-        'academic_complaints': base_complaints.filter(category='ACAD').count() if staff.role == 'HOD' else 0,
+        'total_assigned': tallies[scopes['assigned']].count(),
+        'total_tracking': tallies[scopes['tracking']].count(),
+        'total_department': tallies[scopes['department']].count() if is_department_head else 0,
+        'pending_count': visible.count(status='PEND'),
+        'in_progress_count': visible.count(status=['REVW', 'ASSG', 'PROG']),
+        'critical_count': visible.count(priority='CRIT'),
+        'high_priority_count': visible.count(priority='HIGH'),
+        'academic_complaints': visible.count(category='ACAD') if staff.role == 'HOD' else 0,
     }
 
+    # Text search, ranked by relevance, within the complaints visible here;
+    # otherwise cursor pagination by priority and creation date
+    search_query = request.GET.get('q', '').strip()
+    filters = {'status': status_filter, 'priority': priority_filter,
+               'category': category_filter, 'assignment': assignment_filter}
+    if search_query:
+        paginator = OffsetPaginator(search_complaints(search_query, filtered_complaints), 15,
+                                    {**filters, 'q': search_query})
+    else:
+        listed = {'assigned_to_me': 'assigned', 'tracking': 'tracking'}.get(assignment_filter, 'visible')
+        paginator = KeysetPaginator(
+            filtered_complaints.only('id', 'priority_rank', 'created_at'),
+            ['-priority_rank', '-created_at', '-id'], 15, filters,
+            approximate_total=tallies[scopes[listed]].count(**counter_filters(filters)),
+        )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    # Everything the table shows, read for the whole page at once
+    page_obj.object_list = complaint_rows(page_obj, staff=staff)
+
     context = {
         'staff': staff,
         'page_obj': page_obj,
         'stats': stats,
+        'search_query': search_query,
         'is_staff': True,
         'is_hod': (staff.role == 'HOD'),
         'is_wd': (staff.role == 'WD'),
@@ -569,12 +512,9 @@ def works_dashboard(request):
         return redirect('login')
 
     # Base queryset for infrastructure complaints assigned to or tracked by WD staff
-    # Using Q objects to combine conditions for assigned or tracked complaints
-    complaints_queryset = Complaint.objects.filter(
-        Q(category='INFRA'),
-        Q(assigned_to=staff) | Q(trackers=staff)
-    ).distinct().order_by('-priority', '-created_at')
-
+    complaints_queryset = visible_to(
+        request.user, [ComplaintViewer.ASSIGNEE, ComplaintViewer.TRACKER]
+    ).filter(category='INFRA')
 
     # Apply filters from request.GET
     status_filter = request.GET.get('status')
@@ -588,36 +528,88 @@ def works_dashboard(request):
     if location_type_filter:
         complaints_queryset = complaints_queryset.filter(location_type=location_type_filter)
 
-    # Pagination
-    paginator = Paginator(complaints_queryset, 10)  # Show 10 complaints per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Calculate statistics for Works Department dashboard (infrastructure complaints)
-    base_infra_complaints = Complaint.objects.filter(
-        Q(category='INFRA'),
-        Q(assigned_to=staff) | Q(trackers=staff)
-    ).distinct()
-
+    # Statistics for Works Department dashboard (infrastructure complaints), from the maintained counters
+    scope = (ComplaintCounter.VISIBLE, request.user.pk)
+    infra = get_tallies(scope)[scope]
     stats = {
-        'total_assigned_infra': base_infra_complaints.count(),
-        'pending_infra': base_infra_complaints.filter(status='PEND').count(),
-        'in_progress_infra': base_infra_complaints.filter(status__in=['REVW', 'ASSG', 'PROG']).count(),
-        'resolved_infra': base_infra_complaints.filter(status='RESV').count(),
-        'critical_infra': base_infra_complaints.filter(priority='CRIT').count(),
-        'high_priority_infra': base_infra_complaints.filter(priority='HIGH').count(),
-        'hostel_infra': base_infra_complaints.filter(location_type='HOSTEL').count(),
-        'lecture_infra': base_infra_complaints.filter(location_type='LECTURE').count(),
-        # Add more specific stats if needed
+        'total_assigned_infra': infra.count(category='INFRA'),
+        'pending_infra': infra.count(category='INFRA', status='PEND'),
+        'in_progress_infra': infra.count(category='INFRA', status=['REVW', 'ASSG', 'PROG']),
+        'resolved_infra': infra.count(category='INFRA', status='RESV'),
+        'critical_infra': infra.count(category='INFRA', priority='CRIT'),
+        'high_priority_infra': infra.count(category='INFRA', priority='HIGH'),
+        'hostel_infra': infra.count(category='INFRA', location_type='HOSTEL'),
+        'lecture_infra': infra.count(category='INFRA', location_type='LECTURE'),
     }
 
+    # Text search, ranked by relevance, within the complaints visible here;
+    # otherwise cursor pagination by priority and creation date (10 per page)
+    search_query = request.GET.get('q', '').strip()
+    filters = {'status': status_filter, 'priority': priority_filter, 'location_type': location_type_filter}
+    if search_query:
+        paginator = OffsetPaginator(search_complaints(search_query, complaints_queryset), 10,
+                                    {**filters, 'q': search_query})
+    else:
+        paginator = KeysetPaginator(
+            complaints_queryset.only('id', 'priority_rank', 'created_at'),
+            ['-priority_rank', '-created_at', '-id'], 10, filters,
+            approximate_total=infra.count(category='INFRA', **counter_filters(filters)),
+        )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    # Everything the table shows, read for the whole page at once
+    page_obj.object_list = complaint_rows(page_obj, staff=staff)
+
     context = {
         'staff': staff,
         'page_obj': page_obj,
         'stats': stats,
+        'search_query': search_query,
     }
     return render(request, 'works_dashboard.html', context)
 
+# Roles whose exports cover every complaint; other staff export what they can view
+EXPORT_ALL_ROLES = ['VC', 'REG']
+
+
+async def _async_pieces(pieces):
+    """Serve a blocking iterator to ASGI one piece at a time instead of all at once"""
+    next_piece = sync_to_async(next)
+    while True:
+        piece = await next_piece(pieces, None)
+        if piece is None:
+            return
+        yield piece
+
+
+@login_required
+def export_complaints(request):
+    """Stream complaints (or their comments) matching the dashboard filters as CSV or JSON Lines"""
+    try:
+        staff = request.user.staff
+    except Staff.DoesNotExist:
+        messages.error(request, "You don't have permission to export complaints")
+        return redirect('dashboard')
+
+    kind = request.GET.get('kind', export.COMPLAINTS)
+    fmt = request.GET.get('format', export.CSV)
+    if kind not in (export.COMPLAINTS, export.COMMENTS) or fmt not in export.FORMATS:
+        return HttpResponseBadRequest("Unknown export kind or format")
+    compress = request.GET.get('compress', '1') != '0'
+
+    if staff.role in EXPORT_ALL_ROLES:
+        complaints = Complaint.objects.all()
+    else:
+        complaints = visible_to(request.user, ComplaintViewer.STAFF_REASONS)
+    complaints = export.filter_complaints(complaints, request.GET)
+
+    pieces = iter(export.export(complaints, kind, fmt, compress))
+    if isinstance(request, ASGIRequest):
+        pieces = _async_pieces(pieces)
+    response = StreamingHttpResponse(
+        pieces, content_type='application/gzip' if compress else f'{export.FORMATS[fmt]}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(kind, fmt, compress)}"'
+    return response
+
 # Authentication Views
 @csrf_protect
 def login_view(request):
@@ -703,39 +695,8 @@ def complaint_tracking_view(request, complaint_id):
         messages.error(request, "You don't have permission to track this complaint")
         return redirect('dashboard')
     
-    # Get all updates and comments in chronological order
-    updates = []
-    
-    # Add status changes from comments
-    status_comments = Comment.objects.filter(
-        complaint=complaint,
-        content__icontains='Status changed'
-    ).order_by('created_at')
-    
-    for comment in status_comments:
-        updates.append({
-            'type': 'status_change',
-            'timestamp': comment.created_at,
-            'content': comment.content,
-            'author': comment.author,
-        })
-    
-    # Add regular comments
-    regular_comments = Comment.objects.filter(
-        complaint=complaint,
-        is_internal=False
-    ).exclude(content__icontains='Status changed').order_by('created_at')
-    
-    for comment in regular_comments:
-        updates.append({
-            'type': 'comment',
-            'timestamp': comment.created_at,
-            'content': comment.content,
-            'author': comment.author,
-        })
-    
-    # Sort all updates by timestamp
-    updates.sort(key=lambda x: x['timestamp'])
+    # One indexed query for the whole timeline
+    updates = events.timeline(complaint)
     
     context = {
         'complaint': complaint,
@@ -754,62 +715,49 @@ def analytics_dashboard(request):
         messages.error(request, "You don't have permission to view analytics")
         return redirect('dashboard')
 
-    # Get all complaints for analysis
-    complaints = Complaint.objects.all()
-    
-    # Basic statistics
-    total_complaints = complaints.count()
-    complaints_by_status = complaints.values('status').annotate(count=models.Count('id')).order_by('status')
-    complaints_by_category = complaints.values('category').annotate(count=models.Count('id')).order_by('category')
-    complaints_by_priority = complaints.values('priority').annotate(count=models.Count('id')).order_by('priority')
-    
-    # Time-based analysis
-    complaints_by_month = complaints.annotate(
-        month=models.functions.TruncMonth('created_at')
-    ).values('month').annotate(
-        count=models.Count('id')
-    ).order_by('month')
-    
-    # Resolution time analysis
-    resolved_complaints = complaints.filter(status__in=['RESV', 'CLSD'])
-    avg_resolution_time = resolved_complaints.annotate(
-        resolution_time=models.ExpressionWrapper(
-            models.F('updated_at') - models.F('created_at'),
-            output_field=models.DurationField()
-        )
-    ).aggregate(avg_time=models.Avg('resolution_time'))['avg_time']
-    
-    # Department-wise analysis
-    complaints_by_department = complaints.values(
-        'student__department__name'
-    ).annotate(
-        count=models.Count('id')
-    ).order_by('-count')
-    
-    # Staff performance (top resolvers)
-    top_resolvers = Staff.objects.filter(
-        assigned_complaints__status__in=['RESV', 'CLSD']
-    ).annotate(
-        resolved_count=models.Count('assigned_complaints')
-    ).order_by('-resolved_count')[:5]
-    
-    # Sentiment analysis
-    sentiment_stats = complaints.aggregate(
-        avg_sentiment=models.Avg('sentiment_score'),
-        min_sentiment=models.Min('sentiment_score'),
-        max_sentiment=models.Max('sentiment_score')
-    )
-    
-    context = {
-        'total_complaints': total_complaints,
-        'complaints_by_status': complaints_by_status,
-        'complaints_by_category': complaints_by_category,
-        'complaints_by_priority': complaints_by_priority,
-        'complaints_by_month': complaints_by_month,
-        'avg_resolution_time': avg_resolution_time,
-        'complaints_by_department': complaints_by_department,
-        'top_resolvers': top_resolvers,
-        'sentiment_stats': sentiment_stats,
+    # Optional range of creation days and drill-down filters. Without a
+    # drill-down everything comes from the daily rollups, whose size depends
+    # on the range only; slices, distributions and percentiles come from this
+    # process's in-memory cube, which is only built for a drill-down.
+    start = parse_day(request.GET.get('start'))
+    end = parse_day(request.GET.get('end'))
+    department = request.GET.get('department')
+    drill_down = {
+        'department': int(department) if department and department.isdigit() else None,
+        'category': request.GET.get('category') or None,
+        'status': request.GET.get('status') or None,
+        'location_type': request.GET.get('location_type') or None,
     }
+    drilled = any(value is not None for value in drill_down.values())
+    if drilled:
+        cube = get_cube()
+        selected = cube.mask(start, end, **drill_down)
+        context = cube.summary(selected)
+        table = cube.crosstab(selected, 'category', 'status')
+        histogram_edges, histogram_counts = cube.sentiment_histogram(selected)
+        context.update({
+            'sentiment_histogram': list(zip(histogram_edges, histogram_counts)),
+            'resolution_percentiles': cube.resolution_percentiles(selected),
+        })
+    else:
+        rows = get_rollups(start, end)
+        context = summarize(rows)
+        table = crosstab(rows, 'category', 'status')
+
+    statuses = [code for code, _ in Complaint.STATUS_CHOICES if any(code in row for row in table.values())]
+    context.update({
+        'date_range': {'start': start, 'end': end},
+        'drill_down': drill_down,
+        'drilled_down': drilled,
+        'departments': Department.objects.order_by('name'),
+        'category_choices': Complaint.CATEGORY_CHOICES,
+        'status_choices': Complaint.STATUS_CHOICES,
+        'location_choices': Complaint.LOCATION_CHOICES,
+        'category_by_status': {
+            'statuses': statuses,
+            'rows': [(category, [row.get(status, 0) for status in statuses])
+                     for category, row in sorted(table.items())],
+        },
+    })
     
     return render(request, 'dashboard.html', context)
\ No newline at end of file